@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import auth, lancamentos, users
+from app.api.v1.endpoints import auth, lancamentos, users, profiling, ml
 from app.routes import financeiro, memoria, chatbot, metas, contas, data_import
 
 api_router = APIRouter()
@@ -12,4 +12,6 @@ api_router.include_router(metas.router, prefix="/metas", tags=["metas"])
 api_router.include_router(contas.router, prefix="/contas", tags=["contas"])
 api_router.include_router(memoria.router, prefix="/memoria", tags=["memoria"])
 api_router.include_router(chatbot.router, prefix="/chatbot", tags=["chatbot"])
-api_router.include_router(data_import.router, prefix="/data-import", tags=["data-import"]) 
\ No newline at end of file
+api_router.include_router(ml.router, prefix="/ml", tags=["ml"])
+api_router.include_router(data_import.router, prefix="/data-import", tags=["data-import"])
+api_router.include_router(profiling.router, prefix="/admin/profiles", tags=["admin"]) 
\ No newline at end of file
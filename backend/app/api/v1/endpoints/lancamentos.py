@@ -14,9 +14,24 @@ from app.schemas.lancamento import (
     LancamentoSummary
 )
 from app.services.cache import cache
+from app.services.lancamento_events import lancamentos_changed, lancamentos_created
+from app.utils.serialization import RawJSONResponse, dumps, rows_to_dicts
 
 router = APIRouter()
 
+# Columns of LancamentoResponse, selected directly (no ORM hydration on list pages)
+LANCAMENTO_RESPONSE_COLUMNS = (
+    Lancamento.id,
+    Lancamento.descricao,
+    Lancamento.valor,
+    Lancamento.tipo,
+    Lancamento.data_lancamento,
+    Lancamento.categoria_id,
+    Lancamento.user_id,
+    Lancamento.created_at,
+    Lancamento.updated_at,
+)
+
 @router.get("/", response_model=List[LancamentoResponse])
 async def list_lancamentos(
     db: AsyncSession = Depends(get_db),
@@ -30,17 +45,20 @@ async def list_lancamentos(
 ) -> Any:
     """
     Retrieve lancamentos with filters
+    
+    Rows are mapped straight from the column select and serialized with orjson;
+    output validation is skipped since the data comes from our own table.
     """
     # Build cache key
     cache_key = f"lancamentos:{current_user.id}:{skip}:{limit}:{tipo}:{categoria_id}:{data_inicio}:{data_fim}"
     
-    # Try to get from cache
+    # Try to get from cache (stored as the serialized JSON body)
     cached_result = cache.get(cache_key)
     if cached_result:
-        return cached_result
+        return RawJSONResponse(content=cached_result)
     
     # Build query
-    query = select(Lancamento).where(Lancamento.user_id == current_user.id)
+    query = select(*LANCAMENTO_RESPONSE_COLUMNS).where(Lancamento.user_id == current_user.id)
     
     if tipo:
         query = query.where(Lancamento.tipo == tipo)
@@ -54,15 +72,12 @@ async def list_lancamentos(
     query = query.offset(skip).limit(limit).order_by(Lancamento.data_lancamento.desc())
     
     result = await db.execute(query)
-    lancamentos = result.scalars().all()
-    
-    # Convert to response format
-    response_data = [LancamentoResponse.from_orm(l) for l in lancamentos]
+    body = dumps(rows_to_dicts(result)).decode()
     
     # Cache for 5 minutes
-    cache.set(cache_key, response_data, ttl=timedelta(minutes=5))
+    cache.set(cache_key, body, ttl=timedelta(minutes=5))
     
-    return response_data
+    return RawJSONResponse(content=body)
 
 @router.post("/", response_model=LancamentoResponse)
 async def create_lancamento(
@@ -83,9 +98,9 @@ async def create_lancamento(
     await db.commit()
     await db.refresh(lancamento)
     
-    # Clear user's cache
-    cache.delete(f"lancamentos:{current_user.id}:*")
-    cache.delete(f"summary:{current_user.id}")
+    # Clear user's cache, keep the daily spending features current and
+    # score against the user's anomaly detector in the next micro-batch
+    lancamentos_created(current_user.id, [lancamento])
     
     return LancamentoResponse.from_orm(lancamento)
 
@@ -145,8 +160,7 @@ async def update_lancamento(
     await db.refresh(lancamento)
     
     # Clear cache
-    cache.delete(f"lancamentos:{current_user.id}:*")
-    cache.delete(f"summary:{current_user.id}")
+    lancamentos_changed(current_user.id)
     
     return LancamentoResponse.from_orm(lancamento)
 
@@ -176,8 +190,7 @@ async def delete_lancamento(
     await db.commit()
     
     # Clear cache
-    cache.delete(f"lancamentos:{current_user.id}:*")
-    cache.delete(f"summary:{current_user.id}")
+    lancamentos_changed(current_user.id)
     
     return {"message": "Lancamento deleted successfully"}
 
@@ -0,0 +1,147 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.api.deps import get_current_active_superuser, get_current_user, get_db
+from app.core.config import settings
+from app.models.user import User
+from app.models.financeiro import Lancamento
+from app.schemas.ml import BatchCategorizationRequest, BatchCategorizationResponse
+from app.services.anomaly_stream import anomaly_stream, to_ml_transaction
+from app.services.ml_executor import MLTaskTimeout, ml_executor
+from app.services.model_registry import model_registry
+from app.services.rule_categorizer import rule_stats
+from app.services.training_scheduler import training_scheduler
+from app.utils.serialization import RawJSONResponse, dumps
+
+router = APIRouter()
+
+async def _load_user_transactions(db: AsyncSession, user_id: int) -> List[Dict[str, Any]]:
+    """User's lançamentos in the format expected by the ML models"""
+    result = await db.execute(
+        select(
+            Lancamento.id,
+            Lancamento.descricao,
+            Lancamento.valor,
+            Lancamento.tipo,
+            Lancamento.data_lancamento,
+            Lancamento.categoria_id,
+        ).where(Lancamento.user_id == user_id)
+    )
+    return [to_ml_transaction(row) for row in result.all()]
+
+@router.post("/categorize/batch", response_model=BatchCategorizationResponse)
+async def categorize_batch(
+    payload: BatchCategorizationRequest,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Predict the top-k categories for a batch of transactions
+    
+    The user's keyword rules answer first; the rest go through the classifier,
+    with features extracted once and scored in a single predict_proba pass.
+    Predictions keep the order of the input.
+    """
+    # Imported on first use so pandas/sklearn stay out of worker startup
+    from app.services.ml_service import categorize_transactions_batch
+    
+    transactions = [t.model_dump() for t in payload.transactions]
+    result = await categorize_transactions_batch(
+        transactions, user_id=current_user.id, top_k=payload.top_k
+    )
+    
+    if "error" in result:
+        status_code = 404 if result["error"] == "Model not trained" else 500
+        raise HTTPException(status_code=status_code, detail=result["error"])
+    
+    return RawJSONResponse(content=dumps(result))
+
+@router.post("/anomalies/train", response_model=Dict[str, Any])
+async def train_anomaly_detector(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Fit the user's anomaly detector on their full history
+    
+    New lançamentos are then scored in micro-batches against this model
+    without refitting.
+    """
+    transactions = await _load_user_transactions(db, current_user.id)
+    
+    try:
+        training = await ml_executor.run(
+            "train_anomaly_detector", transactions, user_id=current_user.id,
+            timeout=settings.ML_EXECUTOR_TIMEOUT * 4
+        )
+    except MLTaskTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    if "error" in training:
+        raise HTTPException(status_code=400, detail=training["error"])
+    
+    # Trained in another process: load the new version here right away
+    await model_registry.refresh()
+    return training
+
+@router.get("/analysis", response_model=Dict[str, Any])
+async def read_spending_analysis(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Insights, anomalies and clusters of the user's history
+    
+    The three analyses run in parallel on the ML process pool.
+    """
+    from app.services.ml_service import analyze_spending_patterns
+    
+    transactions = await _load_user_transactions(db, current_user.id)
+    try:
+        result = await analyze_spending_patterns(transactions, user_id=current_user.id)
+    except MLTaskTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
+
+@router.get("/anomalies", response_model=List[Dict[str, Any]])
+async def read_recent_anomalies(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Anomalies flagged among the user's most recent lançamentos
+    """
+    return anomaly_stream.recent(current_user.id)
+
+@router.get("/forecast", response_model=Dict[str, Any])
+async def read_spending_forecast(
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Forecast the user's daily spending for the next days
+    
+    Lag and rolling-average features come from the daily spending feature store.
+    """
+    from app.services.ml_service import get_spending_forecast
+    
+    result = await get_spending_forecast(db, current_user.id, days)
+    if "error" in result:
+        status_code = 404 if result["error"] == "Model not trained" else 500
+        raise HTTPException(status_code=status_code, detail=result["error"])
+    return result
+
+@router.get("/training/status", response_model=Dict[str, Any])
+async def read_training_status(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Retraining scheduler queue and throughput, ML executor load and rule categorizer hit rate (this worker)
+    """
+    return {
+        **training_scheduler.status(),
+        "executor": ml_executor.status(),
+        "rule_categorizer": rule_stats()
+    }
@@ -0,0 +1,32 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.api.deps import get_current_active_superuser
+from app.core.profiling import get_profile_path, list_profiles
+from app.models.user import User
+
+router = APIRouter()
+
+@router.get("/", response_model=List[Dict[str, Any]])
+async def read_profiles(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    List captured request profiles (SQL count, time per middleware, duration).
+    """
+    return list_profiles(limit=limit)
+
+@router.get("/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Download a profile in speedscope format (open it at https://www.speedscope.app).
+    """
+    path = get_profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=path.name)
@@ -1 +1,61 @@
- 
\ No newline at end of file
+"""
+Helpers de cache de alto nível sobre o CacheService (Redis)
+"""
+
+import json
+import hashlib
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.services.cache import cache
+
+
+def cached_function(ttl: int = 300, namespace: str = "default") -> Callable:
+    """Cacheia o resultado de uma função async pelo hash dos argumentos"""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # Métodos: o primeiro argumento (self) não entra na chave
+            key_args = args[1:] if args and hasattr(args[0], func.__name__) else args
+            raw_key = json.dumps([key_args, kwargs], default=str, sort_keys=True)
+            cache_key = f"{namespace}:{func.__name__}:{hashlib.sha256(raw_key.encode()).hexdigest()}"
+
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            result = await func(*args, **kwargs)
+            if not (isinstance(result, dict) and "error" in result):
+                cache.set(cache_key, result, ttl=ttl)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class FinancialCache:
+    """Cache de dados agregados do dashboard e de previsões"""
+
+    PREFIX = "dashboard"
+
+    @staticmethod
+    async def get_dashboard_data(key: str) -> Optional[Any]:
+        """Obtém dados cacheados do dashboard"""
+        return cache.get(f"{FinancialCache.PREFIX}:{key}")
+
+    @staticmethod
+    async def set_dashboard_data(key: str, data: Any, ttl: Optional[int] = None) -> bool:
+        """Armazena dados do dashboard (TTL padrão: ML_PREDICTION_CACHE_TTL)"""
+        return cache.set(
+            f"{FinancialCache.PREFIX}:{key}",
+            data,
+            ttl=ttl or settings.ML_PREDICTION_CACHE_TTL
+        )
+
+    @staticmethod
+    async def invalidate(key: str) -> bool:
+        """Remove uma entrada do cache do dashboard"""
+        return cache.delete(f"{FinancialCache.PREFIX}:{key}")
@@ -119,14 +119,67 @@ class Settings(BaseSettings):
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     LOG_FILE: str = "logs/app.log"
     
+    # Pipeline assíncrono de logs estruturados (JSON)
+    LOG_JSON_FILE: Optional[str] = "logs/structured.jsonl"
+    LOG_JSON_STDOUT: bool = True
+    LOG_PIPELINE_BUFFER_SIZE: int = 10000
+    LOG_PIPELINE_FLUSH_INTERVAL: float = 0.5  # seconds
+    LOG_SAMPLE_RATES: Dict[str, float] = {"2xx": 1.0, "3xx": 1.0}  # 4xx/5xx são sempre registrados
+    
     # Monitoring & Observability
     SENTRY_DSN: Optional[str] = None
     ENABLE_METRICS: bool = True
     METRICS_PREFIX: str = "biuai"
     
+    # OpenTelemetry (tracing)
+    OTEL_ENABLED: bool = False
+    OTEL_SERVICE_NAME: str = "biuai-backend"
+    OTEL_EXPORTER: str = "otlp"  # otlp, console, file
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    OTEL_TRACES_FILE: str = "logs/traces.jsonl"
+    OTEL_SAMPLING_RATIO: float = 1.0  # 0.0 - 1.0 (respeita a decisão do span pai)
+    OTEL_EXCLUDED_URLS: str = "health,ready,metrics"
+    OTEL_N_PLUS_ONE_THRESHOLD: int = 5  # Execuções repetidas do mesmo SQL por requisição
+    
+    # Profiling sob demanda (X-Profile: 1 ou ?profile=1, somente superusuários)
+    PROFILING_ENABLED: bool = True
+    PROFILING_INTERVAL: float = 0.001  # segundos entre amostras
+    PROFILING_OUTPUT_DIR: str = "logs/profiles"
+    
     # Machine Learning
     ML_MODEL_PATH: str = "models/"
     ML_PREDICTION_CACHE_TTL: int = 3600  # 1 hour
+    ML_REGISTRY_KEEP_VERSIONS: int = 3  # Versões mantidas em disco por modelo/escopo
+    ML_REGISTRY_RELOAD_INTERVAL: int = 10  # segundos entre verificações de novas versões
+    ML_REGISTRY_MAX_USER_MODELS: int = 500  # Modelos por usuário mantidos em memória por processo (LRU)
+    ML_N_JOBS: int = -1  # Núcleos usados no treino (-1 = todos)
+    ML_BATCH_MAX_ITEMS: int = 5000  # Transações por requisição de categorização em lote
+    ML_TEXT_CACHE_SIZE: int = 50000  # Descrições normalizadas mantidas em memória (LRU)
+    ML_ANOMALY_BATCH_SIZE: int = 200  # Lançamentos por micro-lote de pontuação de anomalias
+    ML_ANOMALY_FLUSH_INTERVAL: float = 2.0  # segundos entre micro-lotes
+    ML_CLUSTER_BATCH_SIZE: int = 1024  # Tamanho do mini-batch do MiniBatchKMeans
+    ML_CLUSTER_MIN_NEW_ROWS: int = 50  # Lançamentos novos acumulados antes de atualizar e republicar os centróides
+    ML_EXECUTOR_WORKERS: int = 2  # Processos para análises de ML fora do event loop
+    ML_EXECUTOR_MAX_CONCURRENCY: int = 4  # Tarefas simultâneas por worker da API
+    ML_EXECUTOR_TIMEOUT: float = 30.0  # segundos por tarefa
+    ML_RULES_MIN_SUPPORT: int = 3  # Lançamentos mínimos com a palavra-chave para virar regra
+    ML_RULES_MIN_PRECISION: float = 0.95  # Fração mínima desses lançamentos na mesma categoria
+    ML_RULES_MAX: int = 5000  # Regras por usuário (as de maior suporte)
+    
+    # Importação: deduplicação de lançamentos
+    IMPORT_BATCH_SIZE: int = 1000  # Linhas por INSERT ... ON CONFLICT (uma ida ao banco por lote)
+    IMPORT_NEAR_DUP_THRESHOLD: float = 0.8  # Jaccard estimado (MinHash) mínimo no modo "near"
+    IMPORT_NEAR_DUP_DAYS: int = 3  # Distância máxima em dias no modo "near"
+    IMPORT_NEAR_DUP_AMOUNT_TOLERANCE: float = 0.01  # Diferença máxima de valor no modo "near"
+    
+    # Agendador de retreino (pool de processos separado dos workers da API)
+    ML_TRAINING_SCHEDULER_ENABLED: bool = True
+    ML_RETRAIN_INTERVAL: int = 900  # segundos entre varreduras de mudanças
+    ML_RETRAIN_MIN_CHANGES: int = 50  # Lançamentos novos/alterados que disparam retreino
+    ML_RETRAIN_MAX_AGE_HOURS: int = 24  # Retreina modelos mais antigos que isso se houve qualquer mudança
+    ML_TRAINING_WORKERS: int = 1  # Processos de treino
+    ML_TRAINING_THREADS: int = 2  # Threads por processo de treino (BLAS/joblib)
+    ML_TRAINING_MEMORY_LIMIT_MB: int = 2048  # Limite de memória por processo de treino
     
     # Business Rules
     DEFAULT_CURRENCY: str = "BRL"
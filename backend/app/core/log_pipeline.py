@@ -0,0 +1,144 @@
+"""
+Pipeline de logging estruturado não bloqueante
+
+Os registros são apenas enfileirados no event loop (ring buffer em memória);
+a serialização para JSON e a escrita em arquivo/stdout acontecem em uma
+thread de background. Logs 2xx/3xx de alto volume podem ser amostrados
+(LOG_SAMPLE_RATES) e registros descartados por buffer cheio são contados.
+"""
+
+import atexit
+import json
+import random
+import sys
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED, LOG_RECORDS_SAMPLED_OUT
+
+
+class LogPipeline:
+    """Fila de logs em memória drenada por uma thread dedicada"""
+
+    def __init__(
+        self,
+        buffer_size: int = 10000,
+        flush_interval: float = 0.5,
+        file_path: Optional[str] = None,
+        to_stdout: bool = True,
+        sample_rates: Optional[Dict[str, float]] = None
+    ):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.file_path = file_path
+        self.to_stdout = to_stdout
+        self.sample_rates = sample_rates or {}
+
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "sampled_out": 0}
+
+    def should_sample(self, status_code: int) -> bool:
+        """Decide se um log de requisição com este status deve ser mantido"""
+        rate = self.sample_rates.get(f"{status_code // 100}xx", 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.stats["sampled_out"] += 1
+        LOG_RECORDS_SAMPLED_OUT.inc()
+        return False
+
+    def submit(self, level: str, message: str, data: Dict[str, Any]) -> None:
+        """Enfileira um registro (O(1), sem I/O nem serialização no chamador)"""
+        if self._thread is None:
+            self._start()
+
+        # Ring buffer: com o buffer cheio o registro mais antigo é descartado
+        if len(self._buffer) >= self.buffer_size:
+            self.stats["dropped"] += 1
+            LOG_RECORDS_DROPPED.inc()
+
+        self._buffer.append((datetime.now(timezone.utc), level, message, data))
+        self.stats["enqueued"] += 1
+
+        if len(self._buffer) >= self.buffer_size // 2:
+            self._wakeup.set()
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="log-pipeline", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _run(self) -> None:
+        file_handle = None
+        if self.file_path:
+            Path(self.file_path).parent.mkdir(parents=True, exist_ok=True)
+            file_handle = open(self.file_path, "a", encoding="utf-8")
+
+        try:
+            while not self._stopping.is_set():
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._drain(file_handle)
+            self._drain(file_handle)
+        finally:
+            if file_handle:
+                file_handle.close()
+
+    def _drain(self, file_handle) -> None:
+        """Serializa e escreve tudo o que estiver no buffer em um único write"""
+        lines = []
+        while self._buffer:
+            try:
+                timestamp, level, message, data = self._buffer.popleft()
+            except IndexError:
+                break
+            record = {
+                "timestamp": timestamp.isoformat(),
+                "level": level,
+                "message": message,
+                **data
+            }
+            lines.append(json.dumps(record, default=str, ensure_ascii=False))
+
+        if not lines:
+            return
+
+        payload = "\n".join(lines) + "\n"
+        if file_handle:
+            file_handle.write(payload)
+            file_handle.flush()
+        if self.to_stdout:
+            sys.stdout.write(payload)
+            sys.stdout.flush()
+        self.stats["written"] += len(lines)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Drena o buffer e encerra a thread de escrita"""
+        if self._thread is None or self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+
+# Instância global do pipeline
+log_pipeline = LogPipeline(
+    buffer_size=settings.LOG_PIPELINE_BUFFER_SIZE,
+    flush_interval=settings.LOG_PIPELINE_FLUSH_INTERVAL,
+    file_path=settings.LOG_JSON_FILE,
+    to_stdout=settings.LOG_JSON_STDOUT,
+    sample_rates=settings.LOG_SAMPLE_RATES
+)
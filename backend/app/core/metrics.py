@@ -0,0 +1,322 @@
+"""
+Instrumentação Prometheus da API BIUAI
+
+Histogramas de latência por rota/status, gauge de requisições em andamento,
+tempo de banco e de cache por requisição e tamanho de request/response.
+
+Para agregar corretamente entre vários workers (uvicorn/gunicorn), defina a
+variável de ambiente PROMETHEUS_MULTIPROC_DIR apontando para um diretório
+vazio e gravável antes de iniciar o servidor. Percentis (p50/p95/p99) são
+calculados no Prometheus com histogram_quantile() sobre os buckets.
+"""
+
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter as PromCounter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+# Buckets de latência em segundos (cobrem de 5ms a 10s)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0
+)
+
+# Buckets de tamanho em bytes (100B a 10MB)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+
+# Buckets de duração de treino de modelos em segundos (1s a 30min)
+TRAINING_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# Buckets para quantidade de statements SQL por requisição
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+_prefix = settings.METRICS_PREFIX
+
+REQUEST_LATENCY = Histogram(
+    f"{_prefix}_http_request_duration_seconds",
+    "Latência das requisições HTTP por rota e status",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUESTS_IN_PROGRESS = Gauge(
+    f"{_prefix}_http_requests_in_progress",
+    "Requisições HTTP em andamento",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+REQUEST_DB_TIME = Histogram(
+    f"{_prefix}_http_request_db_seconds",
+    "Tempo gasto em statements SQL por requisição",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUEST_DB_STATEMENTS = Histogram(
+    f"{_prefix}_http_request_db_statements",
+    "Quantidade de statements SQL executados por requisição",
+    ["method", "route"],
+    buckets=STATEMENT_BUCKETS,
+)
+
+REQUEST_CACHE_TIME = Histogram(
+    f"{_prefix}_http_request_cache_seconds",
+    "Tempo gasto em operações de cache (Redis) por requisição",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUEST_SIZE = Histogram(
+    f"{_prefix}_http_request_size_bytes",
+    "Tamanho do corpo das requisições HTTP",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+
+RESPONSE_SIZE = Histogram(
+    f"{_prefix}_http_response_size_bytes",
+    "Tamanho do corpo das respostas HTTP",
+    ["method", "route", "status"],
+    buckets=SIZE_BUCKETS,
+)
+
+LOG_RECORDS_DROPPED = PromCounter(
+    f"{_prefix}_log_records_dropped_total",
+    "Registros de log descartados por buffer cheio no pipeline assíncrono",
+)
+
+LOG_RECORDS_SAMPLED_OUT = PromCounter(
+    f"{_prefix}_log_records_sampled_out_total",
+    "Logs de requisição descartados pela amostragem (LOG_SAMPLE_RATES)",
+)
+
+ML_TRAINING_DURATION = Histogram(
+    f"{_prefix}_ml_training_duration_seconds",
+    "Tempo de parede de cada treino de modelo",
+    ["model"],
+    buckets=TRAINING_BUCKETS,
+)
+
+ML_TRAINING_PEAK_MEMORY = Gauge(
+    f"{_prefix}_ml_training_peak_memory_bytes",
+    "Crescimento do pico de RSS do processo durante o último treino do modelo",
+    ["model"],
+    multiprocess_mode="max",
+)
+
+ML_TRAINING_QUEUE_DEPTH = Gauge(
+    f"{_prefix}_ml_training_queue_depth",
+    "Usuários aguardando retreino no agendador",
+    multiprocess_mode="livesum",
+)
+
+ML_TRAINING_JOBS = PromCounter(
+    f"{_prefix}_ml_training_jobs_total",
+    "Jobs de retreino finalizados por status",
+    ["status"],
+)
+
+ML_TRAINING_JOB_DURATION = Histogram(
+    f"{_prefix}_ml_training_job_duration_seconds",
+    "Duração de um job de retreino (todos os modelos do usuário)",
+    buckets=TRAINING_BUCKETS,
+)
+
+ML_EXECUTOR_TASKS = PromCounter(
+    f"{_prefix}_ml_executor_tasks_total",
+    "Tarefas de ML despachadas ao pool de processos, por método e status",
+    ["method", "status"],
+)
+
+ML_EXECUTOR_TASK_DURATION = Histogram(
+    f"{_prefix}_ml_executor_task_duration_seconds",
+    "Duração das tarefas de ML no pool de processos (inclui espera na fila)",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+
+ML_EXECUTOR_IN_FLIGHT = Gauge(
+    f"{_prefix}_ml_executor_in_flight",
+    "Tarefas de ML em execução ou aguardando vaga",
+    multiprocess_mode="livesum",
+)
+
+ML_RULE_CATEGORIZER_LOOKUPS = PromCounter(
+    f"{_prefix}_ml_rule_categorizer_lookups_total",
+    "Descrições consultadas no categorizador por regras (hit, miss, no_rules)",
+    ["result"],
+)
+
+
+@dataclass
+class RequestTimings:
+    """Acumulador de tempos de uma única requisição"""
+
+    db_time: float = 0.0
+    db_statements: int = 0
+    cache_time: float = 0.0
+    cache_calls: int = 0
+    # Contagem por texto do statement, usada para detectar padrões N+1
+    statement_counts: Counter = field(default_factory=Counter)
+
+    @property
+    def max_repeated_statement(self) -> int:
+        """Maior número de execuções de um mesmo statement SQL"""
+        return max(self.statement_counts.values(), default=0)
+
+
+# Timings da requisição corrente (None fora do ciclo de uma requisição)
+request_timings_context: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def get_route_template(scope: dict) -> str:
+    """Retorna o template da rota (ex: /api/v1/contas/{conta_id}) para evitar alta cardinalidade"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or UNMATCHED_ROUTE
+
+
+def observe_request(
+    method: str,
+    route: str,
+    status_code: int,
+    duration: float,
+    timings: RequestTimings,
+    request_size: Optional[int] = None,
+    response_size: Optional[int] = None,
+) -> None:
+    """Registra as métricas de uma requisição finalizada"""
+    status = str(status_code)
+
+    REQUEST_LATENCY.labels(method, route, status).observe(duration)
+    REQUEST_DB_TIME.labels(method, route).observe(timings.db_time)
+    REQUEST_DB_STATEMENTS.labels(method, route).observe(timings.db_statements)
+    REQUEST_CACHE_TIME.labels(method, route).observe(timings.cache_time)
+
+    if request_size is not None:
+        REQUEST_SIZE.labels(method, route).observe(request_size)
+    if response_size is not None:
+        RESPONSE_SIZE.labels(method, route, status).observe(response_size)
+
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """Contabiliza tempo e quantidade de statements SQL na requisição corrente"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if not start_times:
+            return
+        elapsed = time.perf_counter() - start_times.pop()
+
+        timings = request_timings_context.get()
+        if timings is not None:
+            timings.db_time += elapsed
+            timings.db_statements += 1
+            timings.statement_counts[statement] += 1
+
+
+@contextmanager
+def track_cache_time() -> Iterator[None]:
+    """Contabiliza o tempo de uma operação de cache na requisição corrente"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings_context.get()
+        if timings is not None:
+            timings.cache_time += time.perf_counter() - start
+            timings.cache_calls += 1
+
+
+def _peak_rss_bytes() -> int:
+    """Pico de RSS do processo até agora (ru_maxrss é KB no Linux, bytes no macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class TrainingRun:
+    """Tempo de parede e memória de um treino"""
+
+    wall_time_seconds: float = 0.0
+    peak_memory_bytes: int = 0  # pico de RSS do processo ao fim do treino
+    peak_growth_bytes: int = 0  # quanto o treino elevou esse pico
+
+    def as_metrics(self) -> dict:
+        return {
+            "wall_time_seconds": round(self.wall_time_seconds, 3),
+            "peak_memory_mb": round(self.peak_memory_bytes / (1024 * 1024), 2),
+            "peak_growth_mb": round(self.peak_growth_bytes / (1024 * 1024), 2),
+        }
+
+
+@contextmanager
+def track_training(model_name: str) -> Iterator[TrainingRun]:
+    """Mede um treino pelo pico de RSS do processo (sem custo para requisições concorrentes)
+
+    O pico é do processo inteiro: no processo de treino dedicado ele é o do
+    treino; num worker da API, o crescimento só aparece se o treino passar
+    do maior pico anterior do worker.
+    """
+    run = TrainingRun()
+    peak_before = _peak_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run.wall_time_seconds = time.perf_counter() - start
+        run.peak_memory_bytes = _peak_rss_bytes()
+        run.peak_growth_bytes = run.peak_memory_bytes - peak_before
+        ML_TRAINING_DURATION.labels(model_name).observe(run.wall_time_seconds)
+        ML_TRAINING_PEAK_MEMORY.labels(model_name).set(run.peak_growth_bytes)
+
+
+def observe_cache_call(func: Callable) -> Callable:
+    """Decorator para métodos síncronos do CacheService"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with track_cache_time():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def generate_metrics_payload() -> Tuple[bytes, str]:
+    """Gera o payload no formato texto do Prometheus (agregado entre workers se multiprocess)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,260 @@
+"""
+Profiler sob demanda para requisições individuais
+
+Ativado por requisição com o header ``X-Profile: 1`` ou o query param
+``?profile=1``, somente para superusuários. Captura um perfil por amostragem
+(pyinstrument, com tempo de espera em ``await``), conta statements SQL,
+mede o tempo gasto em cada middleware e grava o resultado em formato
+speedscope, recuperável pelo endpoint administrativo /api/v1/admin/profiles.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from jose import jwt, JWTError
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import RequestTimings, request_timings_context
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+@dataclass
+class ProfileSession:
+    """Estado de uma requisição sendo perfilada"""
+
+    profile_id: str
+    # Camadas na ordem de entrada: (nome, início, fim)
+    layers: List[List[Any]] = field(default_factory=list)
+
+    def middleware_times(self) -> Dict[str, float]:
+        """Tempo exclusivo (ms) de cada middleware, descontando as camadas internas"""
+        times = {}
+        for i, (name, start, end) in enumerate(self.layers):
+            inclusive = (end or time.perf_counter()) - start
+            if i + 1 < len(self.layers):
+                _, inner_start, inner_end = self.layers[i + 1]
+                inclusive -= (inner_end or time.perf_counter()) - inner_start
+            times[name] = round(inclusive * 1000, 3)
+        return times
+
+
+profile_session_context: ContextVar[Optional[ProfileSession]] = ContextVar(
+    "profile_session", default=None
+)
+
+# pyinstrument não permite perfis sobrepostos no mesmo thread/contexto.
+# Lido e marcado sem nenhum await entre os dois (o event loop não intercala).
+_profile_in_progress = False
+
+
+def _profiles_dir() -> Path:
+    path = Path(settings.PROFILING_OUTPUT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _wants_profile(scope: Scope) -> bool:
+    """Verifica se a requisição pediu profiling via header ou query param"""
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_HEADER.encode() and value in (b"1", b"true"):
+            return True
+    query_string = scope.get("query_string", b"").decode("latin-1")
+    return f"{PROFILE_QUERY_PARAM}=1" in query_string.split("&")
+
+
+async def _is_superuser(scope: Scope) -> bool:
+    """Valida o bearer token e confirma que o usuário é superusuário ativo"""
+    from app import database
+    from app.models.user import User
+
+    authorization = ""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            authorization = value.decode("latin-1")
+            break
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        user_id = int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return False
+
+    if database.async_session_factory is None:
+        return False
+
+    async with database.async_session_factory() as session:
+        user = await User.get_by_id(session, user_id=user_id)
+        return bool(user and user.is_active and user.is_superuser)
+
+
+class MiddlewareTimer:
+    """Camada ASGI que registra entrada/saída de um middleware quando há perfil ativo"""
+
+    def __init__(self, app: ASGIApp, name: str):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        session = profile_session_context.get()
+        if session is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        layer = [self.name, time.perf_counter(), None]
+        session.layers.append(layer)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            layer[2] = time.perf_counter()
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI (mais externo) que perfila requisições marcadas por superusuários"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _profile_in_progress
+
+        if (
+            scope["type"] != "http"
+            or not settings.PROFILING_ENABLED
+            or not _wants_profile(scope)
+            or _profile_in_progress
+            or not await _is_superuser(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("Profiling solicitado, mas pyinstrument não está instalado")
+            await self.app(scope, receive, send)
+            return
+
+        # Outro perfil pode ter começado durante o await de _is_superuser
+        if _profile_in_progress:
+            await self.app(scope, receive, send)
+            return
+        _profile_in_progress = True
+
+        # Tudo a partir daqui fica no try: uma falha ao criar/iniciar o
+        # profiler não pode deixar a flag presa (desligaria o profiling)
+        profiler = None
+        session_token = timings_token = None
+        started = False
+        try:
+            session = ProfileSession(profile_id=uuid.uuid4().hex)
+            timings = RequestTimings()
+            session_token = profile_session_context.set(session)
+            timings_token = request_timings_context.set(timings)
+            status_code = 500
+
+            async def send_with_profile_id(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((PROFILE_ID_HEADER.lower().encode(), session.profile_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="enabled")
+            start = time.perf_counter()
+            profiler.start()
+            started = True
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if started:
+                profiler.stop()
+                duration = time.perf_counter() - start
+            _profile_in_progress = False
+            if session_token is not None:
+                profile_session_context.reset(session_token)
+            if timings_token is not None:
+                request_timings_context.reset(timings_token)
+            if started:
+                # Renderizar e gravar o speedscope é síncrono e pesado: fora do event loop
+                await asyncio.to_thread(
+                    self._save, profiler, session, timings, scope, status_code, duration
+                )
+
+    def _save(
+        self,
+        profiler,
+        session: ProfileSession,
+        timings: RequestTimings,
+        scope: Scope,
+        status_code: int,
+        duration: float
+    ) -> None:
+        """Grava o perfil speedscope e o resumo da requisição"""
+        from pyinstrument.renderers import SpeedscopeRenderer
+
+        try:
+            output_dir = _profiles_dir()
+            speedscope = profiler.output(renderer=SpeedscopeRenderer())
+            (output_dir / f"{session.profile_id}.speedscope.json").write_text(speedscope)
+
+            summary = {
+                "profile_id": session.profile_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status_code": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "sql": {
+                    "statements": timings.db_statements,
+                    "time_ms": round(timings.db_time * 1000, 3),
+                    "max_repeated_statement": timings.max_repeated_statement,
+                },
+                "cache": {
+                    "calls": timings.cache_calls,
+                    "time_ms": round(timings.cache_time * 1000, 3),
+                },
+                "middleware_ms": session.middleware_times(),
+            }
+            (output_dir / f"{session.profile_id}.summary.json").write_text(
+                json.dumps(summary, indent=2)
+            )
+            logger.info(f"Perfil {session.profile_id} gravado para {scope.get('path')}")
+        except Exception as e:
+            logger.error(f"Erro ao gravar perfil da requisição: {e}")
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """Lista os resumos dos perfis gravados, do mais recente para o mais antigo"""
+    summaries = sorted(
+        _profiles_dir().glob("*.summary.json"),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True
+    )
+    return [json.loads(p.read_text()) for p in summaries[:limit]]
+
+
+def get_profile_path(profile_id: str) -> Optional[Path]:
+    """Retorna o arquivo speedscope de um perfil, se existir"""
+    if not profile_id.isalnum():
+        return None
+    path = _profiles_dir() / f"{profile_id}.speedscope.json"
+    return path if path.exists() else None
@@ -14,6 +14,7 @@ from collections import defaultdict
 import asyncio
 
 from app.core.config import settings
+from app.core.log_pipeline import log_pipeline
 
 # Password hashing
 pwd_context = CryptContext(
@@ -259,15 +260,14 @@ class SecurityAudit:
     ):
         """Log security events for audit trail"""
         event = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
             "event_type": event_type,
             "user_id": user_id,
             "ip_address": ip_address,
             "details": details or {}
         }
         
-        # In production, send to proper logging system (ELK, Splunk, etc.)
-        print(f"SECURITY_AUDIT: {event}")
+        # Serialized and written by the background log pipeline (never sampled)
+        log_pipeline.submit("INFO", "SECURITY_AUDIT", event)
     
     @staticmethod
     def check_login_attempts(identifier: str) -> bool:
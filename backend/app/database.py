@@ -3,12 +3,15 @@ Database configuration and connection management for BIUAI
 Using SQLAlchemy 2.0 with async support
 """
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
 import asyncio
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.otel import instrument_sqlalchemy
 from app.models.base import Base
 
 # Global engine instance
@@ -18,7 +21,7 @@ async_session_factory: sessionmaker = None
 
 def create_engine() -> AsyncEngine:
     """Create database engine with optimized settings"""
-    return create_async_engine(
+    async_engine = create_async_engine(
         settings.DATABASE_URL,
         echo=settings.DEBUG,
         future=True,
@@ -32,6 +35,14 @@ def create_engine() -> AsyncEngine:
             }
         }
     )
+    
+    # Per-request SQL time/statement count for /metrics
+    instrument_engine(async_engine.sync_engine)
+    
+    # One span per SQL statement (when OTEL_ENABLED)
+    instrument_sqlalchemy(async_engine.sync_engine)
+    
+    return async_engine
 
 
 def create_session_factory(engine: AsyncEngine) -> sessionmaker:
@@ -86,6 +97,13 @@ async def init_db():
             
             # Create all tables
             await conn.run_sync(Base.metadata.create_all)
+            
+            # create_all não altera tabelas existentes: coluna/índice de deduplicação de importações
+            await conn.execute(text("ALTER TABLE lancamentos ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(32)"))
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_lancamentos_user_fingerprint "
+                "ON lancamentos (user_id, fingerprint)"
+            ))
             print("✅ Database tables created/verified")
             
     except Exception as e:
@@ -19,7 +19,7 @@ from typing import Dict, Any
 
 from fastapi import FastAPI, Request, Depends
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse
 from fastapi.openapi.docs import (
     get_redoc_html,
     get_swagger_ui_html,
@@ -32,6 +32,12 @@ from app.database import init_db, close_db
 from app.middleware import setup_middleware, setup_exception_handlers
 from app.api.v1.api import api_router
 from app.core.security import SecurityAudit
+from app.core.log_pipeline import log_pipeline
+from app.services.model_registry import model_registry
+from app.services.anomaly_stream import anomaly_stream
+from app.services.training_scheduler import training_scheduler
+from app.services.ml_executor import ml_executor
+from app.otel import configure_otel
 
 
 @asynccontextmanager
@@ -44,6 +50,15 @@ async def lifespan(app: FastAPI):
     await init_db()
     print("✅ Banco de dados inicializado")
     
+    # Warm ML models (readiness only flips after preload)
+    await model_registry.preload()
+    model_registry.start_watcher()
+    print(f"✅ Modelos ML carregados: {len(model_registry.status()['loaded'])}")
+    
+    # Background retraining (process pool, outside the API workers)
+    if settings.ML_TRAINING_SCHEDULER_ENABLED:
+        training_scheduler.start()
+    
     # Log startup
     SecurityAudit.log_security_event(
         "application_startup",
@@ -59,6 +74,14 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("🛑 Finalizando BIUAI API...")
     
+    # Stop model reload watcher and retraining scheduler
+    await model_registry.stop_watcher()
+    await training_scheduler.stop()
+    await ml_executor.shutdown()
+    
+    # Score lançamentos still waiting for anomaly detection
+    await anomaly_stream.shutdown()
+    
     # Close database connections
     await close_db()
     print("✅ Conexões de banco fechadas")
@@ -68,6 +91,9 @@ async def lifespan(app: FastAPI):
         "application_shutdown",
         details={"environment": settings.ENVIRONMENT}
     )
+    
+    # Flush pending structured logs
+    log_pipeline.shutdown()
 
 
 # Create FastAPI application
@@ -117,6 +143,7 @@ app = FastAPI(
     redoc_url=None,  # Disabled, we'll use custom
     swagger_ui_oauth2_redirect_url="/docs/oauth2-redirect",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     contact={
         "name": "BIUAI Support",
         "email": "suporte@biuai.com",
@@ -135,6 +162,9 @@ setup_middleware(app)
 # Setup exception handlers
 setup_exception_handlers(app)
 
+# Setup tracing (no-op unless OTEL_ENABLED)
+configure_otel(app)
+
 # Include API routes
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -17,7 +17,19 @@ from starlette.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.core.config import settings
+from app.core.log_pipeline import log_pipeline
 from app.core.security import SecurityHeaders, RateLimiter, SecurityAudit
+from app.core.metrics import (
+    REQUESTS_IN_PROGRESS,
+    RequestTimings,
+    generate_metrics_payload,
+    get_route_template,
+    observe_request,
+    request_timings_context,
+)
+from app.otel import annotate_request_span
+from app.core.profiling import MiddlewareTimer, ProfilingMiddleware
+from app.services.model_registry import model_registry
 
 # Context variables for request tracking
 request_id_context: ContextVar[str] = ContextVar('request_id', default='')
@@ -37,7 +49,10 @@ logger = logging.getLogger(__name__)
 
 
 class StructuredLogger:
-    """Structured logging for better observability"""
+    """Structured logging for better observability (non-blocking, see log_pipeline)"""
+    
+    # Headers never written to logs
+    REDACTED_HEADERS = {"authorization", "cookie", "x-api-key"}
     
     @staticmethod
     def log_request(
@@ -48,16 +63,24 @@ class StructuredLogger:
         user_id: Optional[str] = None
     ):
         """Log request in structured format"""
+        status_code = response.status_code
+        
+        # Sample high-volume successful requests; errors and slow requests are always kept
+        if status_code < 400 and duration < 1.0 and not log_pipeline.should_sample(status_code):
+            return
+        
         log_data = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
             "request_id": request_id,
             "user_id": user_id,
             "method": request.method,
             "url": str(request.url),
             "path": request.url.path,
             "query_params": dict(request.query_params),
-            "headers": dict(request.headers),
-            "status_code": response.status_code,
+            "headers": {
+                name: value for name, value in request.headers.items()
+                if name not in StructuredLogger.REDACTED_HEADERS
+            },
+            "status_code": status_code,
             "duration_ms": round(duration * 1000, 2),
             "client_ip": RateLimiter.get_client_ip(request),
             "user_agent": request.headers.get("user-agent", ""),
@@ -65,12 +88,14 @@ class StructuredLogger:
         }
         
         # Log level based on status code
-        if response.status_code >= 500:
-            logger.error("Request completed", extra=log_data)
-        elif response.status_code >= 400:
-            logger.warning("Request completed", extra=log_data)
+        if status_code >= 500:
+            level = "ERROR"
+        elif status_code >= 400:
+            level = "WARNING"
         else:
-            logger.info("Request completed", extra=log_data)
+            level = "INFO"
+        
+        log_pipeline.submit(level, "Request completed", log_data)
     
     @staticmethod
     def log_error(
@@ -81,7 +106,6 @@ class StructuredLogger:
     ):
         """Log error in structured format"""
         log_data = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
             "request_id": request_id,
             "user_id": user_id,
             "method": request.method,
@@ -92,7 +116,7 @@ class StructuredLogger:
             "client_ip": RateLimiter.get_client_ip(request)
         }
         
-        logger.error("Request error", extra=log_data)
+        log_pipeline.submit("ERROR", "Request error", log_data)
 
 
 class RequestTrackingMiddleware(BaseHTTPMiddleware):
@@ -189,32 +213,37 @@ class SecurityMiddleware(BaseHTTPMiddleware):
 
 
 class PerformanceMiddleware(BaseHTTPMiddleware):
-    """Performance monitoring and optimization middleware"""
+    """Performance monitoring middleware (Prometheus histograms per route/status)"""
     
     def __init__(self, app: FastAPI):
         super().__init__(app)
         self.slow_request_threshold = 1.0  # 1 second
-        self.metrics = {
-            "total_requests": 0,
-            "total_errors": 0,
-            "avg_response_time": 0,
-            "slow_requests": 0
-        }
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
+        if not settings.ENABLE_METRICS:
+            return await call_next(request)
         
-        # Increment request counter
-        self.metrics["total_requests"] += 1
+        method = request.method
+        # Reuse the profiler's accumulator when this request is being profiled
+        timings = request_timings_context.get()
+        if timings is None:
+            timings = RequestTimings()
+        token = request_timings_context.set(timings)
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        start_time = time.perf_counter()
+        status_code = 500
+        response_size = None
         
         try:
             response = await call_next(request)
+            status_code = response.status_code
             
             # Calculate response time
-            response_time = time.time() - start_time
+            response_time = time.perf_counter() - start_time
             
-            # Update metrics
-            self._update_metrics(response_time, response.status_code >= 400)
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit():
+                response_size = int(content_length)
             
             # Add performance headers
             response.headers["X-Response-Time"] = f"{response_time:.3f}s"
@@ -222,48 +251,28 @@ class PerformanceMiddleware(BaseHTTPMiddleware):
             # Log slow requests
             if response_time > self.slow_request_threshold:
                 logger.warning(
-                    f"Slow request detected: {request.method} {request.url.path} "
-                    f"took {response_time:.3f}s"
+                    f"Slow request detected: {method} {request.url.path} "
+                    f"took {response_time:.3f}s "
+                    f"(db={timings.db_time:.3f}s/{timings.db_statements} stmts, "
+                    f"cache={timings.cache_time:.3f}s)"
                 )
             
             return response
             
-        except Exception as error:
-            # Update error metrics
-            self.metrics["total_errors"] += 1
-            raise error
-    
-    def _update_metrics(self, response_time: float, is_error: bool):
-        """Update performance metrics"""
-        # Update average response time (simple moving average)
-        current_avg = self.metrics["avg_response_time"]
-        total_requests = self.metrics["total_requests"]
-        
-        self.metrics["avg_response_time"] = (
-            (current_avg * (total_requests - 1) + response_time) / total_requests
-        )
-        
-        # Update slow request counter
-        if response_time > self.slow_request_threshold:
-            self.metrics["slow_requests"] += 1
-        
-        # Update error counter
-        if is_error:
-            self.metrics["total_errors"] += 1
-    
-    def get_metrics(self) -> Dict[str, Any]:
-        """Get current performance metrics"""
-        return {
-            **self.metrics,
-            "error_rate": (
-                self.metrics["total_errors"] / self.metrics["total_requests"] 
-                if self.metrics["total_requests"] > 0 else 0
-            ),
-            "slow_request_rate": (
-                self.metrics["slow_requests"] / self.metrics["total_requests"]
-                if self.metrics["total_requests"] > 0 else 0
+        finally:
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            annotate_request_span(timings)
+            request_size = request.headers.get("content-length")
+            observe_request(
+                method=method,
+                route=get_route_template(request.scope),
+                status_code=status_code,
+                duration=time.perf_counter() - start_time,
+                timings=timings,
+                request_size=int(request_size) if request_size and request_size.isdigit() else None,
+                response_size=response_size
             )
-        }
+            request_timings_context.reset(token)
 
 
 class HealthCheckMiddleware(BaseHTTPMiddleware):
@@ -279,27 +288,21 @@ class HealthCheckMiddleware(BaseHTTPMiddleware):
                 "environment": settings.ENVIRONMENT
             })
         
-        # Metrics endpoint
-        if request.url.path == "/metrics":
-            # Get performance metrics if available
-            perf_middleware = None
-            for middleware in request.app.middleware_stack:
-                if isinstance(middleware.cls, type) and issubclass(middleware.cls, PerformanceMiddleware):
-                    perf_middleware = middleware
-                    break
-            
-            metrics = {}
-            if perf_middleware:
-                metrics = perf_middleware.get_metrics()
-            
-            return JSONResponse({
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "performance": metrics,
-                "system": {
-                    "environment": settings.ENVIRONMENT,
-                    "version": settings.PROJECT_VERSION
-                }
-            })
+        # Readiness: only route traffic once ML models are warm
+        if request.url.path == "/ready":
+            ready = model_registry.ready
+            return JSONResponse(
+                {
+                    "status": "ready" if ready else "starting",
+                    "models_loaded": len(model_registry.status()["loaded"])
+                },
+                status_code=200 if ready else 503
+            )
+        
+        # Metrics endpoint (Prometheus text format)
+        if request.url.path == "/metrics" and settings.ENABLE_METRICS:
+            payload, content_type = generate_metrics_payload()
+            return Response(content=payload, media_type=content_type)
         
         return await call_next(request)
 
@@ -346,18 +349,33 @@ def setup_middleware(app: FastAPI) -> None:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["X-Request-ID", "X-Response-Time"]
+        expose_headers=["X-Request-ID", "X-Response-Time", "X-Profile-Id"]
     )
     
     # Gzip compression
     app.add_middleware(GZipMiddleware, minimum_size=1000)
     
+    # Time spent below the custom middleware (gzip, CORS, router, endpoint)
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(MiddlewareTimer, name="application")
+    
     # Custom middleware (order matters!)
-    app.add_middleware(RequestTrackingMiddleware)
-    app.add_middleware(SecurityMiddleware)
-    app.add_middleware(PerformanceMiddleware)
-    app.add_middleware(HealthCheckMiddleware)
-    app.add_middleware(CacheControlMiddleware)
+    _add_timed_middleware(app, RequestTrackingMiddleware)
+    _add_timed_middleware(app, SecurityMiddleware)
+    _add_timed_middleware(app, PerformanceMiddleware)
+    _add_timed_middleware(app, HealthCheckMiddleware)
+    _add_timed_middleware(app, CacheControlMiddleware)
+    
+    # On-demand request profiler (outermost, superusers only)
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(ProfilingMiddleware)
+
+
+def _add_timed_middleware(app: FastAPI, middleware_class: type) -> None:
+    """Add middleware, wrapped by a MiddlewareTimer when profiling is enabled"""
+    app.add_middleware(middleware_class)
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(MiddlewareTimer, name=middleware_class.__name__)
 
 
 # Global exception handler
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -63,9 +63,17 @@ class Lancamento(Base):
     conta_id = Column(Integer, ForeignKey("contas.id"), nullable=True)
     conta = relationship("Conta", back_populates="lancamentos")
     
+    # Hash de (descrição normalizada, valor, data, conta, ocorrência) dos lançamentos importados
+    fingerprint = Column(String(32), nullable=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Deduplicação de importações (lançamentos manuais ficam com NULL e não conflitam)
+        Index("ix_lancamentos_user_fingerprint", "user_id", "fingerprint", unique=True),
+    )
+
 class MetaFinanceira(Base):
     __tablename__ = "metas_financeiras"
 
@@ -1,17 +1,120 @@
-from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-
-def configure_otel(app):
+"""
+Instrumentação OpenTelemetry do backend BIUAI
+
+Gera spans para requisições FastAPI, statements SQLAlchemy, comandos Redis
+(CacheService) e chamadas HTTP de saída via httpx (chatbot/memória).
+O exportador é configurável: OTLP (SigNoz), console ou arquivo local JSONL.
+"""
+
+import os
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import settings
+from app.core.metrics import RequestTimings
+
+try:
+    from opentelemetry import trace
+except ImportError:  # OpenTelemetry é opcional
+    trace = None
+
+if TYPE_CHECKING:
+    from opentelemetry.trace import Span
+
+logger = logging.getLogger(__name__)
+
+_configured = False
+
+
+def _build_exporter():
+    """Cria o exportador de spans conforme settings.OTEL_EXPORTER"""
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    exporter = settings.OTEL_EXPORTER.lower()
+
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+
+    if exporter == "file":
+        os.makedirs(os.path.dirname(settings.OTEL_TRACES_FILE) or ".", exist_ok=True)
+        traces_file = open(settings.OTEL_TRACES_FILE, "a", encoding="utf-8")
+        return ConsoleSpanExporter(
+            out=traces_file,
+            formatter=lambda span: span.to_json(indent=None) + os.linesep
+        )
+
+    return ConsoleSpanExporter()
+
+
+def configure_otel(app) -> None:
+    """Configura o TracerProvider e instrumenta FastAPI, Redis e httpx"""
+    global _configured
+
+    if not settings.OTEL_ENABLED or _configured:
+        return
+
+    if trace is None:
+        logger.warning("OTEL_ENABLED=true, mas os pacotes opentelemetry não estão instalados")
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+
     resource = Resource(attributes={
-        "service.name": "backend",
-        "deployment.environment": "local"
+        "service.name": settings.OTEL_SERVICE_NAME,
+        "service.version": settings.PROJECT_VERSION,
+        "deployment.environment": settings.ENVIRONMENT
     })
-    provider = TracerProvider(resource=resource)
-    processor = BatchSpanProcessor(OTLPSpanExporter(endpoint="http://localhost:4318/v1/traces"))
-    provider.add_span_processor(processor)
+    provider = TracerProvider(
+        resource=resource,
+        sampler=ParentBased(TraceIdRatioBased(settings.OTEL_SAMPLING_RATIO))
+    )
+    provider.add_span_processor(BatchSpanProcessor(_build_exporter()))
     trace.set_tracer_provider(provider)
-    FastAPIInstrumentor.instrument_app(app) 
\ No newline at end of file
+
+    FastAPIInstrumentor.instrument_app(app, excluded_urls=settings.OTEL_EXCLUDED_URLS)
+    RedisInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+
+    _configured = True
+    logger.info(
+        f"OpenTelemetry configurado (exporter={settings.OTEL_EXPORTER}, "
+        f"sampling={settings.OTEL_SAMPLING_RATIO})"
+    )
+
+
+def instrument_sqlalchemy(sync_engine) -> None:
+    """Gera um span por statement SQL executado pelo engine"""
+    if not settings.OTEL_ENABLED or trace is None:
+        return
+
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+
+    SQLAlchemyInstrumentor().instrument(engine=sync_engine)
+
+
+def annotate_request_span(timings: RequestTimings, span: Optional["Span"] = None) -> None:
+    """Adiciona ao span da requisição a contagem de SQL/cache e a suspeita de N+1"""
+    if trace is None:
+        return
+
+    span = span or trace.get_current_span()
+    if not span.is_recording():
+        return
+
+    max_repeated = timings.max_repeated_statement
+    span.set_attribute("db.statement_count", timings.db_statements)
+    span.set_attribute("db.time_ms", round(timings.db_time * 1000, 2))
+    span.set_attribute("db.max_repeated_statement", max_repeated)
+    span.set_attribute(
+        "db.n_plus_one_suspected",
+        max_repeated >= settings.OTEL_N_PLUS_ONE_THRESHOLD
+    )
+    span.set_attribute("cache.call_count", timings.cache_calls)
+    span.set_attribute("cache.time_ms", round(timings.cache_time * 1000, 2))
@@ -13,13 +13,24 @@ import logging
 
 from app.api.deps import get_current_user, get_db
 from app.models.user import User
-from app.services.data_intelligence_service import data_intelligence_service
-from app.services.synthetic_data_generator import synthetic_generator
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+
+# Serviços importados sob demanda: pandas/sklearn só carregam no primeiro uso,
+# não no startup de cada worker
+def get_data_intelligence_service():
+    from app.services.data_intelligence_service import data_intelligence_service
+    return data_intelligence_service
+
+
+def get_synthetic_generator():
+    from app.services.synthetic_data_generator import synthetic_generator
+    return synthetic_generator
+
+
 class AnalyzeFileResponse(BaseModel):
     """Response para análise de arquivo"""
     success: bool
@@ -37,6 +48,7 @@ class ImportConfigModel(BaseModel):
     cleaning_rules: Dict[str, Any] = {}
     create_categories: bool = True
     create_accounts: bool = True
+    dedup_mode: str = "exact"  # "exact" (impressão digital) ou "near" (também MinHash/LSH)
 
 class SyntheticDataConfig(BaseModel):
     """Configuração para geração de dados sintéticos"""
@@ -72,7 +84,7 @@ async def analyze_uploaded_file(
         
         try:
             # Analisar arquivo
-            analysis_result = await data_intelligence_service.analyze_file(
+            analysis_result = await get_data_intelligence_service().analyze_file(
                 temp_file_path, 
                 current_user.id
             )
@@ -123,10 +135,11 @@ async def import_data_with_config(
         
         try:
             # Importar dados
-            import_result = await data_intelligence_service.import_data(
+            import_result = await get_data_intelligence_service().import_data(
                 temp_file_path,
                 current_user.id,
-                import_config
+                import_config,
+                db
             )
             
             if not import_result.get("success"):
@@ -145,6 +158,7 @@ async def import_data_with_config(
                 "success": True,
                 "message": "Dados importados com sucesso",
                 "imported_records": import_result["imported_records"],
+                "duplicates": import_result["duplicates"],
                 "summary": import_result["summary"]
             }
             
@@ -181,7 +195,7 @@ async def generate_synthetic_data(
         }
         
         # Gerar dados sintéticos
-        synthetic_result = await synthetic_generator.generate_realistic_data(
+        synthetic_result = await get_synthetic_generator().generate_realistic_data(
             existing_data,
             generator_config,
             current_user.id
@@ -221,7 +235,7 @@ async def import_synthetic_data(
             "use_ai_patterns": config.use_ai_patterns
         }
         
-        synthetic_data = await synthetic_generator.generate_realistic_data(
+        synthetic_data = await get_synthetic_generator().generate_realistic_data(
             existing_data,
             generator_config,
             current_user.id
@@ -295,7 +309,7 @@ async def download_sample_data(data_type: str):
         
         # Gerar dados de exemplo
         sample_config = {"count": 20, "type": data_type, "use_ai_patterns": False}
-        sample_data = await synthetic_generator.generate_realistic_data(
+        sample_data = await get_synthetic_generator().generate_realistic_data(
             {},
             sample_config,
             user_id=0  # ID fictício para exemplo
@@ -7,6 +7,7 @@ from app.api.deps import get_db, get_current_user
 from app.models.financeiro import Lancamento, Categoria
 from app.schemas.financeiro import LancamentoCreate, LancamentoResponse, CategoriaCreate, CategoriaResponse, CategoriaUpdate
 from app.models.user import User
+from app.services.lancamento_events import lancamentos_changed, lancamentos_created
 from sqlalchemy import func, and_, select
 from decimal import Decimal
 
@@ -293,7 +294,7 @@ async def get_summary(
         data_inicio = data_fim - timedelta(days=periodo_dias)
         
         # Buscar lançamentos do período
-        query = select(Lancamento).where(
+        query = select(Lancamento.valor, Lancamento.tipo).where(
             and_(
                 Lancamento.user_id == current_user.id,
                 Lancamento.data_lancamento >= data_inicio,
@@ -301,7 +302,7 @@ async def get_summary(
             )
         )
         result = await db.execute(query)
-        lancamentos = result.scalars().all()
+        lancamentos = result.all()
         
         # Calcular totais
         total_receitas = sum(l.valor for l in lancamentos if l.tipo == "RECEITA")
@@ -331,7 +332,9 @@ async def get_dashboard_analytics(
         doze_meses = datetime.now() - timedelta(days=365)
         
         # Buscar todos os lançamentos do usuário nos últimos 12 meses
-        query = select(Lancamento).where(
+        query = select(
+            Lancamento.data_lancamento, Lancamento.tipo, Lancamento.valor
+        ).where(
             and_(
                 Lancamento.user_id == current_user.id,
                 Lancamento.data_lancamento >= doze_meses
@@ -339,7 +342,7 @@ async def get_dashboard_analytics(
         ).order_by(Lancamento.data_lancamento)
         
         result = await db.execute(query)
-        lancamentos = result.scalars().all()
+        lancamentos = result.all()
         
         # Processar evolução mensal
         evolucao_mensal = {}
@@ -366,14 +369,17 @@ async def get_dashboard_analytics(
         # Distribuição por categoria (últimos 30 dias)
         trinta_dias = datetime.now() - timedelta(days=30)
         
-        query_recentes = select(Lancamento).where(
+        query_recentes = select(
+            Lancamento.id, Lancamento.descricao, Lancamento.valor,
+            Lancamento.tipo, Lancamento.data_lancamento
+        ).where(
             and_(
                 Lancamento.user_id == current_user.id,
                 Lancamento.data_lancamento >= trinta_dias
             )
         )
         result = await db.execute(query_recentes)
-        lancamentos_recentes = result.scalars().all()
+        lancamentos_recentes = result.all()
         
         # Processar distribuição por tipo
         distribuicao = {"RECEITA": {"quantidade": 0, "total": 0}, "DESPESA": {"quantidade": 0, "total": 0}}
@@ -426,6 +432,7 @@ async def criar_lancamento(
         db.add(novo_lancamento)
         await db.commit()
         await db.refresh(novo_lancamento)
+        lancamentos_created(current_user.id, [novo_lancamento])
         return novo_lancamento
     except Exception as e:
         await db.rollback()
@@ -508,6 +515,7 @@ async def deletar_lancamento(
         
         await db.delete(lancamento)
         await db.commit()
+        lancamentos_changed(current_user.id)
         return {"message": "Lançamento removido com sucesso"}
     except Exception as e:
         await db.rollback()
@@ -556,25 +564,20 @@ async def import_siog_data(
             }
         ]
         
-        count = 0
-        for dados in dados_exemplo:
-            # Verificar se já existe
-            query = select(Lancamento).where(
-                and_(
-                    Lancamento.user_id == current_user.id,
-                    Lancamento.descricao == dados["descricao"]
-                )
-            )
-            result = await db.execute(query)
-            existe = result.scalar_one_or_none()
-            
-            if not existe:
-                lancamento = Lancamento(**dados, user_id=current_user.id)
-                db.add(lancamento)
-                count += 1
+        # Categorias pelas regras/classificador do usuário; duplicatas resolvidas
+        # pelo índice único de impressões digitais: um INSERT no total
+        from app.services.dedup import insert_deduplicated
+        from app.services.ml_service import categorize_missing
+        
+        await categorize_missing(dados_exemplo, user_id=current_user.id)
+        resultado = await insert_deduplicated(db, current_user.id, dados_exemplo)
         
         await db.commit()
-        return {"message": f"{count} lançamentos importados com sucesso do dataset SIOG"}
+        lancamentos_created(current_user.id, resultado["created"])
+        return {
+            "message": f"{resultado['inserted']} lançamentos importados com sucesso do dataset SIOG",
+            "duplicados": len(resultado["duplicates"])
+        }
         
     except Exception as e:
         await db.rollback()
@@ -595,7 +598,9 @@ async def get_evolution_data(
         data_inicio = data_fim - timedelta(days=meses * 30)
         
         # Buscar lançamentos do período
-        query = select(Lancamento).where(
+        query = select(
+            Lancamento.data_lancamento, Lancamento.tipo, Lancamento.valor
+        ).where(
             and_(
                 Lancamento.user_id == current_user.id,
                 Lancamento.data_lancamento >= data_inicio,
@@ -604,7 +609,7 @@ async def get_evolution_data(
         ).order_by(Lancamento.data_lancamento)
         
         result = await db.execute(query)
-        lancamentos = result.scalars().all()
+        lancamentos = result.all()
         
         # Agrupar por mês
         evolucao_mensal = {}
@@ -660,7 +665,7 @@ async def get_category_data(
         data_inicio = data_fim - timedelta(days=periodo_dias)
         
         # Buscar lançamentos do período
-        query = select(Lancamento).where(
+        query = select(Lancamento.valor, Lancamento.tipo).where(
             and_(
                 Lancamento.user_id == current_user.id,
                 Lancamento.data_lancamento >= data_inicio,
@@ -669,7 +674,7 @@ async def get_category_data(
         )
         
         result = await db.execute(query)
-        lancamentos = result.scalars().all()
+        lancamentos = result.all()
         
         # Calcular totais por tipo
         total_receitas = sum(float(l.valor) for l in lancamentos if l.tipo == "RECEITA")
@@ -0,0 +1,45 @@
+"""
+Schemas para predições de Machine Learning
+"""
+
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+
+class TransactionInput(BaseModel):
+    """Transação a ser categorizada"""
+    descricao: str = Field(..., description="Descrição do lançamento")
+    valor: float = Field(..., description="Valor (negativo para despesas)")
+    data_lancamento: Optional[datetime] = Field(None, description="Data do lançamento")
+
+
+class BatchCategorizationRequest(BaseModel):
+    """Lote de transações para categorização"""
+    transactions: List[TransactionInput] = Field(
+        ..., min_length=1, max_length=settings.ML_BATCH_MAX_ITEMS,
+        description="Transações a categorizar"
+    )
+    top_k: int = Field(3, ge=1, le=10, description="Número de categorias retornadas por transação")
+
+
+class CategoryScore(BaseModel):
+    """Categoria candidata e sua probabilidade"""
+    categoria_id: int
+    probability: float
+
+
+class CategoryPrediction(BaseModel):
+    """Predição de categoria para uma transação"""
+    predicted_category: Optional[int] = None
+    confidence: float
+    top_k: List[CategoryScore]
+    source: str = Field("model", description="rule, model ou unmatched")
+
+
+class BatchCategorizationResponse(BaseModel):
+    """Predições na mesma ordem das transações enviadas"""
+    model_version: Optional[str] = None
+    predictions: List[CategoryPrediction]
@@ -0,0 +1,124 @@
+"""
+Pontuação de anomalias em micro-lotes para lançamentos recém-gravados
+
+As escritas apenas enfileiram o lançamento (O(1), sem ML no caminho da
+requisição). Uma task de background agrupa os lançamentos por usuário e os
+pontua a cada ML_ANOMALY_FLUSH_INTERVAL segundos (ou ao atingir
+ML_ANOMALY_BATCH_SIZE) contra o detector já treinado e em memória no
+registro de modelos — o histórico do usuário nunca é re-treinado aqui.
+As anomalias encontradas ficam no cache para consulta pela API.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.financeiro import TipoLancamento
+from app.services.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "anomalies"
+
+
+def to_ml_transaction(lancamento: Any) -> Dict[str, Any]:
+    """Lançamento (ORM ou linha de colunas) no formato dos modelos: despesas com valor negativo"""
+    valor = float(lancamento.valor)
+    return {
+        "id": lancamento.id,
+        "descricao": lancamento.descricao,
+        "valor": -valor if lancamento.tipo == TipoLancamento.DESPESA else valor,
+        "data_lancamento": lancamento.data_lancamento,
+        "categoria_id": lancamento.categoria_id,
+    }
+
+
+class AnomalyStream:
+    """Fila por usuário drenada em micro-lotes por uma task asyncio"""
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 2.0, keep_last: int = 100):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.keep_last = keep_last
+
+        self._pending: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        self._pending_count = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"submitted": 0, "scored": 0, "anomalies": 0, "skipped_untrained": 0}
+
+    def submit(self, user_id: int, transaction: Dict[str, Any]) -> None:
+        """Enfileira um lançamento para pontuação"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        self._pending[user_id].append(transaction)
+        self._pending_count += 1
+        self.stats["submitted"] += 1
+
+        if self._pending_count >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao pontuar anomalias: {e}")
+
+    async def flush(self) -> None:
+        """Pontua tudo o que estiver pendente, um lote por usuário"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(list)
+        self._pending_count = 0
+
+        # Import sob demanda (pandas/sklearn fora do startup)
+        from app.services.ml_service import ml_service
+
+        for user_id, transactions in pending.items():
+            result = await ml_service.score_anomalies(transactions, user_id=user_id)
+            if "error" in result:
+                self.stats["skipped_untrained"] += len(transactions)
+                continue
+
+            self.stats["scored"] += len(transactions)
+            if result["anomalies"]:
+                self.stats["anomalies"] += len(result["anomalies"])
+                self._store(user_id, result["anomalies"])
+
+    def _store(self, user_id: int, anomalies: List[Dict[str, Any]]) -> None:
+        key = f"{CACHE_PREFIX}:{user_id}"
+        recent = (cache.get(key) or []) + anomalies
+        cache.set(key, recent[-self.keep_last:], ttl=settings.ML_PREDICTION_CACHE_TTL)
+
+    def recent(self, user_id: int) -> List[Dict[str, Any]]:
+        """Anomalias mais recentes encontradas para o usuário"""
+        return cache.get(f"{CACHE_PREFIX}:{user_id}") or []
+
+    async def shutdown(self) -> None:
+        """Cancela a task e pontua o que ainda estiver na fila"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+
+# Instância global do stream
+anomaly_stream = AnomalyStream(
+    batch_size=settings.ML_ANOMALY_BATCH_SIZE,
+    flush_interval=settings.ML_ANOMALY_FLUSH_INTERVAL
+)
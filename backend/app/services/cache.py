@@ -1,9 +1,32 @@
 import json
 import redis
-from typing import Any, Optional, Union
+from typing import Any, Dict, List, Optional, Union, cast
 from datetime import timedelta
 import os
 
+from app.core.metrics import observe_cache_call
+
+# HINCRBYFLOAT only when the key exists, atomically (returns nil otherwise)
+HINCRBYFLOAT_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('HINCRBYFLOAT', KEYS[1], ARGV[1], ARGV[2])
+end
+return false
+"""
+
+# Replace a hash only if a guard key still holds the expected value (0 when missing)
+HASH_REPLACE_IF_GUARD = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+if tonumber(ARGV[2]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
 class CacheService:
     def __init__(self):
         self.redis_client = redis.Redis(
@@ -16,6 +39,7 @@ class CacheService:
             retry_on_timeout=True
         )
         
+    @observe_cache_call
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         try:
@@ -27,6 +51,7 @@ class CacheService:
             print(f"Cache get error: {e}")
             return None
     
+    @observe_cache_call
     def set(
         self, 
         key: str, 
@@ -46,6 +71,7 @@ class CacheService:
             print(f"Cache set error: {e}")
             return False
     
+    @observe_cache_call
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         try:
@@ -54,6 +80,17 @@ class CacheService:
             print(f"Cache delete error: {e}")
             return False
     
+    @observe_cache_call
+    def delete_pattern(self, pattern: str) -> int:
+        """Delete every key matching a glob pattern (SCAN, non-blocking)"""
+        try:
+            keys = list(self.redis_client.scan_iter(match=pattern, count=500))
+            return cast(int, self.redis_client.delete(*keys)) if keys else 0
+        except Exception as e:
+            print(f"Cache delete pattern error: {e}")
+            return 0
+
+    @observe_cache_call
     def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
         try:
@@ -62,6 +99,63 @@ class CacheService:
             print(f"Cache exists error: {e}")
             return False
     
+    @observe_cache_call
+    def hash_get_many(self, key: str, fields: List[str]) -> List[Optional[str]]:
+        """Get several fields of a hash (None for missing fields)"""
+        try:
+            return cast(List[Optional[str]], self.redis_client.hmget(key, fields))
+        except Exception as e:
+            print(f"Cache hmget error: {e}")
+            return [None] * len(fields)
+    
+    @observe_cache_call
+    def hash_replace_if(
+        self,
+        key: str,
+        mapping: Dict[str, Any],
+        guard_key: str,
+        guard_value: int,
+        ttl: Optional[Union[int, timedelta]] = None
+    ) -> bool:
+        """Atomically replace a whole hash, unless guard_key changed since it was read"""
+        try:
+            if isinstance(ttl, timedelta):
+                ttl = int(ttl.total_seconds())
+            args: List[Any] = [guard_value, ttl or 0]
+            for field, value in mapping.items():
+                args.extend((field, value))
+            return bool(self.redis_client.eval(HASH_REPLACE_IF_GUARD, 2, key, guard_key, *args))
+        except Exception as e:
+            print(f"Cache hash replace error: {e}")
+            return False
+    
+    @observe_cache_call
+    def incr(self, key: str) -> Optional[int]:
+        """Atomically increment an integer counter"""
+        try:
+            return cast(int, self.redis_client.incr(key))
+        except Exception as e:
+            print(f"Cache incr error: {e}")
+            return None
+    
+    @observe_cache_call
+    def hash_incr_float_if_exists(self, key: str, field: str, amount: float) -> bool:
+        """Increment a hash field only if the hash already exists (no partial hashes)"""
+        try:
+            return self.redis_client.eval(HINCRBYFLOAT_IF_EXISTS, 1, key, field, amount) is not None
+        except Exception as e:
+            print(f"Cache hincrbyfloat error: {e}")
+            return False
+    
+    @observe_cache_call
+    def acquire_lock(self, key: str, ttl: int, owner: str = "1") -> bool:
+        """Best-effort distributed lock (SET NX EX); expires on its own after ttl seconds"""
+        try:
+            return bool(self.redis_client.set(key, owner, nx=True, ex=ttl))
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+            return False
+    
     def flush_all(self) -> bool:
         """Clear all cache"""
         try:
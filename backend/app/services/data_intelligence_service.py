@@ -20,9 +20,13 @@ import asyncio
 import aiofiles
 from decimal import Decimal
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.models.financeiro import Lancamento, Categoria, Conta, TipoLancamento
 from app.models.user import User
 from app.services.cache import cache
+from app.services.dedup import insert_deduplicated
+from app.services.lancamento_events import lancamentos_created
 from app.core.config import settings
 
 fake = Faker('pt_BR')
@@ -91,9 +95,14 @@ class DataIntelligenceService:
             logger.error(f"Erro ao analisar arquivo: {e}")
             return {"error": str(e), "can_import": False}
     
-    async def import_data(self, file_path: str, user_id: int, mapping_config: Dict[str, Any]) -> Dict[str, Any]:
+    async def import_data(
+        self, file_path: str, user_id: int, mapping_config: Dict[str, Any], db: AsyncSession
+    ) -> Dict[str, Any]:
         """
         Importa dados usando o mapeamento configurado
+
+        Linhas já importadas (mesma impressão digital) são ignoradas;
+        ``mapping_config['dedup_mode'] = 'near'`` também ignora quase-duplicatas.
         """
         try:
             # Carregar dados
@@ -113,12 +122,16 @@ class DataIntelligenceService:
             
             if validation_results['valid']:
                 # Importar para o banco
-                import_results = await self._import_to_database(mapped_data, user_id)
+                import_results = await self._import_to_database(
+                    mapped_data, user_id, db, mapping_config.get('dedup_mode', 'exact')
+                )
                 
                 return {
                     "success": True,
                     "imported_records": import_results['count'],
+                    "auto_categorized": import_results['auto_categorized'],
                     "summary": import_results['summary'],
+                    "duplicates": import_results['duplicates'],
                     "validation_results": validation_results
                 }
             else:
@@ -371,13 +384,26 @@ class DataIntelligenceService:
             "total_records": len(data)
         }
     
-    async def _import_to_database(self, data: List[Dict[str, Any]], user_id: int) -> Dict[str, Any]:
-        """Importa dados validados para o banco"""
-        # Esta parte seria implementada com a sessão do banco
-        # Por ora, retorna mock results
+    async def _import_to_database(
+        self, data: List[Dict[str, Any]], user_id: int, db: AsyncSession, dedup_mode: str = 'exact'
+    ) -> Dict[str, Any]:
+        """Importa dados validados para o banco, categorizando-os e ignorando duplicatas"""
+        # Import sob demanda (pandas/sklearn fora do startup)
+        from app.services.ml_service import categorize_missing
+        
+        categorized = await categorize_missing(data, user_id=user_id)
+        result = await insert_deduplicated(db, user_id, data, mode=dedup_mode)
+        await db.commit()
+        lancamentos_created(user_id, result['created'])
         
         return {
-            "count": len(data),
+            "count": result['inserted'],
+            "auto_categorized": categorized,
+            "duplicates": {
+                "exact": len(result['duplicates']),
+                "near": len(result['near_duplicates']),
+                "rows": result['duplicates'] + [d['index'] for d in result['near_duplicates']]
+            },
             "summary": {
                 "receitas": len([d for d in data if d.get('tipo') == TipoLancamento.RECEITA]),
                 "despesas": len([d for d in data if d.get('tipo') == TipoLancamento.DESPESA]),
@@ -0,0 +1,252 @@
+"""
+Detecção de lançamentos duplicados em importações
+
+Cada linha importada recebe uma impressão digital: hash de (descrição
+normalizada, valor, data, conta) mais o número da ocorrência dessa chave no
+próprio arquivo — duas compras iguais no mesmo dia continuam sendo dois
+lançamentos, mas reimportar o mesmo extrato gera as mesmas impressões. O
+índice único (user_id, fingerprint) é a fonte da verdade: cada lote é
+gravado com um único INSERT ... ON CONFLICT DO NOTHING RETURNING, ou seja,
+uma ida ao banco por lote, e o que não voltou no RETURNING é duplicata.
+
+No modo "near", linhas com descrição parecida (MinHash/LSH sobre trigramas
+de caracteres), mesmo valor (± IMPORT_NEAR_DUP_AMOUNT_TOLERANCE) e data
+próxima (± IMPORT_NEAR_DUP_DAYS) de um lançamento existente também são
+descartadas — pega o mesmo lançamento vindo de bancos/formatos diferentes.
+Custa uma consulta a mais por lote (os lançamentos da janela de datas).
+
+Os lançamentos inseridos voltam no RETURNING e são devolvidos ao chamador,
+que depois do commit os repassa a lancamentos_created (caches, feature store
+de gastos e stream de anomalias).
+"""
+
+import hashlib
+import zlib
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.financeiro import Lancamento
+from app.utils.text_normalizer import normalize_description
+
+DEDUP_MODES = ("exact", "near")
+
+# Colunas de Lancamento aceitas dos registros importados
+INSERT_COLUMNS = ("descricao", "valor", "tipo", "data_lancamento", "categoria_id", "conta_id")
+
+# Primo de Mersenne de 31 bits: com x e a < p, a·x + b < 2^63 cabe em uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+def fingerprint_key(record: Dict[str, Any]) -> str:
+    """Chave canônica de um lançamento: descrição normalizada|valor|data|conta"""
+    dia = _as_date(record.get("data_lancamento"))
+    return "|".join((
+        normalize_description(record.get("descricao") or ""),
+        f"{float(record.get('valor') or 0):.2f}",
+        dia.isoformat() if dia else "",
+        str(record.get("conta_id") or ""),
+    ))
+
+
+def assign_fingerprints(records: Sequence[Dict[str, Any]]) -> List[str]:
+    """Impressão digital de cada registro, numerando ocorrências repetidas da mesma chave"""
+    occurrences: Counter = Counter()
+    fingerprints = []
+    for record in records:
+        key = fingerprint_key(record)
+        occurrences[key] += 1
+        digest = hashlib.blake2b(f"{key}#{occurrences[key]}".encode(), digest_size=16)
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+class MinHashLSH:
+    """MinHash de trigramas de caracteres com LSH por bandas (índice em memória)"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm deve ser múltiplo de bands")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: Dict[Tuple[int, bytes], List[Any]] = defaultdict(list)
+        self._signatures: Dict[Any, np.ndarray] = {}
+
+    @staticmethod
+    def _shingles(text: str) -> Set[int]:
+        text = f" {normalize_description(text)} "
+        return {zlib.crc32(text[i:i + 3].encode()) for i in range(max(len(text) - 2, 1))}
+
+    def signature(self, text: str) -> np.ndarray:
+        # Reduzidos mod p antes do produto, que assim não estoura 64 bits
+        shingles = np.fromiter(self._shingles(text), dtype=np.uint64) % np.uint64(_MERSENNE_PRIME)
+        # (a·x + b) mod p; mínimo por permutação
+        hashed = (np.outer(self.a, shingles) + self.b[:, None]) % np.uint64(_MERSENNE_PRIME)
+        return hashed.min(axis=1)
+
+    def add(self, key: Any, text: str) -> None:
+        signature = self.signature(text)
+        self._signatures[key] = signature
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            self._buckets[(band, chunk)].append(key)
+
+    def query(self, text: str, threshold: float) -> List[Tuple[Any, float]]:
+        """Chaves com similaridade de Jaccard estimada >= threshold"""
+        signature = self.signature(text)
+        candidates = set()
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            candidates.update(self._buckets.get((band, chunk), ()))
+        matches = []
+        for key in candidates:
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+
+async def _load_window(
+    db: AsyncSession, user_id: int, records: Sequence[Dict[str, Any]]
+) -> List[Tuple[int, str, float, Optional[date]]]:
+    """Lançamentos existentes do usuário na janela de datas do lote (uma consulta)"""
+    dias = [d for d in (_as_date(r.get("data_lancamento")) for r in records) if d]
+    if not dias:
+        return []
+    margem = timedelta(days=settings.IMPORT_NEAR_DUP_DAYS)
+    result = await db.execute(
+        select(Lancamento.id, Lancamento.descricao, Lancamento.valor, Lancamento.data_lancamento).where(
+            and_(
+                Lancamento.user_id == user_id,
+                Lancamento.data_lancamento >= datetime.combine(min(dias) - margem, datetime.min.time()),
+                Lancamento.data_lancamento <= datetime.combine(max(dias) + margem, datetime.max.time()),
+            )
+        )
+    )
+    return [(row.id, row.descricao or "", float(row.valor or 0), _as_date(row.data_lancamento)) for row in result.all()]
+
+
+def _find_near_duplicates(
+    records: Sequence[Dict[str, Any]], existing: List[Tuple[int, str, float, Optional[date]]]
+) -> Dict[int, Dict[str, Any]]:
+    """Índice do registro -> lançamento existente quase idêntico"""
+    if not existing:
+        return {}
+    lsh = MinHashLSH()
+    by_id = {}
+    for lancamento_id, descricao, valor, dia in existing:
+        lsh.add(lancamento_id, descricao)
+        by_id[lancamento_id] = (valor, dia)
+
+    max_days = settings.IMPORT_NEAR_DUP_DAYS
+    tolerance = settings.IMPORT_NEAR_DUP_AMOUNT_TOLERANCE
+    near = {}
+    for index, record in enumerate(records):
+        valor = float(record.get("valor") or 0)
+        dia = _as_date(record.get("data_lancamento"))
+        for lancamento_id, similarity in lsh.query(record.get("descricao") or "", settings.IMPORT_NEAR_DUP_THRESHOLD):
+            existing_valor, existing_dia = by_id[lancamento_id]
+            if abs(existing_valor - valor) > tolerance:
+                continue
+            if dia and existing_dia and abs((existing_dia - dia).days) > max_days:
+                continue
+            near[index] = {"lancamento_id": lancamento_id, "similarity": round(similarity, 3)}
+            break
+    return near
+
+
+async def insert_deduplicated(
+    db: AsyncSession,
+    user_id: int,
+    records: Sequence[Dict[str, Any]],
+    mode: str = "exact",
+) -> Dict[str, Any]:
+    """Grava os registros que não são duplicados, um INSERT por lote de IMPORT_BATCH_SIZE
+
+    Retorna quantos foram inseridos, os lançamentos criados (linhas com as
+    colunas de Lancamento) e os índices (no arquivo) das duplicatas exatas e,
+    no modo "near", das quase-duplicatas com o lançamento existente.
+    Não faz commit: a transação é do chamador, que depois dele deve chamar
+    lancamentos_created(user_id, result["created"]).
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Modo de deduplicação inválido: {mode}")
+
+    fingerprints = assign_fingerprints(records)
+    created: List[Any] = []
+    duplicates: List[int] = []
+    near_duplicates: List[Dict[str, Any]] = []
+
+    batch_size = settings.IMPORT_BATCH_SIZE
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        batch_fingerprints = fingerprints[start:start + batch_size]
+
+        skip: Set[int] = set()
+        if mode == "near":
+            existing = await _load_window(db, user_id, batch)
+            for offset, match in _find_near_duplicates(batch, existing).items():
+                skip.add(offset)
+                near_duplicates.append({"index": start + offset, **match})
+
+        rows = [
+            {
+                # Mesmas chaves em todas as linhas: um único INSERT multi-VALUES
+                **{column: record.get(column) for column in INSERT_COLUMNS},
+                "user_id": user_id,
+                "fingerprint": fingerprint,
+            }
+            for offset, (record, fingerprint) in enumerate(zip(batch, batch_fingerprints))
+            if offset not in skip
+        ]
+        if not rows:
+            continue
+
+        result = await db.execute(
+            pg_insert(Lancamento)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["user_id", "fingerprint"])
+            .returning(
+                Lancamento.id,
+                Lancamento.descricao,
+                Lancamento.valor,
+                Lancamento.tipo,
+                Lancamento.data_lancamento,
+                Lancamento.categoria_id,
+                Lancamento.fingerprint,
+            )
+        )
+        batch_created = result.all()
+        created.extend(batch_created)
+        created_fingerprints = {row.fingerprint for row in batch_created}
+        duplicates.extend(
+            start + offset
+            for offset, fingerprint in enumerate(batch_fingerprints)
+            if offset not in skip and fingerprint not in created_fingerprints
+        )
+
+    return {
+        "inserted": len(created),
+        "created": created,
+        "duplicates": duplicates,
+        "near_duplicates": near_duplicates,
+    }
@@ -0,0 +1,49 @@
+"""
+Efeitos colaterais de escritas de lançamentos
+
+Todas as rotas que gravam lançamentos (/api/v1/lancamentos, /api/v1/financeiro
+e as importações em lote) chamam estes ganchos depois do commit, para que os
+caches de listagem/resumo e o feature store de gasto diário reflitam a
+escrita e os lançamentos novos sejam pontuados pelo stream de anomalias,
+independentemente do caminho usado.
+"""
+
+from typing import Any, Sequence
+
+from app.models.financeiro import TipoLancamento
+from app.services.anomaly_stream import anomaly_stream, to_ml_transaction
+from app.services.cache import cache
+from app.services.spending_features import spending_feature_store
+
+
+def _clear_user_caches(user_id: int) -> None:
+    cache.delete_pattern(f"lancamentos:{user_id}:*")
+    cache.delete_pattern(f"summary:{user_id}:*")
+
+
+def lancamentos_created(user_id: int, lancamentos: Sequence[Any]) -> None:
+    """Lançamentos novos (ORM ou linhas com as mesmas colunas) já gravados"""
+    if not lancamentos:
+        return
+    _clear_user_caches(user_id)
+
+    if len(lancamentos) == 1:
+        # Escrita única: incrementa o dia no feature store
+        lancamento = lancamentos[0]
+        if lancamento.tipo == TipoLancamento.DESPESA:
+            spending_feature_store.record_expense(
+                user_id, lancamento.data_lancamento, float(lancamento.valor)
+            )
+    else:
+        # Lote: uma reconstrução agregada sai mais barato que N incrementos
+        spending_feature_store.invalidate(user_id)
+
+    # Pontuados contra o detector do usuário no próximo micro-lote
+    for lancamento in lancamentos:
+        anomaly_stream.submit(user_id, to_ml_transaction(lancamento))
+
+
+def lancamentos_changed(user_id: int) -> None:
+    """Lançamentos editados ou removidos: descarta os dados derivados do usuário"""
+    _clear_user_caches(user_id)
+    spending_feature_store.invalidate(user_id)
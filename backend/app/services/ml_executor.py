@@ -0,0 +1,151 @@
+"""
+Execução de análises de ML (pandas/sklearn, CPU-bound) fora do event loop
+
+Os métodos do MLFinancialAnalyzer são async, mas fazem trabalho síncrono
+pesado; aguardá-los direto congela o worker inteiro. Este executor despacha
+a chamada para um pool de processos dedicado, com:
+
+- limite de tarefas simultâneas por worker (as demais esperam vaga);
+- timeout por tarefa (a tarefa ainda na fila é cancelada; a que já está
+  rodando tem o resultado descartado, mas continua ocupando a vaga até o
+  filho terminar, para que o limite reflita a CPU realmente em uso);
+- cancelamento propagado: se a requisição é cancelada, o future também é.
+
+Os processos filhos usam o mesmo registro de modelos (em disco), então
+modelos treinados lá ficam visíveis aqui após um refresh do registro. Como
+os filhos não têm watcher, o registro deles confere o manifesto a cada
+acesso e recarrega versões promovidas por outro processo (agendador,
+/ml/anomalies/train ou outro filho).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import (
+    ML_EXECUTOR_IN_FLIGHT,
+    ML_EXECUTOR_TASK_DURATION,
+    ML_EXECUTOR_TASKS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MLTaskTimeout(Exception):
+    """A tarefa de ML excedeu o tempo limite"""
+
+
+def _init_child() -> None:
+    """Executado uma vez por processo filho"""
+    from app.services.model_registry import model_registry
+
+    model_registry.revalidate = True
+
+
+def _run_analyzer_method(method: str, args: tuple, kwargs: dict) -> Any:
+    """Executado no processo filho: roda um método do MLFinancialAnalyzer"""
+    from app.services.ml_service import ml_service
+
+    return asyncio.run(getattr(ml_service, method)(*args, **kwargs))
+
+
+class MLExecutor:
+    """Pool de processos com limite de concorrência, timeout e cancelamento"""
+
+    def __init__(self, max_workers: int = 2, max_concurrency: int = 4, timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._occupied = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_child,
+            )
+        return self._pool
+
+    async def run(self, method: str, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Executa ml_service.<method>(*args, **kwargs) em um processo do pool"""
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        status = "error"
+        self._in_flight += 1
+        ML_EXECUTOR_IN_FLIGHT.inc()
+        try:
+            # O timeout cobre também a espera por uma vaga
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            self._occupied += 1
+            loop = asyncio.get_running_loop()
+            try:
+                pool_future = self._get_pool().submit(_run_analyzer_method, method, args, kwargs)
+            except BaseException:
+                self._release_slot()
+                raise
+            # A vaga só é liberada quando o filho termina (ou a tarefa sai da fila),
+            # não quando desistimos de esperar por ela
+            pool_future.add_done_callback(lambda _: self._release_slot_threadsafe(loop))
+            # wait_for cancela o future no timeout (e no cancelamento da requisição)
+            remaining = max(timeout - (time.perf_counter() - start), 0)
+            result = await asyncio.wait_for(asyncio.wrap_future(pool_future), timeout=remaining)
+            status = "success"
+            return result
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise MLTaskTimeout(f"{method} excedeu {timeout:.0f}s")
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except BrokenProcessPool:
+            # Um filho morreu (ex: OOM): o próximo uso recria o pool
+            logger.error(f"Pool de ML quebrado durante {method}; recriando")
+            self._pool = None
+            raise
+        finally:
+            self._in_flight -= 1
+            ML_EXECUTOR_IN_FLIGHT.dec()
+            ML_EXECUTOR_TASKS.labels(method, status).inc()
+            ML_EXECUTOR_TASK_DURATION.labels(method).observe(time.perf_counter() - start)
+
+    def _release_slot(self) -> None:
+        self._occupied -= 1
+        self._semaphore.release()
+
+    def _release_slot_threadsafe(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Callback do future do pool (roda na thread de gerenciamento do pool)"""
+        try:
+            loop.call_soon_threadsafe(self._release_slot)
+        except RuntimeError:
+            pass  # loop já encerrado: não há mais quem espere pela vaga
+
+    async def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "occupied_slots": self._occupied,
+            "timeout": self.timeout,
+        }
+
+
+# Instância global do executor
+ml_executor = MLExecutor(
+    max_workers=settings.ML_EXECUTOR_WORKERS,
+    max_concurrency=settings.ML_EXECUTOR_MAX_CONCURRENCY,
+    timeout=settings.ML_EXECUTOR_TIMEOUT
+)
@@ -4,99 +4,66 @@ Análise financeira inteligente, classificação automática e predições
 """
 
 import asyncio
+import copy
+import hashlib
 import json
-import pickle
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta
-from pathlib import Path
+from datetime import date, datetime, timedelta
 
 # Machine Learning
 from sklearn.model_selection import train_test_split
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.cluster import KMeans
-from sklearn.metrics import classification_report, accuracy_score
-import xgboost as xgb
-import lightgbm as lgb
+from sklearn.metrics import accuracy_score
 
-# Time Series
-import statsmodels.api as sm
-from statsmodels.tsa.seasonal import seasonal_decompose
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-
-# Natural Language Processing
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer
-
-# Data Processing
-from sklearn.utils import resample
-import joblib
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.cache import cached_function, FinancialCache
+from app.core.metrics import track_training
+from app.models.financeiro import TipoLancamento
+from app.utils.text_normalizer import normalize_description, normalize_series
+from app.services.model_registry import model_registry, user_scope
+from app.services.rule_categorizer import match_rules, rule_stats
+from app.services.spending_features import (
+    HISTORY_DAYS,
+    LAGS,
+    ROLLING_WINDOWS,
+    SPENDING_FEATURE_COLUMNS,
+    spending_feature_store,
+)
+
+# Nomes dos modelos no registro
+CATEGORY_CLASSIFIER = "category_classifier"
+SPENDING_PREDICTOR = "spending_predictor"
+ANOMALY_DETECTOR = "anomaly_detector"
+TRANSACTION_CLUSTERS = "transaction_clusters"
+
+# Numerical columns appended to the TF-IDF matrix of the category classifier
+CATEGORY_NUMERICAL_FEATURES = ['valor_abs', 'day_of_week', 'month', 'is_weekend']
+
+# Features of the per-user anomaly detector
+ANOMALY_FEATURES = ['valor_abs', 'day_of_week', 'month']
+
+# Features of the per-user transaction clustering
+CLUSTERING_FEATURES = ['valor_abs', 'day_of_week', 'month']
 
 
 class MLFinancialAnalyzer:
     """Advanced ML analyzer for financial data"""
     
     def __init__(self):
-        self.models_path = Path("app/ml_models")
-        self.models_path.mkdir(exist_ok=True)
-        
-        # Models
-        self.category_classifier = None
-        self.spending_predictor = None
-        self.anomaly_detector = None
-        
-        # Preprocessors
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
-        self.scaler = StandardScaler()
-        self.label_encoder = LabelEncoder()
-        
-        # NLP
-        self.stemmer = PorterStemmer()
-        self.stopwords = set(stopwords.words('portuguese') + stopwords.words('english'))
-        
-        # Initialize NLTK data
-        self._init_nltk()
-    
-    def _init_nltk(self):
-        """Initialize NLTK data"""
-        try:
-            nltk.download('punkt', quiet=True)
-            nltk.download('stopwords', quiet=True)
-            nltk.download('wordnet', quiet=True)
-        except Exception as e:
-            print(f"NLTK initialization warning: {e}")
+        # Trained models live in the model registry (per user, versioned)
+        self.registry = model_registry
     
     def preprocess_text(self, text: str) -> str:
-        """Preprocess text for ML analysis"""
-        if not text:
-            return ""
-        
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Tokenize
-        tokens = word_tokenize(text)
-        
-        # Remove stopwords and stem
-        processed_tokens = [
-            self.stemmer.stem(token) 
-            for token in tokens 
-            if token.isalpha() and token not in self.stopwords
-        ]
-        
-        return " ".join(processed_tokens)
+        """Preprocess text for ML analysis (memoized normalizer)"""
+        return normalize_description(text or "")
     
     def extract_transaction_features(self, transactions: List[Dict]) -> pd.DataFrame:
         """Extract features from transactions for ML"""
@@ -108,9 +75,9 @@ class MLFinancialAnalyzer:
         # Basic features
         features = df.copy()
         
-        # Text preprocessing
+        # Text preprocessing (once per distinct description)
         if 'descricao' in features.columns:
-            features['descricao_processed'] = features['descricao'].apply(self.preprocess_text)
+            features['descricao_processed'] = normalize_series(features['descricao'])
         
         # Date features
         if 'data_lancamento' in features.columns:
@@ -134,116 +101,160 @@ class MLFinancialAnalyzer:
         
         return features
     
-    async def train_category_classifier(self, transactions: List[Dict]) -> Dict[str, Any]:
-        """Train model to classify transaction categories"""
+    def _category_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Columns consumed by the category pipeline, with missing values filled"""
+        frame = df.reindex(columns=['descricao_processed'] + CATEGORY_NUMERICAL_FEATURES)
+        frame['descricao_processed'] = frame['descricao_processed'].fillna("")
+        frame[CATEGORY_NUMERICAL_FEATURES] = frame[CATEGORY_NUMERICAL_FEATURES].fillna(0)
+        return frame
+    
+    def _build_category_pipeline(self) -> Pipeline:
+        """Sparse TF-IDF + numerical passthrough feeding a parallel RandomForest"""
+        features = ColumnTransformer(
+            [
+                ('text', TfidfVectorizer(
+                    max_features=1000,
+                    # normalize_description already drops the Portuguese STOPWORDS
+                    stop_words=None,
+                    ngram_range=(1, 2),
+                    dtype=np.float32
+                ), 'descricao_processed'),
+                ('numeric', 'passthrough', CATEGORY_NUMERICAL_FEATURES)
+            ],
+            sparse_threshold=1.0  # always keep the combined matrix sparse
+        )
+        classifier = RandomForestClassifier(
+            n_estimators=100,
+            max_depth=10,
+            random_state=42,
+            class_weight='balanced',
+            n_jobs=settings.ML_N_JOBS
+        )
+        return Pipeline([('features', features), ('classifier', classifier)])
+    
+    def _fit_category_pipeline(self, df: pd.DataFrame) -> Tuple[Pipeline, Dict[str, Any]]:
+        """Fit and evaluate the category pipeline (blocking, CPU-bound)"""
+        X = self._category_frame(df)
+        y = df['categoria_id'].values
+        
+        # Split data
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+        
+        with track_training(CATEGORY_CLASSIFIER) as run:
+            pipeline = self._build_category_pipeline()
+            pipeline.fit(X_train, y_train)
+        
+        # Evaluate
+        y_pred = pipeline.predict(X_test)
+        
+        metrics = {
+            "accuracy": accuracy_score(y_test, y_pred),
+            "training_samples": len(X_train),
+            "test_samples": len(X_test),
+            "features_count": len(pipeline.named_steps['features'].get_feature_names_out()),
+            **run.as_metrics()
+        }
+        return pipeline, metrics
+    
+    async def train_category_classifier(
+        self, transactions: List[Dict], user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Train model to classify transaction categories and promote it in the registry"""
         try:
             df = self.extract_transaction_features(transactions)
             
             if df.empty or 'categoria_id' not in df.columns:
                 return {"error": "Insufficient data for training"}
             
-            # Prepare features
-            features = []
-            if 'descricao_processed' in df.columns:
-                # TF-IDF features
-                tfidf_features = self.tfidf_vectorizer.fit_transform(df['descricao_processed'])
-                features.append(tfidf_features.toarray())
-            
-            # Numerical features
-            numerical_cols = ['valor_abs', 'day_of_week', 'month', 'is_weekend']
-            numerical_features = df[numerical_cols].fillna(0).values
-            features.append(numerical_features)
-            
-            # Combine features
-            X = np.hstack(features) if features else numerical_features
-            y = df['categoria_id'].values
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=y
-            )
+            pipeline, metrics = await asyncio.to_thread(self._fit_category_pipeline, df)
             
-            # Train model
-            self.category_classifier = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42,
-                class_weight='balanced'
-            )
-            
-            self.category_classifier.fit(X_train, y_train)
-            
-            # Evaluate
-            y_pred = self.category_classifier.predict(X_test)
-            accuracy = accuracy_score(y_test, y_pred)
-            
-            # Save model
+            # Publish and promote atomically (a single artifact: features + classifier)
             model_data = {
-                'classifier': self.category_classifier,
-                'vectorizer': self.tfidf_vectorizer,
-                'feature_names': numerical_cols,
-                'label_encoder': self.label_encoder
+                'pipeline': pipeline,
+                'feature_names': CATEGORY_NUMERICAL_FEATURES
             }
+            version = self.registry.publish(
+                CATEGORY_CLASSIFIER, user_scope(user_id), model_data, metrics=metrics
+            )
             
-            joblib.dump(model_data, self.models_path / "category_classifier.pkl")
-            
-            return {
-                "accuracy": accuracy,
-                "training_samples": len(X_train),
-                "test_samples": len(X_test),
-                "features_count": X.shape[1]
-            }
+            return {**metrics, "model_version": version}
             
         except Exception as e:
             return {"error": f"Training failed: {str(e)}"}
     
-    async def predict_category(self, transaction: Dict) -> Dict[str, Any]:
-        """Predict category for a transaction"""
+    def _score_categories(
+        self, model_data: Dict[str, Any], transactions: List[Dict], top_k: int
+    ) -> List[Dict[str, Any]]:
+        """Single feature extraction and predict_proba pass for the whole batch"""
+        df = self.extract_transaction_features(transactions)
+        if df.empty:
+            return []
+        
+        pipeline = model_data['pipeline']
+        probabilities = pipeline.predict_proba(self._category_frame(df))
+        
+        # Top-k classes per row, highest probability first
+        k = min(top_k, probabilities.shape[1])
+        top_idx = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+        top_proba = np.take_along_axis(probabilities, top_idx, axis=1)
+        top_classes = pipeline.classes_[top_idx]
+        
+        return [
+            {
+                "predicted_category": int(classes[0]),
+                "confidence": float(proba[0]),
+                "top_k": [
+                    {"categoria_id": int(c), "probability": float(p)}
+                    for c, p in zip(classes, proba)
+                ]
+            }
+            for classes, proba in zip(top_classes, top_proba)
+        ]
+    
+    async def predict_categories_batch(
+        self, transactions: List[Dict], user_id: Optional[int] = None, top_k: int = 3
+    ) -> Dict[str, Any]:
+        """Predict top-k categories for many transactions with the user's promoted model"""
         try:
-            if not self.category_classifier:
-                # Try to load saved model
-                model_path = self.models_path / "category_classifier.pkl"
-                if model_path.exists():
-                    model_data = joblib.load(model_path)
-                    self.category_classifier = model_data['classifier']
-                    self.tfidf_vectorizer = model_data['vectorizer']
-                else:
-                    return {"error": "Model not trained"}
-            
-            # Extract features
-            df = self.extract_transaction_features([transaction])
-            
-            if df.empty:
-                return {"error": "Could not extract features"}
-            
-            # Prepare features (same as training)
-            features = []
-            if 'descricao_processed' in df.columns:
-                tfidf_features = self.tfidf_vectorizer.transform(df['descricao_processed'])
-                features.append(tfidf_features.toarray())
-            
-            numerical_cols = ['valor_abs', 'day_of_week', 'month', 'is_weekend']
-            numerical_features = df[numerical_cols].fillna(0).values
-            features.append(numerical_features)
-            
-            X = np.hstack(features) if features else numerical_features
-            
-            # Predict
-            prediction = self.category_classifier.predict(X)[0]
-            probabilities = self.category_classifier.predict_proba(X)[0]
-            confidence = max(probabilities)
+            scope = user_scope(user_id)
+            model_data = await self.registry.aget(CATEGORY_CLASSIFIER, scope)
+            if model_data is None:
+                return {"error": "Model not trained"}
+            
+            # CPU-bound: keep it off the event loop
+            predictions = await asyncio.to_thread(
+                self._score_categories, model_data, transactions, top_k
+            )
             
             return {
-                "predicted_category": int(prediction),
-                "confidence": float(confidence),
-                "probabilities": probabilities.tolist()
+                "model_version": self.registry.get_version(CATEGORY_CLASSIFIER, scope),
+                "predictions": predictions
             }
             
         except Exception as e:
             return {"error": f"Prediction failed: {str(e)}"}
     
-    async def train_spending_predictor(self, transactions: List[Dict]) -> Dict[str, Any]:
-        """Train model to predict future spending"""
+    async def predict_category(self, transaction: Dict, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Predict category for a transaction using the user's promoted model"""
+        result = await self.predict_categories_batch([transaction], user_id=user_id, top_k=1)
+        if "error" in result:
+            return result
+        if not result["predictions"]:
+            return {"error": "Could not extract features"}
+        
+        prediction = result["predictions"][0]
+        return {
+            "predicted_category": prediction["predicted_category"],
+            "confidence": prediction["confidence"],
+            "top_k": prediction["top_k"]
+        }
+    
+    async def train_spending_predictor(
+        self, transactions: List[Dict], user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Train model to predict future spending and promote it in the registry"""
         try:
             df = pd.DataFrame(transactions)
             
@@ -255,17 +266,19 @@ class MLFinancialAnalyzer:
             df = df.sort_values('data_lancamento')
             
             # Group by date and sum expenses (negative values)
-            daily_expenses = df[df['valor'] < 0].groupby(
-                df['data_lancamento'].dt.date
+            expenses = df[df['valor'] < 0]
+            daily_expenses = expenses.groupby(
+                expenses['data_lancamento'].dt.normalize()
             )['valor'].sum().abs()
             
             if len(daily_expenses) < 30:  # Need at least 30 days
                 return {"error": "Insufficient historical data (need at least 30 days)"}
             
+            # Calendar days without expenses count as zero (same as the feature store)
+            daily_expenses = daily_expenses.asfreq('D', fill_value=0.0)
+            
             # Create features for regression
-            daily_expenses_df = daily_expenses.reset_index()
-            daily_expenses_df.columns = ['date', 'amount']
-            daily_expenses_df['date'] = pd.to_datetime(daily_expenses_df['date'])
+            daily_expenses_df = daily_expenses.rename_axis('date').reset_index(name='amount')
             
             # Feature engineering
             daily_expenses_df['day_of_week'] = daily_expenses_df['date'].dt.dayofweek
@@ -274,12 +287,13 @@ class MLFinancialAnalyzer:
             daily_expenses_df['is_weekend'] = daily_expenses_df['day_of_week'].isin([5, 6]).astype(int)
             
             # Lag features
-            for lag in [1, 3, 7]:
+            for lag in LAGS:
                 daily_expenses_df[f'lag_{lag}'] = daily_expenses_df['amount'].shift(lag)
             
-            # Rolling averages
-            for window in [3, 7, 14]:
-                daily_expenses_df[f'rolling_avg_{window}'] = daily_expenses_df['amount'].rolling(window).mean()
+            # Rolling averages of the previous days (the target day is not included)
+            previous = daily_expenses_df['amount'].shift(1)
+            for window in ROLLING_WINDOWS:
+                daily_expenses_df[f'rolling_avg_{window}'] = previous.rolling(window).mean()
             
             # Drop rows with NaN values
             daily_expenses_df = daily_expenses_df.dropna()
@@ -288,7 +302,7 @@ class MLFinancialAnalyzer:
                 return {"error": "Insufficient data after feature engineering"}
             
             # Prepare features and target
-            feature_cols = [col for col in daily_expenses_df.columns if col not in ['date', 'amount']]
+            feature_cols = SPENDING_FEATURE_COLUMNS
             X = daily_expenses_df[feature_cols].values
             y = daily_expenses_df['amount'].values
             
@@ -298,87 +312,115 @@ class MLFinancialAnalyzer:
             y_train, y_test = y[:split_idx], y[split_idx:]
             
             # Scale features
-            self.scaler.fit(X_train)
-            X_train_scaled = self.scaler.transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
+            scaler = StandardScaler()
+            scaler.fit(X_train)
+            X_train_scaled = scaler.transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
             
             # Train model
-            self.spending_predictor = GradientBoostingRegressor(
+            spending_predictor = GradientBoostingRegressor(
                 n_estimators=100,
                 learning_rate=0.1,
                 max_depth=6,
                 random_state=42
             )
             
-            self.spending_predictor.fit(X_train_scaled, y_train)
+            spending_predictor.fit(X_train_scaled, y_train)
             
             # Evaluate
-            train_score = self.spending_predictor.score(X_train_scaled, y_train)
-            test_score = self.spending_predictor.score(X_test_scaled, y_test)
+            train_score = spending_predictor.score(X_train_scaled, y_train)
+            test_score = spending_predictor.score(X_test_scaled, y_test)
             
-            # Save model
-            model_data = {
-                'predictor': self.spending_predictor,
-                'scaler': self.scaler,
-                'feature_columns': feature_cols
-            }
-            
-            joblib.dump(model_data, self.models_path / "spending_predictor.pkl")
-            
-            return {
+            metrics = {
                 "train_score": train_score,
                 "test_score": test_score,
                 "training_samples": len(X_train),
-                "test_samples": len(X_test),
-                "features": feature_cols
+                "test_samples": len(X_test)
             }
             
+            # Publish and promote atomically
+            model_data = {
+                'predictor': spending_predictor,
+                'scaler': scaler,
+                'feature_columns': feature_cols
+            }
+            version = self.registry.publish(
+                SPENDING_PREDICTOR, user_scope(user_id), model_data, metrics=metrics
+            )
+            
+            return {**metrics, "features": feature_cols, "model_version": version}
+            
         except Exception as e:
             return {"error": f"Training failed: {str(e)}"}
     
-    async def predict_spending(self, days_ahead: int = 7) -> Dict[str, Any]:
-        """Predict spending for next N days"""
+    def _forecast_spending(
+        self, model_data: Dict[str, Any], history: List[float], as_of: date, days_ahead: int
+    ) -> List[Dict[str, Any]]:
+        """Recursive forecast: each predicted day feeds the lags of the next one"""
+        spending_predictor = model_data['predictor']
+        scaler = model_data['scaler']
+        
+        # Calendar features for the whole horizon in one batch
+        future_dates = pd.date_range(as_of + timedelta(days=1), periods=days_ahead, freq='D')
+        day_of_week = future_dates.dayofweek.to_numpy()
+        calendar = np.column_stack([
+            day_of_week,
+            future_dates.day.to_numpy(),
+            future_dates.month.to_numpy(),
+            (day_of_week >= 5).astype(int),
+        ]).astype(np.float64)
+        
+        # Scaling is affine, so it is applied as arrays instead of a transform() per day
+        mean, scale = scaler.mean_, scaler.scale_
+        n_calendar = calendar.shape[1]
+        calendar_scaled = (calendar - mean[:n_calendar]) / scale[:n_calendar]
+        
+        series = np.zeros(HISTORY_DAYS + days_ahead)
+        series[:HISTORY_DAYS] = history[-HISTORY_DAYS:]
+        row = np.empty(len(SPENDING_FEATURE_COLUMNS))
+        predicted = np.empty(days_ahead)
+        
+        for i in range(days_ahead):
+            t = HISTORY_DAYS + i
+            row[:n_calendar] = calendar_scaled[i]
+            lagged = [series[t - lag] for lag in LAGS]
+            rolling = [series[t - window:t].mean() for window in ROLLING_WINDOWS]
+            row[n_calendar:] = (np.array(lagged + rolling) - mean[n_calendar:]) / scale[n_calendar:]
+            
+            predicted[i] = max(float(spending_predictor.predict(row.reshape(1, -1))[0]), 0.0)
+            series[t] = predicted[i]
+        
+        return [
+            {
+                "date": future_date.strftime("%Y-%m-%d"),
+                "predicted_amount": float(amount),
+                "day_of_week": future_date.strftime("%A")
+            }
+            for future_date, amount in zip(future_dates, predicted)
+        ]
+    
+    async def predict_spending(
+        self,
+        days_ahead: int = 7,
+        user_id: Optional[int] = None,
+        history: Optional[List[float]] = None,
+        as_of: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Predict spending for next N days from the user's recent daily spending
+        
+        ``history`` holds the daily expense totals of the last HISTORY_DAYS days
+        ending at ``as_of`` (see SpendingFeatureStore.get_history).
+        """
         try:
-            if not self.spending_predictor:
-                # Try to load saved model
-                model_path = self.models_path / "spending_predictor.pkl"
-                if model_path.exists():
-                    model_data = joblib.load(model_path)
-                    self.spending_predictor = model_data['predictor']
-                    self.scaler = model_data['scaler']
-                else:
-                    return {"error": "Model not trained"}
-            
-            # This is a simplified prediction - in practice, you'd need recent transaction data
-            # to generate proper features
-            predictions = []
-            
-            for i in range(days_ahead):
-                # Create mock features for prediction
-                # In practice, these would be based on recent transaction patterns
-                future_date = datetime.now() + timedelta(days=i+1)
-                
-                features = [
-                    future_date.weekday(),  # day_of_week
-                    future_date.day,       # day_of_month
-                    future_date.month,     # month
-                    1 if future_date.weekday() in [5, 6] else 0,  # is_weekend
-                    100,  # lag_1 (mock)
-                    100,  # lag_3 (mock)
-                    100,  # lag_7 (mock)
-                    100,  # rolling_avg_3 (mock)
-                    100,  # rolling_avg_7 (mock)
-                    100,  # rolling_avg_14 (mock)
-                ]
-                
-                features_scaled = self.scaler.transform([features])
-                prediction = self.spending_predictor.predict(features_scaled)[0]
-                
-                predictions.append({
-                    "date": future_date.strftime("%Y-%m-%d"),
-                    "predicted_amount": float(prediction),
-                    "day_of_week": future_date.strftime("%A")
-                })
+            model_data = await self.registry.aget(SPENDING_PREDICTOR, user_scope(user_id))
+            if model_data is None:
+                return {"error": "Model not trained"}
+            if history is None or len(history) < HISTORY_DAYS:
+                return {"error": f"Recent spending history required ({HISTORY_DAYS} days)"}
+            
+            predictions = await asyncio.to_thread(
+                self._forecast_spending, model_data, history, as_of or date.today(), days_ahead
+            )
             
             return {
                 "predictions": predictions,
@@ -388,71 +430,124 @@ class MLFinancialAnalyzer:
         except Exception as e:
             return {"error": f"Prediction failed: {str(e)}"}
     
-    async def detect_anomalies(self, transactions: List[Dict]) -> Dict[str, Any]:
-        """Detect anomalous transactions"""
+    def _anomaly_frame(self, features_df: pd.DataFrame) -> pd.DataFrame:
+        return features_df.reindex(columns=ANOMALY_FEATURES).fillna(0)
+    
+    def _fit_anomaly_detector(self, transactions: List[Dict]):
+        """Fit the IsolationForest on a user's history (blocking, CPU-bound)"""
+        from sklearn.ensemble import IsolationForest
+        
+        features_df = self.extract_transaction_features(transactions)
+        with track_training(ANOMALY_DETECTOR) as run:
+            anomaly_detector = IsolationForest(
+                contamination=0.1,  # Expect 10% anomalies
+                random_state=42,
+                n_jobs=settings.ML_N_JOBS
+            )
+            anomaly_detector.fit(self._anomaly_frame(features_df).to_numpy())
+        
+        return anomaly_detector, {"training_samples": len(features_df), **run.as_metrics()}
+    
+    async def train_anomaly_detector(
+        self, transactions: List[Dict], user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Fit the user's anomaly detector offline and promote it in the registry"""
         try:
-            df = pd.DataFrame(transactions)
+            if not transactions:
+                return {"error": "Insufficient data for training"}
             
-            if df.empty:
-                return {"anomalies": [], "total_checked": 0}
+            anomaly_detector, metrics = await asyncio.to_thread(self._fit_anomaly_detector, transactions)
+            version = self.registry.publish(
+                ANOMALY_DETECTOR, user_scope(user_id),
+                {'detector': anomaly_detector, 'feature_columns': ANOMALY_FEATURES},
+                metrics=metrics
+            )
+            return {**metrics, "model_version": version}
             
-            # Extract features
-            features_df = self.extract_transaction_features(transactions)
+        except Exception as e:
+            return {"error": f"Training failed: {str(e)}"}
+    
+    def _score_anomalies(self, model_data: Dict[str, Any], transactions: List[Dict]) -> List[Dict[str, Any]]:
+        """Score a batch against a fitted detector; only anomalies are returned"""
+        features_df = self.extract_transaction_features(transactions)
+        X = self._anomaly_frame(features_df).to_numpy()
+        
+        detector = model_data['detector']
+        scores = detector.score_samples(X)
+        # Same rule as IsolationForest.predict: anomaly when score < offset_
+        anomaly_idx = np.flatnonzero(scores < detector.offset_)
+        reasons = self._anomaly_reasons(features_df.iloc[anomaly_idx])
+        
+        return [
+            {
+                "transaction": transactions[i],
+                "anomaly_score": float(scores[i]),
+                "reasons": row_reasons
+            }
+            for i, row_reasons in zip(anomaly_idx, reasons)
+        ]
+    
+    async def score_anomalies(
+        self, transactions: List[Dict], user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Score new transactions against the user's cached detector (no refit)"""
+        try:
+            model_data = await self.registry.aget(ANOMALY_DETECTOR, user_scope(user_id))
+            if model_data is None:
+                return {"error": "Model not trained"}
             
-            # Use isolation forest for anomaly detection
-            from sklearn.ensemble import IsolationForest
+            anomalies = await asyncio.to_thread(self._score_anomalies, model_data, transactions)
+            return {"anomalies": anomalies, "total_checked": len(transactions)}
             
-            # Select numerical features
-            numerical_cols = ['valor_abs', 'day_of_week', 'month']
-            X = features_df[numerical_cols].fillna(0).values
+        except Exception as e:
+            return {"error": f"Anomaly scoring failed: {str(e)}"}
+    
+    async def detect_anomalies(self, transactions: List[Dict], user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Detect anomalous transactions (fits the user's detector only if none exists yet)"""
+        try:
+            if not transactions:
+                return {"anomalies": [], "total_checked": 0}
             
-            # Fit anomaly detector
-            anomaly_detector = IsolationForest(
-                contamination=0.1,  # Expect 10% anomalies
-                random_state=42
-            )
+            if await self.registry.aget(ANOMALY_DETECTOR, user_scope(user_id)) is None:
+                training = await self.train_anomaly_detector(transactions, user_id=user_id)
+                if "error" in training:
+                    return training
             
-            anomaly_scores = anomaly_detector.fit_predict(X)
-            anomaly_probabilities = anomaly_detector.score_samples(X)
-            
-            # Identify anomalies
-            anomalies = []
-            for i, (score, prob) in enumerate(zip(anomaly_scores, anomaly_probabilities)):
-                if score == -1:  # Anomaly
-                    transaction = transactions[i]
-                    anomalies.append({
-                        "transaction": transaction,
-                        "anomaly_score": float(prob),
-                        "reasons": self._analyze_anomaly_reasons(transaction, features_df.iloc[i])
-                    })
+            result = await self.score_anomalies(transactions, user_id=user_id)
+            if "error" in result:
+                return result
             
             return {
-                "anomalies": anomalies,
-                "total_checked": len(transactions),
-                "anomaly_rate": len(anomalies) / len(transactions) if transactions else 0
+                **result,
+                "anomaly_rate": len(result["anomalies"]) / len(transactions)
             }
             
         except Exception as e:
             return {"error": f"Anomaly detection failed: {str(e)}"}
     
-    def _analyze_anomaly_reasons(self, transaction: Dict, features: pd.Series) -> List[str]:
-        """Analyze why a transaction is considered anomalous"""
-        reasons = []
-        
-        # High amount
-        if features.get('valor_abs', 0) > 1000:
-            reasons.append("Valor muito alto")
-        
-        # Weekend transaction
-        if features.get('is_weekend', 0) == 1 and features.get('valor_abs', 0) > 200:
-            reasons.append("Transação de alto valor no fim de semana")
-        
-        # Late night/early morning (if we had time data)
-        # End of month
-        if features.get('day_of_month', 0) > 28:
-            reasons.append("Transação no final do mês")
-        
-        return reasons if reasons else ["Padrão atípico detectado"]
+    def _anomaly_reasons(self, features: pd.DataFrame) -> List[List[str]]:
+        """Analyze why each transaction is considered anomalous (vectorized rules)"""
+        cols = features.reindex(columns=['valor_abs', 'is_weekend', 'day_of_month']).fillna(0)
+        
+        rules = np.column_stack([
+            # High amount
+            cols['valor_abs'].to_numpy() > 1000,
+            # Weekend transaction
+            (cols['is_weekend'].to_numpy() == 1) & (cols['valor_abs'].to_numpy() > 200),
+            # Late night/early morning (if we had time data)
+            # End of month
+            cols['day_of_month'].to_numpy() > 28,
+        ])
+        labels = np.array([
+            "Valor muito alto",
+            "Transação de alto valor no fim de semana",
+            "Transação no final do mês",
+        ])
+        
+        return [
+            labels[row].tolist() or ["Padrão atípico detectado"]
+            for row in rules
+        ]
     
     @cached_function(ttl=3600, namespace="ml")
     async def generate_financial_insights(self, user_transactions: List[Dict]) -> Dict[str, Any]:
@@ -542,84 +637,166 @@ class MLFinancialAnalyzer:
         except Exception as e:
             return {"error": f"Insight generation failed: {str(e)}"}
     
-    async def cluster_transactions(self, transactions: List[Dict]) -> Dict[str, Any]:
-        """Cluster transactions to find spending patterns"""
+    @staticmethod
+    def _row_ids(ids: List[Any]) -> np.ndarray:
+        """Transaction ids as int64 (-1 for rows without a database id)"""
+        return np.fromiter(
+            (i if isinstance(i, (int, np.integer)) else -1 for i in ids),
+            dtype=np.int64, count=len(ids)
+        )
+    
+    @staticmethod
+    def _ideal_n_clusters(n_rows: int) -> int:
+        """Adaptive number of clusters: one per 10 transactions, between 2 and 5"""
+        return max(2, min(5, n_rows // 10))
+    
+    def _fit_clusters(self, X: np.ndarray, high_water_id: int) -> Dict[str, Any]:
+        """Fit scaler + MiniBatchKMeans on a user's history (blocking, CPU-bound)"""
+        from sklearn.cluster import MiniBatchKMeans
+        
+        n_clusters = self._ideal_n_clusters(len(X))
+        
+        with track_training(TRANSACTION_CLUSTERS):
+            scaler = StandardScaler().fit(X)
+            kmeans = MiniBatchKMeans(
+                n_clusters=n_clusters,
+                batch_size=settings.ML_CLUSTER_BATCH_SIZE,
+                n_init=3,
+                random_state=42
+            )
+            kmeans.fit(scaler.transform(X))
+        
+        return {
+            'scaler': scaler,
+            'kmeans': kmeans,
+            'feature_columns': CLUSTERING_FEATURES,
+            # Rows with an id up to this one are already in the centroids
+            'high_water_id': high_water_id,
+        }
+    
+    def _assign_clusters(
+        self, model_data: Dict[str, Any], X: np.ndarray, row_ids: np.ndarray
+    ) -> Tuple[np.ndarray, Optional[Dict[str, Any]]]:
+        """Labels for every row, plus an updated model once enough new rows accumulated
+        
+        Rows past the model's high-water mark are partial-fitted into a copy of
+        the model (the registry's artifact is shared and never mutated), and
+        only when there are at least ML_CLUSTER_MIN_NEW_ROWS of them, so the
+        centroids are republished in batches rather than on every call.
+        """
+        new_rows = np.flatnonzero(row_ids > model_data['high_water_id'])
+        updated = None
+        if len(new_rows) >= settings.ML_CLUSTER_MIN_NEW_ROWS:
+            updated = copy.deepcopy(model_data)
+            # Move the centroids towards the new data without refitting the history
+            updated['kmeans'].partial_fit(updated['scaler'].transform(X[new_rows]))
+            updated['high_water_id'] = int(row_ids[new_rows].max())
+            model_data = updated
+        
+        labels = model_data['kmeans'].predict(model_data['scaler'].transform(X))
+        return labels, updated
+    
+    def _summarize_clusters(self, df: pd.DataFrame, labels: np.ndarray) -> List[Dict[str, Any]]:
+        """Per-cluster summary in a single groupby pass"""
+        frame = pd.DataFrame({
+            'cluster_id': labels,
+            'valor': df['valor'].to_numpy(),
+            'valor_abs': df['valor'].abs().to_numpy(),
+            'is_credit': (df['valor'] > 0).to_numpy(),
+            'is_debit': (df['valor'] < 0).to_numpy(),
+        })
+        has_dates = 'data_lancamento' in df
+        if has_dates:
+            frame['data_lancamento'] = df['data_lancamento'].to_numpy()
+        
+        aggregations = {
+            'n_transactions': ('valor', 'size'),
+            'avg_amount': ('valor_abs', 'mean'),
+            'total_amount': ('valor', 'sum'),
+            'credit_share': ('is_credit', 'mean'),
+            'debit_share': ('is_debit', 'mean'),
+        }
+        if has_dates:
+            aggregations['start'] = ('data_lancamento', 'min')
+            aggregations['end'] = ('data_lancamento', 'max')
+        summary = frame.groupby('cluster_id').agg(**aggregations)
+        
+        # Characteristics for all clusters at once
+        summary['amount'] = np.select(
+            [summary['avg_amount'] < 50, summary['avg_amount'] < 200],
+            ["Pequenos valores", "Valores médios"],
+            default="Valores altos"
+        )
+        summary['type'] = np.select(
+            [summary['credit_share'] > 0.8, summary['debit_share'] > 0.8],
+            ["Principalmente receitas", "Principalmente despesas"],
+            default="Misto"
+        )
+        
+        return [
+            {
+                "cluster_id": int(row.Index),
+                "size": int(row.n_transactions),
+                "avg_amount": float(row.avg_amount),
+                "total_amount": float(row.total_amount),
+                "date_range": {
+                    "start": row.start.isoformat() if has_dates else None,
+                    "end": row.end.isoformat() if has_dates else None
+                },
+                "characteristics": {"amount": row.amount, "type": row.type}
+            }
+            for row in summary.itertuples()
+        ]
+    
+    async def cluster_transactions(
+        self, transactions: List[Dict], user_id: Optional[int] = None, refit: bool = False
+    ) -> Dict[str, Any]:
+        """Cluster transactions to find spending patterns
+        
+        The user's clustering model is fitted once and kept in the registry
+        with the highest transaction id it has seen; later calls predict every
+        row and only partial-fit the transactions past that mark. partial_fit
+        cannot change the number of centroids, so the model is refitted from
+        scratch whenever the history size calls for a different cluster count.
+        """
         try:
             features_df = self.extract_transaction_features(transactions)
             
-            if features_df.empty:
-                return {"clusters": [], "total_transactions": 0}
-            
-            # Select features for clustering
-            clustering_features = ['valor_abs', 'day_of_week', 'month']
-            X = features_df[clustering_features].fillna(0).values
+            if len(features_df) < 2:
+                return {"clusters": [], "total_transactions": len(features_df)}
             
-            # Standardize features
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X)
+            X = features_df.reindex(columns=CLUSTERING_FEATURES).fillna(0).to_numpy(dtype=np.float64)
+            row_ids = self._row_ids([t.get('id') for t in transactions])
+            scope = user_scope(user_id)
             
-            # Perform clustering
-            n_clusters = min(5, len(transactions) // 10)  # Adaptive number of clusters
-            if n_clusters < 2:
-                n_clusters = 2
+            model_data = None if refit else await self.registry.aget(TRANSACTION_CLUSTERS, scope)
+            if model_data is not None and 'high_water_id' not in model_data:
+                model_data = None  # artifact from before the high-water mark: refit once
+            elif model_data is not None and model_data['kmeans'].n_clusters != self._ideal_n_clusters(len(X)):
+                model_data = None  # history crossed a cluster-count step: refit
             
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-            cluster_labels = kmeans.fit_predict(X_scaled)
+            if model_data is None:
+                # First run (explicit refit or new cluster count): full fit over the history
+                updated = await asyncio.to_thread(self._fit_clusters, X, int(row_ids.max(initial=-1)))
+                labels = updated['kmeans'].labels_
+            else:
+                labels, updated = await asyncio.to_thread(self._assign_clusters, model_data, X, row_ids)
             
-            # Analyze clusters
-            clusters = []
-            for i in range(n_clusters):
-                cluster_mask = cluster_labels == i
-                cluster_transactions = [t for j, t in enumerate(transactions) if cluster_mask[j]]
-                
-                if cluster_transactions:
-                    cluster_df = pd.DataFrame(cluster_transactions)
-                    
-                    cluster_info = {
-                        "cluster_id": i,
-                        "size": len(cluster_transactions),
-                        "avg_amount": float(cluster_df['valor'].abs().mean()),
-                        "total_amount": float(cluster_df['valor'].sum()),
-                        "date_range": {
-                            "start": cluster_df['data_lancamento'].min() if 'data_lancamento' in cluster_df else None,
-                            "end": cluster_df['data_lancamento'].max() if 'data_lancamento' in cluster_df else None
-                        },
-                        "characteristics": self._describe_cluster(cluster_df)
-                    }
-                    
-                    clusters.append(cluster_info)
+            if updated is not None:
+                # Persist the (partially) fitted centroids with their high-water mark
+                model_version = self.registry.publish(TRANSACTION_CLUSTERS, scope, updated)
+            else:
+                model_version = self.registry.get_version(TRANSACTION_CLUSTERS, scope)
             
             return {
-                "clusters": clusters,
+                "clusters": self._summarize_clusters(features_df, labels),
                 "total_transactions": len(transactions),
-                "clustering_features": clustering_features
+                "clustering_features": CLUSTERING_FEATURES,
+                "model_version": model_version
             }
             
         except Exception as e:
             return {"error": f"Clustering failed: {str(e)}"}
-    
-    def _describe_cluster(self, cluster_df: pd.DataFrame) -> Dict[str, str]:
-        """Describe characteristics of a transaction cluster"""
-        characteristics = {}
-        
-        # Amount pattern
-        avg_amount = cluster_df['valor'].abs().mean()
-        if avg_amount < 50:
-            characteristics['amount'] = "Pequenos valores"
-        elif avg_amount < 200:
-            characteristics['amount'] = "Valores médios"
-        else:
-            characteristics['amount'] = "Valores altos"
-        
-        # Transaction type
-        if (cluster_df['valor'] > 0).sum() > len(cluster_df) * 0.8:
-            characteristics['type'] = "Principalmente receitas"
-        elif (cluster_df['valor'] < 0).sum() > len(cluster_df) * 0.8:
-            characteristics['type'] = "Principalmente despesas"
-        else:
-            characteristics['type'] = "Misto"
-        
-        return characteristics
 
 
 # Global ML service instance
@@ -627,28 +804,108 @@ ml_service = MLFinancialAnalyzer()
 
 
 # Utility functions for ML operations
-async def auto_categorize_transaction(transaction_data: Dict) -> Optional[int]:
-    """Auto-categorize a transaction using ML"""
-    result = await ml_service.predict_category(transaction_data)
+async def auto_categorize_transaction(transaction_data: Dict, user_id: Optional[int] = None) -> Optional[int]:
+    """Auto-categorize a transaction: learned keyword rules first, ML classifier for the rest"""
+    return (await auto_categorize_transactions([transaction_data], user_id=user_id))[0]
+
+
+async def categorize_transactions_batch(
+    transactions: List[Dict], user_id: Optional[int] = None, top_k: int = 3
+) -> Dict[str, Any]:
+    """Top-k categories per transaction: learned keyword rules first, ML classifier for the rest
+    
+    Predictions keep the order of the input; ``source`` says which one answered
+    ("rule", "model", or "unmatched" when there is no classifier for the rest).
+    """
+    matches = await match_rules([t.get("descricao") for t in transactions], user_id=user_id)
+    predictions: List[Optional[Dict[str, Any]]] = [
+        {
+            "predicted_category": match[0],
+            "confidence": match[1],
+            "top_k": [{"categoria_id": match[0], "probability": match[1]}],
+            "source": "rule",
+        } if match else None
+        for match in matches
+    ]
+    
+    # Only descriptions without an unambiguous rule pay for the ML feature pipeline
+    pending = [i for i, prediction in enumerate(predictions) if prediction is None]
+    model_version = None
+    if pending:
+        result = await ml_service.predict_categories_batch(
+            [transactions[i] for i in pending], user_id=user_id, top_k=top_k
+        )
+        if "error" in result:
+            if len(pending) == len(transactions):
+                return result
+            unmatched = {"predicted_category": None, "confidence": 0.0, "top_k": [], "source": "unmatched"}
+            for i in pending:
+                predictions[i] = dict(unmatched)
+        else:
+            model_version = result["model_version"]
+            for i, prediction in zip(pending, result["predictions"]):
+                predictions[i] = {**prediction, "source": "model"}
+    
+    return {"model_version": model_version, "predictions": predictions}
+
+
+async def auto_categorize_transactions(
+    transactions: List[Dict], user_id: Optional[int] = None, min_confidence: float = 0.7
+) -> List[Optional[int]]:
+    """Auto-categorize many transactions in one batch (None below min_confidence)"""
+    result = await categorize_transactions_batch(transactions, user_id=user_id, top_k=1)
+    if "error" in result:
+        return [None] * len(transactions)
+    return [
+        prediction["predicted_category"] if prediction["confidence"] > min_confidence else None
+        for prediction in result["predictions"]
+    ]
+
+
+async def categorize_missing(records: List[Dict], user_id: Optional[int] = None) -> int:
+    """Fill ``categoria_id`` of imported records that have none; returns how many were filled"""
+    pending = [record for record in records if record.get("categoria_id") is None]
+    if not pending:
+        return 0
     
-    if "predicted_category" in result and result.get("confidence", 0) > 0.7:
-        return result["predicted_category"]
+    transactions = []
+    for record in pending:
+        valor = abs(float(record.get("valor") or 0))
+        transactions.append({
+            "descricao": record.get("descricao"),
+            # Same sign convention as the training data: expenses are negative
+            "valor": -valor if record.get("tipo") == TipoLancamento.DESPESA else valor,
+            "data_lancamento": record.get("data_lancamento"),
+        })
+    categories = await auto_categorize_transactions(transactions, user_id=user_id)
     
-    return None
+    filled = 0
+    for record, categoria_id in zip(pending, categories):
+        if categoria_id is not None:
+            record["categoria_id"] = categoria_id
+            filled += 1
+    return filled
 
 
-async def get_spending_forecast(user_id: str, days: int = 7) -> Dict[str, Any]:
-    """Get spending forecast for a user"""
+async def get_spending_forecast(db: AsyncSession, user_id: int, days: int = 7) -> Dict[str, Any]:
+    """Get spending forecast for a user from the spending feature store"""
     try:
-        cached_result = await FinancialCache.get_dashboard_data(f"forecast_{user_id}_{days}")
+        as_of, history = await spending_feature_store.get_history(db, user_id)
+        
+        # Key on the inputs: a new lançamento changes the history and the forecast
+        history_digest = hashlib.sha1(json.dumps(history).encode()).hexdigest()[:12]
+        cache_key = f"forecast_{user_id}_{days}_{as_of.isoformat()}_{history_digest}"
+        
+        cached_result = await FinancialCache.get_dashboard_data(cache_key)
         if cached_result:
             return cached_result
         
         # Get prediction
-        result = await ml_service.predict_spending(days)
+        result = await ml_service.predict_spending(days, user_id=user_id, history=history, as_of=as_of)
         
         # Cache result
-        await FinancialCache.set_dashboard_data(f"forecast_{user_id}_{days}", result)
+        if "error" not in result:
+            await FinancialCache.set_dashboard_data(cache_key, result)
         
         return result
         
@@ -656,17 +913,19 @@ async def get_spending_forecast(user_id: str, days: int = 7) -> Dict[str, Any]:
         return {"error": f"Forecast failed: {str(e)}"}
 
 
-async def analyze_spending_patterns(user_transactions: List[Dict]) -> Dict[str, Any]:
-    """Analyze user spending patterns"""
+async def analyze_spending_patterns(user_transactions: List[Dict], user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Analyze user spending patterns (the three analyses run in parallel on the ML process pool)"""
+    from app.services.ml_executor import MLTaskTimeout, ml_executor
+    
     try:
-        # Generate insights
-        insights = await ml_service.generate_financial_insights(user_transactions)
-        
-        # Detect anomalies
-        anomalies = await ml_service.detect_anomalies(user_transactions)
-        
-        # Cluster analysis
-        clusters = await ml_service.cluster_transactions(user_transactions)
+        insights, anomalies, clusters = await asyncio.gather(
+            # Generate insights
+            ml_executor.run("generate_financial_insights", user_transactions),
+            # Detect anomalies
+            ml_executor.run("detect_anomalies", user_transactions, user_id=user_id),
+            # Cluster analysis
+            ml_executor.run("cluster_transactions", user_transactions, user_id=user_id)
+        )
         
         return {
             "insights": insights,
@@ -675,27 +934,22 @@ async def analyze_spending_patterns(user_transactions: List[Dict]) -> Dict[str,
             "analysis_date": datetime.now().isoformat()
         }
         
+    except MLTaskTimeout:
+        raise
     except Exception as e:
         return {"error": f"Pattern analysis failed: {str(e)}"}
 
 
 # Background task for model training
 async def train_models_periodically():
-    """Periodic model training task"""
+    """Periodic model training task (one scan of the training scheduler)"""
+    from app.services.training_scheduler import training_scheduler
+    
     print("🤖 Iniciando treinamento periódico dos modelos ML...")
     
     try:
-        # This would fetch recent transactions from database
-        # For now, it's a placeholder
-        # transactions = await get_all_transactions()
-        # 
-        # # Train category classifier
-        # await ml_service.train_category_classifier(transactions)
-        # 
-        # # Train spending predictor
-        # await ml_service.train_spending_predictor(transactions)
-        
-        print("✅ Modelos ML treinados com sucesso")
+        enqueued = await training_scheduler.scan()
+        print(f"✅ Retreino agendado para {enqueued} usuários")
         
     except Exception as e:
         print(f"❌ Erro no treinamento dos modelos: {e}")
@@ -711,10 +965,11 @@ async def ml_health_check() -> Dict[str, Any]:
     }
     
     try:
-        # Check if models exist
-        models_path = Path("app/ml_models")
-        health["models_loaded"]["category_classifier"] = (models_path / "category_classifier.pkl").exists()
-        health["models_loaded"]["spending_predictor"] = (models_path / "spending_predictor.pkl").exists()
+        # Models loaded in memory by the registry
+        registry_status = model_registry.status()
+        health["registry_ready"] = registry_status["ready"]
+        health["models_loaded"] = registry_status["loaded"]
+        health["rule_categorizer"] = rule_stats()
         
         # Test basic functionality
         test_transaction = {
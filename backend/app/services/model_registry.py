@@ -0,0 +1,369 @@
+"""
+Registro de modelos ML versionados
+
+Cada modelo é identificado por (nome, escopo) — o escopo é ``user_<id>`` para
+modelos por usuário ou ``global``. Os artefatos ficam em
+``ML_MODEL_PATH/<nome>/<escopo>/<versão>.joblib`` e um ``manifest.json`` por
+escopo indica a versão promovida. Publicação e promoção são atômicas
+(arquivo temporário + os.replace), então leitores nunca veem estado parcial.
+
+Os modelos globais são pré-carregados no startup (lifespan); os por usuário
+são carregados sob demanda (fora do event loop) e mantidos num LRU limitado
+a ML_REGISTRY_MAX_USER_MODELS por processo. Um watcher recarrega em memória
+qualquer versão promovida depois, inclusive por outro worker ou pelo
+agendador de treino. Publicações concorrentes serializam a leitura-escrita
+do manifesto com um flock por escopo.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".manifest.lock"
+ATTEMPTS_NAME = "training_attempts.json"
+GLOBAL_SCOPE = "global"
+
+
+def user_scope(user_id: Optional[int]) -> str:
+    """Escopo de registro para um usuário (ou global)"""
+    return f"user_{user_id}" if user_id is not None else GLOBAL_SCOPE
+
+
+def _atomic_write_json(path: Path, data: Dict[str, Any]) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".manifest-", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """Artefatos versionados com manifesto, promoção atômica e cache quente em memória"""
+
+    def __init__(self, root: Optional[str] = None):
+        root_path = Path(root or settings.ML_MODEL_PATH)
+        self.root = root_path if root_path.is_absolute() else BACKEND_DIR / root_path
+        # (nome, escopo) -> (versão, artefato, mtime do manifesto), em ordem de uso
+        self._loaded: "OrderedDict[Tuple[str, str], Tuple[str, Any, float]]" = OrderedDict()
+        # Escopos sem versão promovida -> quando verificar de novo
+        self._missing: Dict[Tuple[str, str], float] = {}
+        self._user_models = 0
+        # Processos sem watcher (pool de ML) conferem o manifesto a cada aget
+        self.revalidate = False
+        self._watch_task: Optional[asyncio.Task] = None
+        self.ready = False
+
+    # ------------------------------------------------------------------
+    # Manifesto
+    # ------------------------------------------------------------------
+
+    def _scope_dir(self, name: str, scope: str) -> Path:
+        return self.root / name / scope
+
+    def _manifest_path(self, name: str, scope: str) -> Path:
+        return self._scope_dir(name, scope) / MANIFEST_NAME
+
+    def read_manifest(self, name: str, scope: str) -> Dict[str, Any]:
+        """Lê o manifesto de um escopo (vazio se ainda não existir)"""
+        path = self._manifest_path(name, scope)
+        if not path.exists():
+            return {"current": None, "versions": {}}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @contextmanager
+    def _manifest_lock(self, name: str, scope: str):
+        """flock exclusivo do escopo: serializa leitura-modificação-escrita do manifesto"""
+        scope_dir = self._scope_dir(name, scope)
+        scope_dir.mkdir(parents=True, exist_ok=True)
+        with open(scope_dir / LOCK_NAME, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Tentativas de treino (inclusive as que não publicaram nada)
+    # ------------------------------------------------------------------
+
+    def record_training_attempt(self, scope: str) -> None:
+        """Registra agora como a última tentativa de treino do escopo"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".attempts.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                attempts = self._read_attempts()
+                attempts[scope] = datetime.now(timezone.utc).isoformat()
+                _atomic_write_json(self.root / ATTEMPTS_NAME, attempts)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_attempts(self) -> Dict[str, str]:
+        path = self.root / ATTEMPTS_NAME
+        if not path.exists():
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def training_attempts(self) -> Dict[str, datetime]:
+        """Escopo -> data da última tentativa de treino"""
+        return {scope: datetime.fromisoformat(at) for scope, at in self._read_attempts().items()}
+
+    def iter_scopes(self) -> List[Tuple[str, str]]:
+        """Lista todos os (nome, escopo) que possuem manifesto"""
+        return [
+            (path.parent.parent.name, path.parent.name)
+            for path in self.root.glob(f"*/*/{MANIFEST_NAME}")
+        ]
+
+    # ------------------------------------------------------------------
+    # Publicação / promoção
+    # ------------------------------------------------------------------
+
+    def publish(
+        self,
+        name: str,
+        scope: str,
+        artifact: Any,
+        metrics: Optional[Dict[str, Any]] = None,
+        promote: bool = True
+    ) -> str:
+        """Grava uma nova versão do artefato e (por padrão) a promove"""
+        scope_dir = self._scope_dir(name, scope)
+        scope_dir.mkdir(parents=True, exist_ok=True)
+
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        final_path = scope_dir / f"{version}.joblib"
+
+        fd, tmp_path = tempfile.mkstemp(dir=scope_dir, prefix=".artifact-", suffix=".tmp")
+        os.close(fd)
+        import joblib
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, final_path)
+
+        with self._manifest_lock(name, scope):
+            manifest = self.read_manifest(name, scope)
+            manifest["versions"][version] = {
+                "file": final_path.name,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "metrics": metrics or {}
+            }
+            if promote:
+                manifest["current"] = version
+            _atomic_write_json(self._manifest_path(name, scope), manifest)
+            if promote:
+                self._prune(name, scope, manifest)
+            mtime = self._manifest_path(name, scope).stat().st_mtime
+
+        if promote:
+            # O processo que treinou já tem o artefato em memória
+            self._remember(name, scope, (version, artifact, mtime))
+
+        return version
+
+    def promote(self, name: str, scope: str, version: str) -> None:
+        """Promove uma versão já publicada (ex: rollback)"""
+        with self._manifest_lock(name, scope):
+            manifest = self.read_manifest(name, scope)
+            if version not in manifest["versions"]:
+                raise ValueError(f"Versão {version} não encontrada para {name}/{scope}")
+            manifest["current"] = version
+            _atomic_write_json(self._manifest_path(name, scope), manifest)
+
+    def _prune(self, name: str, scope: str, manifest: Dict[str, Any]) -> None:
+        """Remove versões antigas além de ML_REGISTRY_KEEP_VERSIONS (com o lock do escopo)"""
+        versions = sorted(manifest["versions"])
+        stale = [v for v in versions[:-settings.ML_REGISTRY_KEEP_VERSIONS] if v != manifest["current"]]
+        if not stale:
+            return
+        for version in stale:
+            info = manifest["versions"].pop(version)
+            (self._scope_dir(name, scope) / info["file"]).unlink(missing_ok=True)
+        _atomic_write_json(self._manifest_path(name, scope), manifest)
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def _load_current(self, name: str, scope: str) -> Optional[Tuple[str, Any, float]]:
+        """Carrega do disco a versão promovida (bloqueante)"""
+        manifest_path = self._manifest_path(name, scope)
+        if not manifest_path.exists():
+            return None
+        mtime = manifest_path.stat().st_mtime
+        manifest = self.read_manifest(name, scope)
+        version = manifest.get("current")
+        if not version:
+            return None
+        artifact_file = self._scope_dir(name, scope) / manifest["versions"][version]["file"]
+        import joblib
+        return version, joblib.load(artifact_file), mtime
+
+    def _remember(self, name: str, scope: str, entry: Tuple[str, Any, float]) -> None:
+        """Guarda um artefato carregado, despejando os modelos de usuário menos usados"""
+        key = (name, scope)
+        self._missing.pop(key, None)
+        if key not in self._loaded and scope != GLOBAL_SCOPE:
+            self._user_models += 1
+        self._loaded[key] = entry
+        self._loaded.move_to_end(key)
+
+        if self._user_models <= settings.ML_REGISTRY_MAX_USER_MODELS:
+            return
+        for candidate in list(self._loaded):
+            if candidate[1] != GLOBAL_SCOPE and candidate != key:
+                del self._loaded[candidate]
+                self._user_models -= 1
+                break
+
+    def get(self, name: str, scope: str) -> Optional[Any]:
+        """Artefato promovido se já estiver em memória (nunca faz I/O)"""
+        entry = self._loaded.get((name, scope))
+        if entry is None:
+            return None
+        self._loaded.move_to_end((name, scope))
+        return entry[1]
+
+    def _manifest_mtime(self, name: str, scope: str) -> Optional[float]:
+        try:
+            return self._manifest_path(name, scope).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    async def aget(self, name: str, scope: str) -> Optional[Any]:
+        """Artefato promovido, carregando-o fora do event loop se ainda não estiver em memória"""
+        key = (name, scope)
+        entry = self._loaded.get(key)
+        if entry is not None and self.revalidate:
+            mtime = await asyncio.to_thread(self._manifest_mtime, name, scope)
+            if mtime is not None and mtime > entry[2]:
+                entry = None  # promovido depois da carga: recarrega
+        if entry is not None:
+            self._loaded.move_to_end(key)
+            return entry[1]
+
+        # Escopo sem modelo: não volta ao disco a cada requisição
+        if not self.revalidate and self._missing.get(key, 0.0) > time.monotonic():
+            return None
+
+        loaded = await asyncio.to_thread(self._load_current, name, scope)
+        if loaded is None:
+            self._missing[key] = time.monotonic() + settings.ML_REGISTRY_RELOAD_INTERVAL
+            return None
+        self._remember(name, scope, loaded)
+        return loaded[1]
+
+    def published_at(self, name: str, scope: str) -> Optional[datetime]:
+        """Data de publicação da versão promovida (None se nunca treinado)"""
+        manifest = self.read_manifest(name, scope)
+        current = manifest.get("current")
+        if not current:
+            return None
+        return datetime.fromisoformat(manifest["versions"][current]["created_at"])
+
+    def get_version(self, name: str, scope: str) -> Optional[str]:
+        """Versão carregada em memória para (nome, escopo)"""
+        entry = self._loaded.get((name, scope))
+        return entry[0] if entry else None
+
+    async def preload(self) -> None:
+        """Carrega os modelos globais fora do event loop e libera a readiness"""
+        start = time.perf_counter()
+        for name, scope in self.iter_scopes():
+            if scope != GLOBAL_SCOPE:
+                continue  # por usuário: sob demanda (aget)
+            try:
+                loaded = await asyncio.to_thread(self._load_current, name, scope)
+                if loaded is not None:
+                    self._remember(name, scope, loaded)
+            except Exception as e:
+                logger.error(f"Erro ao pré-carregar modelo {name}/{scope}: {e}")
+        self.ready = True
+        logger.info(
+            f"Registro de modelos pronto: {len(self._loaded)} modelos em "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+    def _stale_scopes(
+        self, loaded: List[Tuple[Tuple[str, str], float]]
+    ) -> List[Tuple[str, str]]:
+        """Escopos em memória com manifesto mais novo e globais ainda não carregados (bloqueante)"""
+        stale = []
+        known = {key for key, _ in loaded}
+        for (name, scope), loaded_mtime in loaded:
+            try:
+                mtime = self._manifest_path(name, scope).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime > loaded_mtime:
+                stale.append((name, scope))
+        # Modelos globais ficam sempre em memória: só eles precisam de descoberta
+        for path in self.root.glob(f"*/{GLOBAL_SCOPE}/{MANIFEST_NAME}"):
+            key = (path.parent.parent.name, GLOBAL_SCOPE)
+            if key not in known:
+                stale.append(key)
+        return stale
+
+    async def refresh(self) -> None:
+        """Recarrega escopos em memória (e globais novos) cujo manifesto mudou desde a última carga"""
+        self._missing.clear()
+        # Só revalida o que está no LRU; o resto é carregado sob demanda se for usado
+        loaded = [(key, entry[2]) for key, entry in self._loaded.items()]
+        for name, scope in await asyncio.to_thread(self._stale_scopes, loaded):
+            entry = self._loaded.get((name, scope))
+            try:
+                loaded_entry = await asyncio.to_thread(self._load_current, name, scope)
+                if loaded_entry is not None and (entry is None or loaded_entry[0] != entry[0]):
+                    logger.info(f"Modelo {name}/{scope} recarregado: versão {loaded_entry[0]}")
+                if loaded_entry is not None:
+                    self._remember(name, scope, loaded_entry)
+            except Exception as e:
+                logger.error(f"Erro ao recarregar modelo {name}/{scope}: {e}")
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ML_REGISTRY_RELOAD_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Erro no watcher do registro de modelos: {e}")
+
+    def start_watcher(self) -> None:
+        """Inicia a verificação periódica de novas versões promovidas"""
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop_watcher(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    def status(self) -> Dict[str, Any]:
+        """Resumo para health checks"""
+        return {
+            "ready": self.ready,
+            "loaded": {f"{name}/{scope}": version for (name, scope), (version, _, _) in self._loaded.items()}
+        }
+
+
+# Instância global do registro
+model_registry = ModelRegistry()
@@ -0,0 +1,204 @@
+"""
+Categorizador por regras (caminho rápido antes do classificador ML)
+
+Regras são aprendidas das categorizações passadas de cada usuário: uma
+palavra-chave (unigrama ou bigrama da descrição normalizada) vira regra
+quando aparece em pelo menos ML_RULES_MIN_SUPPORT lançamentos e aponta para
+a mesma categoria em pelo menos ML_RULES_MIN_PRECISION deles ("saneamento
+goia" -> Água, "uber" -> Transporte, "salario" -> Salário).
+
+As regras de um usuário são compiladas em um autômato Aho–Corasick sobre
+tokens e publicadas no registro de modelos (escopo do usuário), então uma
+descrição é resolvida em uma única passada pelos seus tokens, sem pandas
+nem sklearn. Só as descrições sem regra (ou com regras em conflito) seguem
+para o classificador.
+"""
+
+import logging
+from collections import Counter, defaultdict, deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import ML_RULE_CATEGORIZER_LOOKUPS
+from app.services.model_registry import model_registry, user_scope
+from app.utils.text_normalizer import normalize_description
+
+logger = logging.getLogger(__name__)
+
+# Nome do artefato no registro de modelos
+CATEGORY_RULES = "category_rules"
+
+MAX_NGRAM = 2
+
+
+class KeywordAutomaton:
+    """Aho–Corasick cujo alfabeto são tokens (casa apenas palavras inteiras)"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+    def add(self, tokens: Sequence[str], value: int) -> None:
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append(value)
+
+    def compile(self) -> "KeywordAutomaton":
+        """Calcula os links de falha (BFS) e herda as saídas dos sufixos"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        return self
+
+    def search(self, tokens: Iterable[str]) -> List[int]:
+        """Valores de todas as palavras-chave contidas na sequência de tokens"""
+        found: List[int] = []
+        node = 0
+        for token in tokens:
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            found.extend(self._output[node])
+        return found
+
+
+class RuleCategorizer:
+    """Regras compiladas de um usuário: (palavra-chave, categoria, precisão, suporte)"""
+
+    def __init__(self, rules: List[Tuple[Tuple[str, ...], int, float, int]]):
+        self.rules = rules
+        self.automaton = KeywordAutomaton()
+        for index, (keyword, *_rest) in enumerate(rules):
+            self.automaton.add(keyword, index)
+        self.automaton.compile()
+
+    def match(self, description: str) -> Optional[int]:
+        """Categoria da regra mais específica que casa (None se nenhuma ou em conflito)"""
+        rule = self.match_rule(description)
+        return rule[1] if rule is not None else None
+
+    def match_rule(self, description: str) -> Optional[Tuple[Tuple[str, ...], int, float, int]]:
+        """Regra mais específica que casa (None se nenhuma ou em conflito)"""
+        hits = self.automaton.search(normalize_description(description or "").split())
+        if not hits:
+            return None
+
+        # Mais tokens vence; depois maior precisão e suporte
+        ranked = sorted(
+            (self.rules[i] for i in set(hits)),
+            key=lambda rule: (len(rule[0]), rule[2], rule[3]),
+            reverse=True
+        )
+        best = ranked[0]
+        for other in ranked[1:]:
+            if (len(other[0]), other[2]) < (len(best[0]), best[2]):
+                break
+            if other[1] != best[1]:
+                return None  # regras igualmente fortes discordam: deixa para o classificador
+        return best
+
+
+def learn_rules(transactions: List[Dict[str, Any]]) -> List[Tuple[Tuple[str, ...], int, float, int]]:
+    """Palavras-chave com suporte e precisão suficientes nas categorizações passadas"""
+    counts: Dict[Tuple[str, ...], Counter] = defaultdict(Counter)
+    for transaction in transactions:
+        categoria_id = transaction.get("categoria_id")
+        if categoria_id is None:
+            continue
+        tokens = normalize_description(transaction.get("descricao") or "").split()
+        keywords = {
+            tuple(tokens[i:i + n])
+            for n in range(1, MAX_NGRAM + 1)
+            for i in range(len(tokens) - n + 1)
+        }
+        for keyword in keywords:
+            counts[keyword][categoria_id] += 1
+
+    rules = []
+    for keyword, by_category in counts.items():
+        support = sum(by_category.values())
+        if support < settings.ML_RULES_MIN_SUPPORT:
+            continue
+        categoria_id, hits = by_category.most_common(1)[0]
+        precision = hits / support
+        if precision < settings.ML_RULES_MIN_PRECISION:
+            continue
+        rules.append((keyword, int(categoria_id), round(precision, 4), support))
+
+    # Bigramas cujos unigramas já resolvem para a mesma categoria não acrescentam nada
+    unigram_category = {rule[0][0]: rule[1] for rule in rules if len(rule[0]) == 1}
+    rules = [
+        rule for rule in rules
+        if len(rule[0]) == 1
+        or not all(unigram_category.get(token) == rule[1] for token in rule[0])
+    ]
+
+    rules.sort(key=lambda rule: rule[3], reverse=True)
+    return rules[:settings.ML_RULES_MAX]
+
+
+def train_category_rules(transactions: List[Dict[str, Any]], user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Aprende e publica as regras do usuário no registro de modelos"""
+    rules = learn_rules(transactions)
+    if not rules:
+        return {"error": "No unambiguous keywords found"}
+
+    categorizer = RuleCategorizer(rules)
+    metrics = {
+        "rules": len(rules),
+        "training_samples": len(transactions),
+    }
+    version = model_registry.publish(CATEGORY_RULES, user_scope(user_id), categorizer, metrics=metrics)
+    return {**metrics, "model_version": version}
+
+
+async def match_rules(
+    descriptions: Sequence[str], user_id: Optional[int] = None
+) -> List[Optional[Tuple[int, float]]]:
+    """(categoria, precisão da regra) para cada descrição (None = segue para o classificador)"""
+    categorizer: Optional[RuleCategorizer] = await model_registry.aget(CATEGORY_RULES, user_scope(user_id))
+    if categorizer is None:
+        ML_RULE_CATEGORIZER_LOOKUPS.labels("no_rules").inc(len(descriptions))
+        return [None] * len(descriptions)
+
+    results = []
+    for description in descriptions:
+        rule = categorizer.match_rule(description)
+        results.append((rule[1], rule[2]) if rule is not None else None)
+    hits = sum(result is not None for result in results)
+    if hits:
+        ML_RULE_CATEGORIZER_LOOKUPS.labels("hit").inc(hits)
+    if len(results) - hits:
+        ML_RULE_CATEGORIZER_LOOKUPS.labels("miss").inc(len(results) - hits)
+    return results
+
+
+def rule_stats() -> Dict[str, Any]:
+    """Taxa de acerto das regras neste processo (para o status de ML)"""
+    totals = {
+        sample.labels["result"]: sample.value
+        for metric in ML_RULE_CATEGORIZER_LOOKUPS.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    }
+    lookups = sum(totals.values())
+    return {
+        **{result: int(totals.get(result, 0)) for result in ("hit", "miss", "no_rules")},
+        "hit_rate": round(totals.get("hit", 0) / lookups, 4) if lookups else None,
+    }
@@ -0,0 +1,135 @@
+"""
+Feature store de gasto diário por usuário
+
+Mantém no Redis (um hash por usuário, um campo por dia) o total de despesas
+dos últimos HISTORY_DAYS dias — o suficiente para os lags (1/3/7) e médias
+móveis (3/7/14) do preditor de gastos. Cada escrita de lançamento apenas
+incrementa o dia correspondente (HINCRBYFLOAT atômico); o hash é
+reconstruído do banco por uma única consulta agregada quando não existe,
+então a previsão nunca depende do tamanho do histórico.
+
+Os dias são contados no fuso DEFAULT_TIMEZONE, tanto no agrupamento SQL da
+reconstrução quanto nos incrementos (expense_day). Cada escrita também
+incrementa um contador de versão: uma reconstrução só grava o hash se
+nenhuma escrita aconteceu desde que ela começou, senão o resultado (que
+pode não ver a escrita) é descartado e a próxima leitura reconstrói.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.financeiro import Lancamento, TipoLancamento
+from app.services.cache import cache
+
+LAGS = (1, 3, 7)
+ROLLING_WINDOWS = (3, 7, 14)
+HISTORY_DAYS = max(max(LAGS), max(ROLLING_WINDOWS))
+
+CALENDAR_FEATURES = ['day_of_week', 'day_of_month', 'month', 'is_weekend']
+SPENDING_FEATURE_COLUMNS = (
+    CALENDAR_FEATURES
+    + [f'lag_{lag}' for lag in LAGS]
+    + [f'rolling_avg_{window}' for window in ROLLING_WINDOWS]
+)
+
+CACHE_PREFIX = "spending_features"
+BUILT_FIELD = "_built"
+VERSION_SUFFIX = "version"
+STORE_TTL = 7 * 24 * 3600  # reconstruído semanalmente (descarta dias antigos)
+
+_LOCAL_TZ = ZoneInfo(settings.DEFAULT_TIMEZONE)
+
+
+def expense_day(moment: datetime) -> date:
+    """Dia local em que um lançamento conta (mesma regra do GROUP BY de rebuild)
+
+    Horários sem fuso são UTC, como o asyncpg os grava em colunas timestamptz.
+    """
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(_LOCAL_TZ).date()
+
+
+def local_today() -> date:
+    return datetime.now(_LOCAL_TZ).date()
+
+
+class SpendingFeatureStore:
+    """Janela de gastos diários por usuário, atualizada incrementalmente"""
+
+    def _key(self, user_id: int) -> str:
+        return f"{CACHE_PREFIX}:{user_id}"
+
+    def _version_key(self, user_id: int) -> str:
+        return f"{CACHE_PREFIX}:{user_id}:{VERSION_SUFFIX}"
+
+    def _bump_version(self, user_id: int) -> None:
+        """Marca uma escrita: reconstruções em andamento não gravam o hash"""
+        cache.incr(self._version_key(user_id))
+
+    @staticmethod
+    def _window_days(as_of: date) -> List[date]:
+        """Os HISTORY_DAYS dias até as_of (inclusive), do mais antigo ao mais recente"""
+        return [as_of - timedelta(days=offset) for offset in range(HISTORY_DAYS - 1, -1, -1)]
+
+    def record_expense(self, user_id: int, spent_at: datetime, amount: float) -> None:
+        """Soma uma despesa ao dia (no-op se a janela ainda não foi construída)"""
+        self._bump_version(user_id)
+        if amount:
+            cache.hash_incr_float_if_exists(
+                self._key(user_id), expense_day(spent_at).isoformat(), abs(amount)
+            )
+
+    def invalidate(self, user_id: int) -> None:
+        """Força reconstrução (edições/remoções de lançamentos)"""
+        self._bump_version(user_id)
+        cache.delete(self._key(user_id))
+
+    def _read(self, user_id: int, as_of: date) -> Optional[List[float]]:
+        days = self._window_days(as_of)
+        values = cache.hash_get_many(self._key(user_id), [BUILT_FIELD] + [d.isoformat() for d in days])
+        if not values[0]:
+            return None
+        return [float(v) if v else 0.0 for v in values[1:]]
+
+    async def rebuild(self, db: AsyncSession, user_id: int, as_of: date) -> List[float]:
+        """Reconstrói a janela com uma consulta agregada por dia"""
+        days = self._window_days(as_of)
+        # Lida antes da consulta: qualquer escrita depois dela invalida o resultado
+        version = cache.get(self._version_key(user_id)) or 0
+        day = func.date(func.timezone(settings.DEFAULT_TIMEZONE, Lancamento.data_lancamento))
+        result = await db.execute(
+            select(day, func.sum(Lancamento.valor))
+            .where(
+                Lancamento.user_id == user_id,
+                Lancamento.tipo == TipoLancamento.DESPESA,
+                Lancamento.data_lancamento >= datetime.combine(days[0], time.min, tzinfo=_LOCAL_TZ),
+            )
+            .group_by(day)
+        )
+        totals = {str(d): abs(float(total or 0)) for d, total in result.all()}
+
+        mapping = {BUILT_FIELD: 1, **totals}
+        cache.hash_replace_if(
+            self._key(user_id), mapping, self._version_key(user_id), version, ttl=STORE_TTL
+        )
+        return [totals.get(d.isoformat(), 0.0) for d in days]
+
+    async def get_history(
+        self, db: AsyncSession, user_id: int, as_of: Optional[date] = None
+    ) -> Tuple[date, List[float]]:
+        """(as_of, gastos diários da janela) — lido do Redis ou reconstruído"""
+        as_of = as_of or local_today()
+        history = self._read(user_id, as_of)
+        if history is None:
+            history = await self.rebuild(db, user_id, as_of)
+        return as_of, history
+
+
+# Instância global do feature store
+spending_feature_store = SpendingFeatureStore()
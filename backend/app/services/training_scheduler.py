@@ -0,0 +1,268 @@
+"""
+Agendador de retreino dos modelos ML por usuário
+
+A cada ML_RETRAIN_INTERVAL segundos uma varredura agrega, em uma consulta
+(com as datas de último treino, lidas dos manifestos, juntadas como uma
+lista VALUES), os lançamentos novos/alterados de cada usuário e decide quem
+precisa de retreino: volume de mudanças desde o último treino >= ML_RETRAIN_MIN_CHANGES,
+ou qualquer mudança em um modelo mais velho que ML_RETRAIN_MAX_AGE_HOURS.
+"Último treino" é a publicação mais recente ou a última tentativa, mesmo
+que tenha falhado (ex: classes com uma só amostra, nenhum lançamento
+categorizado) — sem isso, esses usuários seriam retreinados a cada varredura.
+
+Os usuários selecionados entram em uma fila; os jobs rodam em um pool de
+processos próprio (spawn), fora dos workers da API, com limite de memória,
+threads e prioridade reduzida por processo. Cada job publica as novas
+versões no registro de modelos (escrita atômica + manifesto), e os workers
+da API as carregam pelo watcher do registro.
+
+Com vários workers uvicorn, apenas quem obtém o lock no Redis faz a
+varredura de cada ciclo.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, Integer, column, func, literal, select, values
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import (
+    ML_TRAINING_JOB_DURATION,
+    ML_TRAINING_JOBS,
+    ML_TRAINING_QUEUE_DEPTH,
+)
+from app.models.financeiro import Lancamento
+from app.services.anomaly_stream import to_ml_transaction
+from app.services.cache import cache
+from app.services.model_registry import model_registry, user_scope
+from app.services.training_worker import limit_resources, train_user_models
+
+logger = logging.getLogger(__name__)
+
+SCAN_LOCK_KEY = "ml_training_scheduler:scan"
+
+# Modelo cujo manifesto marca a data do último treino do usuário
+REFERENCE_MODEL = "category_classifier"
+
+
+class TrainingScheduler:
+    """Varredura periódica + fila de usuários + pool de processos de treino"""
+
+    def __init__(self):
+        self._queue: "asyncio.Queue[int]" = asyncio.Queue()
+        self._queued: set = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.stats = {
+            "scans": 0,
+            "enqueued": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "last_scan_at": None,
+            "last_job_seconds": None,
+        }
+
+    # ------------------------------------------------------------------
+    # Decisão de retreino
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _trained_at_by_user() -> Dict[int, datetime]:
+        """Último treino de cada usuário: publicação (manifesto) ou tentativa, a mais recente"""
+        prefix = "user_"  # ver user_scope
+        trained: Dict[int, datetime] = {}
+        for name, scope in model_registry.iter_scopes():
+            if name != REFERENCE_MODEL or not scope.startswith(prefix):
+                continue
+            trained_at = model_registry.published_at(name, scope)
+            if trained_at is not None:
+                trained[int(scope[len(prefix):])] = trained_at
+        for scope, attempted_at in model_registry.training_attempts().items():
+            if scope.startswith(prefix):
+                user_id = int(scope[len(prefix):])
+                trained[user_id] = max(trained.get(user_id, attempted_at), attempted_at)
+        return trained
+
+    @staticmethod
+    def needs_retrain(
+        total: int,
+        last_change: Optional[datetime],
+        changed: int,
+        trained_at: Optional[datetime],
+        now: datetime,
+    ) -> bool:
+        """Decisão de retreino de um usuário a partir dos agregados da varredura"""
+        if trained_at is None:
+            return total >= settings.ML_RETRAIN_MIN_CHANGES
+        if last_change is None or last_change <= trained_at:
+            return False  # nada mudou desde o último treino
+        max_age = timedelta(hours=settings.ML_RETRAIN_MAX_AGE_HOURS)
+        return now - trained_at >= max_age or changed >= settings.ML_RETRAIN_MIN_CHANGES
+
+    async def find_users_to_retrain(self) -> List[int]:
+        """Usuários cujo volume de mudanças ou idade do modelo pedem retreino"""
+        changed_at = func.coalesce(Lancamento.updated_at, Lancamento.created_at)
+        now = datetime.now(timezone.utc)
+        trained = await asyncio.to_thread(self._trained_at_by_user)
+
+        # Total, última mudança e mudanças desde o último treino, por usuário
+        query = select(Lancamento.user_id, func.count(), func.max(changed_at))
+        if trained:
+            trained_at = values(
+                column("user_id", Integer), column("trained_at", DateTime(timezone=True)), name="trained"
+            ).data(list(trained.items()))
+            query = (
+                query.add_columns(func.count().filter(changed_at > trained_at.c.trained_at))
+                .select_from(Lancamento)
+                .outerjoin(trained_at, trained_at.c.user_id == Lancamento.user_id)
+            )
+        else:
+            query = query.add_columns(literal(0))
+
+        async with database.async_session_factory() as session:
+            result = await session.execute(query.group_by(Lancamento.user_id))
+            rows = result.all()
+
+        return [
+            user_id
+            for user_id, total, last_change, changed in rows
+            if self.needs_retrain(total, last_change, changed, trained.get(user_id), now)
+        ]
+
+    async def scan(self) -> int:
+        """Enfileira os usuários que precisam de retreino; retorna quantos entraram"""
+        if database.async_session_factory is None:
+            return 0
+
+        enqueued = 0
+        for user_id in await self.find_users_to_retrain():
+            if user_id in self._queued:
+                continue
+            self._queued.add(user_id)
+            self._queue.put_nowait(user_id)
+            enqueued += 1
+
+        self.stats["scans"] += 1
+        self.stats["enqueued"] += enqueued
+        self.stats["last_scan_at"] = datetime.now(timezone.utc).isoformat()
+        ML_TRAINING_QUEUE_DEPTH.inc(enqueued)
+        return enqueued
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    async def _load_transactions(self, user_id: int) -> List[Dict[str, Any]]:
+        async with database.async_session_factory() as session:
+            result = await session.execute(
+                select(
+                    Lancamento.id,
+                    Lancamento.descricao,
+                    Lancamento.valor,
+                    Lancamento.tipo,
+                    Lancamento.data_lancamento,
+                    Lancamento.categoria_id,
+                ).where(Lancamento.user_id == user_id)
+            )
+            return [to_ml_transaction(row) for row in result.all()]
+
+    async def run_job(self, user_id: int) -> Dict[str, Any]:
+        """Treina todos os modelos de um usuário no pool de processos"""
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            transactions = await self._load_transactions(user_id)
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self._get_pool(), train_user_models, user_id, transactions)
+
+            status = "success" if all("error" not in r for r in results.values()) else "partial"
+            # Este worker não precisa esperar o watcher para servir as novas versões
+            await model_registry.refresh()
+            return results
+        except Exception as e:
+            logger.error(f"Erro no retreino do usuário {user_id}: {e}")
+            return {"error": str(e)}
+        finally:
+            # Também em falhas: o usuário só volta à fila com novas mudanças
+            try:
+                await asyncio.to_thread(model_registry.record_training_attempt, user_scope(user_id))
+            except Exception as e:
+                logger.error(f"Erro ao registrar tentativa de treino do usuário {user_id}: {e}")
+            elapsed = time.perf_counter() - start
+            ML_TRAINING_JOBS.labels(status).inc()
+            ML_TRAINING_JOB_DURATION.observe(elapsed)
+            self.stats["succeeded" if status != "failed" else "failed"] += 1
+            self.stats["last_job_seconds"] = round(elapsed, 2)
+
+    async def _worker(self) -> None:
+        while True:
+            user_id = await self._queue.get()
+            try:
+                await self.run_job(user_id)
+            finally:
+                self._queued.discard(user_id)
+                ML_TRAINING_QUEUE_DEPTH.dec()
+                self._queue.task_done()
+
+    async def _scan_loop(self) -> None:
+        while True:
+            try:
+                # Um único worker uvicorn varre por ciclo
+                if cache.acquire_lock(SCAN_LOCK_KEY, ttl=settings.ML_RETRAIN_INTERVAL, owner=str(os.getpid())):
+                    enqueued = await self.scan()
+                    if enqueued:
+                        logger.info(f"Retreino agendado para {enqueued} usuários")
+            except Exception as e:
+                logger.error(f"Erro na varredura de retreino: {e}")
+            await asyncio.sleep(settings.ML_RETRAIN_INTERVAL)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Reciclar os processos devolve a memória dos modelos periodicamente
+            # (max_tasks_per_child só existe a partir do Python 3.11)
+            recycle = {"max_tasks_per_child": 20} if sys.version_info >= (3, 11) else {}
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.ML_TRAINING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=limit_resources,
+                initargs=(settings.ML_TRAINING_MEMORY_LIMIT_MB, settings.ML_TRAINING_THREADS),
+                **recycle,
+            )
+        return self._pool
+
+    def start(self) -> None:
+        """Inicia a varredura periódica e os consumidores da fila"""
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._scan_loop()))
+        for _ in range(settings.ML_TRAINING_WORKERS):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize(),
+            "running": bool(self._tasks),
+        }
+
+
+# Instância global do agendador
+training_scheduler = TrainingScheduler()
@@ -0,0 +1,47 @@
+"""
+Código executado dentro dos processos do pool de treino
+
+Fica em um módulo sem imports da aplicação no topo: o processo filho (spawn)
+importa este módulo para desserializar o initializer, e os limites de
+threads precisam estar no ambiente antes de app.core.config, numpy ou
+sklearn serem carregados.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def limit_resources(memory_limit_mb: int, threads: int) -> None:
+    """Initializer dos processos de treino: threads, memória e prioridade"""
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    # Lido pelas Settings do processo filho (n_jobs dos estimadores)
+    os.environ["ML_N_JOBS"] = str(threads)
+
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        os.nice(10)
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Não foi possível limitar recursos do processo de treino: {e}")
+
+
+def train_user_models(user_id: int, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Treina e publica (registro de modelos) todos os modelos de um usuário"""
+    from app.services.ml_service import ml_service
+    from app.services.rule_categorizer import train_category_rules
+
+    async def train_all() -> Dict[str, Any]:
+        return {
+            "category_rules": train_category_rules(transactions, user_id=user_id),
+            "category_classifier": await ml_service.train_category_classifier(transactions, user_id=user_id),
+            "spending_predictor": await ml_service.train_spending_predictor(transactions, user_id=user_id),
+            "anomaly_detector": await ml_service.train_anomaly_detector(transactions, user_id=user_id),
+        }
+
+    return asyncio.run(train_all())
@@ -0,0 +1,27 @@
+"""
+Fast JSON serialization helpers (orjson) for large list/analytics responses
+"""
+
+from typing import Any, Dict, List
+
+import orjson
+from fastapi.responses import Response
+from sqlalchemy.engine import Result
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes with orjson (datetime, enum, numpy supported natively)"""
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def rows_to_dicts(result: Result) -> List[Dict[str, Any]]:
+    """Map rows of a column select() to dicts without hydrating ORM objects"""
+    return [dict(row) for row in result.mappings()]
+
+
+class RawJSONResponse(Response):
+    """Response for an already serialized JSON body (skips validation and encoding)"""
+
+    media_type = "application/json"
@@ -0,0 +1,71 @@
+"""
+Fast, memoized normalizer for bank/ledger descriptions (Portuguese-aware)
+
+Descriptions repeat heavily ("PIX ENVIADO ...", "UBER *TRIP"), so results are
+memoized in a bounded LRU keyed by the raw text, and the batch API only
+normalizes each distinct value of a Series once. Everything runs on
+precompiled regexes and the standard library (no NLTK, no downloads).
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Combining marks left by NFKD (á -> a + ´)
+_COMBINING_RE = re.compile(r"[\u0300-\u036f]+")
+# Anything that is not a letter becomes a separator (digits, ids, "*", "/", "-")
+_NON_LETTER_RE = re.compile(r"[^a-z]+")
+# Plural endings for the light stemmer (servicos -> servico, cartoes -> cartao)
+_PLURAL_OES_RE = re.compile(r"(?:oes|aes)$")
+_PLURAL_S_RE = re.compile(r"(?<=[aeo])s$")
+
+MIN_TOKEN_LENGTH = 2
+
+STOPWORDS = frozenset({
+    "a", "ao", "aos", "as", "com", "da", "das", "de", "do", "dos", "e", "em",
+    "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelo", "por",
+    "pra", "que", "se", "sem", "sob", "sobre", "um", "uma", "uns", "umas",
+    # Sufixos societários que não ajudam a categorizar
+    "ltda", "eireli", "epp", "me", "sa",
+})
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and _PLURAL_OES_RE.search(token):
+        return token[:-3] + "ao"
+    if len(token) > 3:
+        return _PLURAL_S_RE.sub("", token)
+    return token
+
+
+@lru_cache(maxsize=settings.ML_TEXT_CACHE_SIZE)
+def normalize_description(text: str) -> str:
+    """Lowercase, strip accents/digits/punctuation, drop stopwords, light-stem plurals"""
+    if not text:
+        return ""
+
+    text = _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text.lower()))
+    return " ".join(
+        _stem(token)
+        for token in _NON_LETTER_RE.split(text)
+        if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS
+    )
+
+
+def normalize_series(descriptions: "pd.Series") -> "pd.Series":
+    """Normalize a whole Series, computing each distinct description only once"""
+    values = descriptions.fillna("").astype(str)
+    mapping = {text: normalize_description(text) for text in values.unique()}
+    return values.map(mapping)
+
+
+def cache_info() -> dict:
+    """Hit/miss statistics of the memo"""
+    info = normalize_description.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
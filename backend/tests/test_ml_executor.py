@@ -0,0 +1,48 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import ml_executor as executor_module
+from app.services.ml_executor import MLExecutor, MLTaskTimeout
+
+SLOW_TASK_SECONDS = 0.6
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    def run_analyzer_method(method, args, kwargs):
+        if method == "slow":
+            time.sleep(SLOW_TASK_SECONDS)
+        return method
+
+    monkeypatch.setattr(executor_module, "_run_analyzer_method", run_analyzer_method)
+
+    executor = MLExecutor(max_workers=2, max_concurrency=1, timeout=0.2)
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(executor, "_get_pool", lambda: pool)
+    yield executor
+    pool.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_timed_out_task_keeps_its_slot_until_it_finishes(executor):
+    """Uma tarefa que estourou o timeout continua contando contra ML_EXECUTOR_MAX_CONCURRENCY"""
+    started = time.perf_counter()
+    with pytest.raises(MLTaskTimeout):
+        await executor.run("slow")
+
+    # O resultado foi descartado, mas o trabalho ainda está rodando
+    assert executor.status()["occupied_slots"] == 1
+    assert executor.status()["in_flight"] == 0
+
+    # Com a vaga ainda ocupada, a próxima tarefa nem chega a ser submetida
+    with pytest.raises(MLTaskTimeout):
+        await executor.run("fast", timeout=0.1)
+    assert time.perf_counter() - started < SLOW_TASK_SECONDS
+
+    # Quando a tarefa lenta termina, a vaga volta
+    await asyncio.sleep(SLOW_TASK_SECONDS)
+    assert executor.status()["occupied_slots"] == 0
+    assert await executor.run("fast") == "fast"
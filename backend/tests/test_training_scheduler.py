@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.services import training_scheduler as scheduler_module
+from app.services.model_registry import ModelRegistry, user_scope
+from app.services.training_scheduler import TrainingScheduler
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = ModelRegistry(root=str(tmp_path))
+    monkeypatch.setattr(scheduler_module, "model_registry", registry)
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_failed_training_is_not_retried_every_scan(registry, monkeypatch):
+    """Um usuário cujo classificador nunca treina não volta à fila sem novas mudanças"""
+    user_id = 7
+
+    async def load_transactions(self, _user_id):
+        return []
+
+    def train_user_models(_user_id, _transactions):
+        # Ex: train_test_split(stratify=y) com uma classe de uma só amostra
+        return {"category_classifier": {"error": "The least populated class in y has only 1 member"}}
+
+    monkeypatch.setattr(TrainingScheduler, "_load_transactions", load_transactions)
+    monkeypatch.setattr(scheduler_module, "train_user_models", train_user_models)
+
+    scheduler = TrainingScheduler()
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(scheduler, "_get_pool", lambda: pool)
+    try:
+        before = datetime.now(timezone.utc)
+        await scheduler.run_job(user_id)
+    finally:
+        pool.shutdown()
+
+    # Nenhum manifesto publicado, mas a tentativa fica registrada
+    assert registry.published_at("category_classifier", user_scope(user_id)) is None
+    trained_at = TrainingScheduler._trained_at_by_user()[user_id]
+    assert trained_at >= before
+
+    now = trained_at + timedelta(minutes=15)
+    total = settings.ML_RETRAIN_MIN_CHANGES + 100
+    # Só as mudanças antigas: não retreina na próxima varredura
+    assert not TrainingScheduler.needs_retrain(total, trained_at - timedelta(days=1), 0, trained_at, now)
+    # Poucas mudanças novas num modelo recente: ainda não
+    assert not TrainingScheduler.needs_retrain(
+        total, now, settings.ML_RETRAIN_MIN_CHANGES - 1, trained_at, now
+    )
+    # Volume suficiente de mudanças desde a tentativa: retreina
+    assert TrainingScheduler.needs_retrain(total, now, settings.ML_RETRAIN_MIN_CHANGES, trained_at, now)
+
+
+def test_user_without_attempts_is_trained_once_enough_data(registry):
+    now = datetime.now(timezone.utc)
+    assert TrainingScheduler._trained_at_by_user() == {}
+    assert TrainingScheduler.needs_retrain(settings.ML_RETRAIN_MIN_CHANGES, now, 0, None, now)
+    assert not TrainingScheduler.needs_retrain(settings.ML_RETRAIN_MIN_CHANGES - 1, now, 0, None, now)
@@ -105,6 +105,7 @@ CREATE TABLE IF NOT EXISTS lancamentos (
     data_lancamento TIMESTAMP WITH TIME ZONE NOT NULL,
     user_id INTEGER REFERENCES users(id),
     categoria_id INTEGER REFERENCES categorias(id),
+    fingerprint VARCHAR(32),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -176,6 +177,7 @@ ON CONFLICT DO NOTHING;
 CREATE INDEX IF NOT EXISTS idx_lancamentos_user_id ON lancamentos(user_id);
 CREATE INDEX IF NOT EXISTS idx_lancamentos_data ON lancamentos(data_lancamento);
 CREATE INDEX IF NOT EXISTS idx_lancamentos_tipo ON lancamentos(tipo);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_lancamentos_user_fingerprint ON lancamentos(user_id, fingerprint);
 CREATE INDEX IF NOT EXISTS idx_fin_lancamentos_user_id ON fin_lancamentos(user_id);
 CREATE INDEX IF NOT EXISTS idx_fin_lancamentos_data ON fin_lancamentos(dt_documento);
 CREATE INDEX IF NOT EXISTS idx_fin_lancamentos_status ON fin_lancamentos(status_lan); 
\ No newline at end of file
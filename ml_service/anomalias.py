@@ -0,0 +1,179 @@
+"""
+Detector de anomalias de lançamentos
+
+Features por lançamento: log do valor absoluto, dia da semana e frequência
+da categoria na janela de treino (categorias raras pesam como anomalia).
+O IsolationForest é reajustado periodicamente sobre uma janela deslizante
+dos últimos ANOMALIA_JANELA_DIAS dias; com vários workers gunicorn apenas um
+reajusta por ciclo (flock) e os demais recarregam o artefato pelo mtime.
+
+A pontuação recebe arrays (colunas) e monta a matriz de features direto em
+NumPy, sem DataFrame por requisição.
+"""
+
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+MODELS_DIR = os.getenv("MODELS_DIR", "/app/models")
+ANOMALIA_PATH = os.path.join(MODELS_DIR, "anomaly_detector_v2.joblib")
+LOCK_PATH = os.path.join(MODELS_DIR, ".anomaly_refit.lock")
+
+JANELA_DIAS = int(os.getenv("ANOMALIA_JANELA_DIAS", 180))
+REFIT_INTERVALO = int(os.getenv("ANOMALIA_REFIT_INTERVALO", 3600))
+CONTAMINACAO = float(os.getenv("ANOMALIA_CONTAMINACAO", 0.05))
+
+FEATURES = ['log_valor', 'dia_semana', 'freq_categoria']
+
+# Lançamentos da janela (tabela do backend)
+JANELA_QUERY = """
+    SELECT l.valor,
+           l.data_lancamento,
+           COALESCE(c.nome, 'outros') AS categoria
+    FROM lancamentos l
+    LEFT JOIN categorias c ON c.id = l.categoria_id
+    WHERE l.data_lancamento >= %(desde)s
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _dia_semana(datas) -> np.ndarray:
+    """Dia da semana (segunda = 0) de datas ISO ou datetime64"""
+    # [s] aceita ISO com ou sem horário; depois trunca para o dia
+    dias = np.asarray(datas, dtype='datetime64[s]').astype('datetime64[D]').astype(np.int64)
+    # 1970-01-01 foi uma quinta-feira (3)
+    return (dias + 3) % 7
+
+
+def montar_features(valores, datas, categorias, freq_por_categoria) -> np.ndarray:
+    """Matriz (n, 3) de features a partir das colunas do lote"""
+    valores = np.abs(np.asarray(valores, dtype=np.float64))
+    freq = np.fromiter(
+        (freq_por_categoria.get(c, 0.0) for c in categorias),
+        dtype=np.float64,
+        count=len(valores)
+    )
+    return np.column_stack([np.log1p(valores), _dia_semana(datas), freq])
+
+
+class DetectorAnomalias:
+    """IsolationForest com janela deslizante, reajuste agendado e pontuação em lote"""
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._artefato = None
+        self._mtime = 0.0
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Treino
+    # ------------------------------------------------------------------
+
+    def treinar(self, dados: pd.DataFrame = None):
+        """Ajusta o detector na janela (lida do banco se `dados` não for informado)"""
+        if dados is None:
+            desde = date.today() - timedelta(days=JANELA_DIAS)
+            dados = pd.read_sql(JANELA_QUERY, self.engine, params={"desde": desde})
+        if dados.empty:
+            raise ValueError("Sem lançamentos na janela de treino")
+
+        categorias = dados['categoria'].fillna('outros').to_numpy()
+        nomes, contagens = np.unique(categorias, return_counts=True)
+        freq_por_categoria = dict(zip(nomes.tolist(), (contagens / len(categorias)).tolist()))
+
+        X = montar_features(dados['valor'].to_numpy(), dados['data_lancamento'].to_numpy(), categorias, freq_por_categoria)
+        modelo = IsolationForest(contamination=CONTAMINACAO, random_state=42, n_jobs=-1)
+        modelo.fit(X)
+
+        artefato = {
+            "modelo": modelo,
+            "freq_por_categoria": freq_por_categoria,
+            "features": FEATURES,
+            "version": datetime.now().strftime("%Y%m%d%H%M%S"),
+            "linhas": len(X),
+            "janela_dias": JANELA_DIAS,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=MODELS_DIR, prefix=".tmp-")
+        os.close(fd)
+        joblib.dump(artefato, tmp_path)
+        os.replace(tmp_path, ANOMALIA_PATH)
+
+        self._artefato = artefato
+        self._mtime = os.path.getmtime(ANOMALIA_PATH)
+        return {"version": artefato["version"], "linhas": len(X)}
+
+    def _reajustar_se_devido(self):
+        """Reajusta se o artefato for mais velho que o intervalo (um worker por vez)"""
+        if os.path.exists(ANOMALIA_PATH) and time.time() - os.path.getmtime(ANOMALIA_PATH) < REFIT_INTERVALO:
+            return
+        with open(LOCK_PATH, "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # outro worker está reajustando
+            try:
+                # Outro worker pode ter reajustado entre a verificação e o lock
+                if os.path.exists(ANOMALIA_PATH) and time.time() - os.path.getmtime(ANOMALIA_PATH) < REFIT_INTERVALO:
+                    return
+                logger.info(f"Detector de anomalias reajustado: {self.treinar()}")
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _agendador(self):
+        while True:
+            try:
+                self._reajustar_se_devido()
+            except Exception as e:
+                logger.error(f"Erro no reajuste do detector de anomalias: {e}")
+            time.sleep(REFIT_INTERVALO)
+
+    def iniciar_agendador(self):
+        """Inicia o reajuste periódico numa thread daemon (uma por worker)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._agendador, daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Pontuação
+    # ------------------------------------------------------------------
+
+    def _carregar(self):
+        if not os.path.exists(ANOMALIA_PATH):
+            raise Exception("Modelo de detecção de anomalias não encontrado. Execute o treinamento primeiro.")
+        mtime = os.path.getmtime(ANOMALIA_PATH)
+        if self._artefato is None or mtime != self._mtime:
+            self._artefato = joblib.load(ANOMALIA_PATH)
+            self._mtime = mtime
+        return self._artefato
+
+    def pontuar(self, valores, datas, categorias):
+        """(anomalia, score) para colunas de um lote; score menor = mais anômalo"""
+        artefato = self._carregar()
+        if not (len(valores) == len(datas) == len(categorias)):
+            raise ValueError("valores, datas e categorias devem ter o mesmo tamanho")
+        if len(valores) == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+
+        X = montar_features(valores, datas, categorias, artefato["freq_por_categoria"])
+        modelo = artefato["modelo"]
+        scores = modelo.score_samples(X)
+        return scores < modelo.offset_, scores
+
+    def status(self):
+        artefato = self._artefato
+        return {
+            "version": artefato["version"] if artefato else None,
+            "linhas": artefato["linhas"] if artefato else None,
+            "janela_dias": JANELA_DIAS,
+            "refit_intervalo": REFIT_INTERVALO,
+        }
@@ -1,14 +1,20 @@
 from flask import Flask, request, jsonify
 from prophet import Prophet
-from sklearn.ensemble import IsolationForest
+from prophet.serialize import model_to_json, model_from_json
 import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine
-import joblib
+import json
 import os
+import tempfile
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from sklearn.preprocessing import StandardScaler
 
+from anomalias import DetectorAnomalias
+from previsao_segmentada import PrevisaoSegmentada
+
 app = Flask(__name__)
 
 # Configuração dos diretórios
@@ -20,70 +26,138 @@ PROCESSED_DIR = os.path.join(DATA_DIR, "processed")
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://biuai:biuai123@db:5432/biuai")
 engine = create_engine(DATABASE_URL)
 
+# Previsões guardadas por worker, por (versão do modelo, horizonte)
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", 64))
+
+# Série diária agregada no banco: o Prophet ajusta um ponto por dia, não um por lançamento
+DAILY_SERIES_QUERY = """
+    SELECT CAST(data_lancamento AS DATE) AS ds, SUM(valor) AS y
+    FROM lancamentos_financeiros
+    GROUP BY CAST(data_lancamento AS DATE)
+    ORDER BY ds
+"""
+
 # Criar diretório de modelos se não existir
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+
+def _escrita_atomica(caminho, conteudo):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        f.write(conteudo)
+    os.replace(tmp_path, caminho)
+
+
+def _stan_init(modelo):
+    """Parâmetros de um Prophet ajustado, no formato de init do Stan (warm start)"""
+    params = {}
+    for nome in ['k', 'm', 'sigma_obs']:
+        params[nome] = modelo.params[nome][0][0]
+    for nome in ['delta', 'beta']:
+        params[nome] = modelo.params[nome][0]
+    return params
+
+
 class MLService:
     def __init__(self):
         self.prophet_model = None
-        self.anomaly_detector = None
+        self.prophet_version = None
+        self.anomaly_detector = DetectorAnomalias(engine)
         self.prophet_path = os.path.join(MODELS_DIR, "prophet_model.json")
-        self.anomaly_path = os.path.join(MODELS_DIR, "anomaly_detector.joblib")
-        
-    def treinar_prophet(self, dados):
-        """Treina modelo Prophet para previsão de séries temporais"""
-        df = pd.DataFrame({
-            'ds': dados['data_lancamento'],
-            'y': dados['valor']
-        })
+        self.prophet_meta_path = os.path.join(MODELS_DIR, "prophet_model.meta.json")
+        self._forecast_cache = OrderedDict()
+        self._lock = threading.Lock()
         
-        self.prophet_model = Prophet(
+    def _novo_prophet(self):
+        return Prophet(
             yearly_seasonality=True,
             weekly_seasonality=True,
             daily_seasonality=False
         )
-        self.prophet_model.fit(df)
         
-        # Salvar modelo
-        self.prophet_model.save(self.prophet_path)
+    def treinar_prophet(self, serie_diaria):
+        """Treina modelo Prophet na série diária (ds, y), partindo do ajuste anterior"""
+        self._carregar_prophet()
+        anterior = self.prophet_model
+        
+        modelo = self._novo_prophet()
+        warm_start = False
+        if anterior is not None:
+            try:
+                modelo.fit(serie_diaria, init=_stan_init(anterior))
+                warm_start = True
+            except Exception:
+                # Nº de changepoints mudou com o tamanho da série: ajuste do zero
+                modelo = self._novo_prophet()
+        if not warm_start:
+            modelo.fit(serie_diaria)
+        
+        # Salvar modelo e depois o metadado com a versão (os outros workers olham o metadado)
+        versao = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        _escrita_atomica(self.prophet_path, model_to_json(modelo))
+        _escrita_atomica(self.prophet_meta_path, json.dumps({
+            "version": versao,
+            "warm_start": warm_start,
+            "dias": len(serie_diaria)
+        }))
+        
+        with self._lock:
+            self.prophet_model = modelo
+            self.prophet_version = versao
+            self._forecast_cache.clear()
+        return {"version": versao, "warm_start": warm_start, "dias": len(serie_diaria)}
+        
+    def _carregar_prophet(self):
+        """Carrega o modelo salvo se a versão em disco for diferente da carregada"""
+        if not os.path.exists(self.prophet_meta_path):
+            return
+        with open(self.prophet_meta_path) as f:
+            versao = json.load(f)["version"]
+        if versao == self.prophet_version:
+            return
+        with open(self.prophet_path) as f:
+            modelo = model_from_json(f.read())
+        with self._lock:
+            self.prophet_model = modelo
+            self.prophet_version = versao
+            self._forecast_cache.clear()
         
     def prever_valores(self, periodos=30):
-        """Realiza previsões com o modelo Prophet"""
+        """Realiza previsões com o modelo Prophet (cache por versão e horizonte)"""
+        self._carregar_prophet()
         if self.prophet_model is None:
-            if os.path.exists(self.prophet_path):
-                self.prophet_model = Prophet.load(self.prophet_path)
-            else:
-                raise Exception("Modelo Prophet não encontrado. Execute o treinamento primeiro.")
+            raise Exception("Modelo Prophet não encontrado. Execute o treinamento primeiro.")
+        
+        chave = (self.prophet_version, periodos)
+        with self._lock:
+            if chave in self._forecast_cache:
+                self._forecast_cache.move_to_end(chave)
+                return self._forecast_cache[chave]
                 
         future = self.prophet_model.make_future_dataframe(periods=periodos)
         forecast = self.prophet_model.predict(future)
-        return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
-    
-    def treinar_anomaly_detector(self, dados):
-        """Treina detector de anomalias"""
-        X = dados[['valor']].values
-        self.anomaly_detector = IsolationForest(
-            contamination=0.1,
-            random_state=42
-        )
-        self.anomaly_detector.fit(X)
+        resultado = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
         
-        # Salvar modelo
-        joblib.dump(self.anomaly_detector, self.anomaly_path)
+        with self._lock:
+            self._forecast_cache[chave] = resultado
+            while len(self._forecast_cache) > FORECAST_CACHE_SIZE:
+                self._forecast_cache.popitem(last=False)
+        return resultado
     
-    def detectar_anomalias(self, dados):
-        """Detecta anomalias nos dados"""
-        if self.anomaly_detector is None:
-            if os.path.exists(self.anomaly_path):
-                self.anomaly_detector = joblib.load(self.anomaly_path)
-            else:
-                raise Exception("Modelo de detecção de anomalias não encontrado. Execute o treinamento primeiro.")
-                
-        X = dados[['valor']].values
-        predictions = self.anomaly_detector.predict(X)
-        return predictions
+    def treinar_anomaly_detector(self):
+        """Treina detector de anomalias na janela deslizante de lançamentos"""
+        return self.anomaly_detector.treinar()
+    
+    def detectar_anomalias(self, valores, datas, categorias):
+        """Detecta anomalias em colunas de lançamentos"""
+        return self.anomaly_detector.pontuar(valores, datas, categorias)
 
 ml_service = MLService()
+previsao_segmentada = PrevisaoSegmentada(engine)
+
+# Reajuste periódico do detector de anomalias (cada worker verifica; um reajusta)
+if os.getenv("ANOMALIA_AGENDADOR", "1") == "1":
+    ml_service.anomaly_detector.iniciar_agendador()
 
 @app.route('/')
 def root():
@@ -95,16 +169,21 @@ def treinar():
         # Carregar dados do banco
         query = "SELECT data_lancamento, valor FROM lancamentos_financeiros"
         dados = pd.read_sql(query, engine)
+        serie_diaria = pd.read_sql(DAILY_SERIES_QUERY, engine, parse_dates=['ds'])
         
         # Treinar modelos
-        ml_service.treinar_prophet(dados)
-        ml_service.treinar_anomaly_detector(dados)
+        prophet_info = ml_service.treinar_prophet(serie_diaria)
+        anomalias_info = ml_service.treinar_anomaly_detector()
         
         # Salvar dados processados
         arquivo_processado = os.path.join(PROCESSED_DIR, f"dados_ml_{datetime.now().strftime('%Y%m%d')}.csv")
         dados.to_csv(arquivo_processado, index=False)
         
-        return jsonify({"message": "Modelos treinados com sucesso!"})
+        return jsonify({
+            "message": "Modelos treinados com sucesso!",
+            "prophet": prophet_info,
+            "anomalias": anomalias_info
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -117,12 +196,64 @@ def prever():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/treinar/segmentos', methods=['POST'])
+def treinar_segmentos():
+    """Dispara o ajuste em lote dos modelos por usuário e categoria"""
+    if not previsao_segmentada.treinar_em_segundo_plano():
+        return jsonify({"message": "Job já em execução", **previsao_segmentada.status()}), 409
+    return jsonify({"message": "Job de previsões segmentadas iniciado"}), 202
+
+@app.route('/treinar/segmentos/status', methods=['GET'])
+def status_segmentos():
+    return jsonify(previsao_segmentada.status())
+
+@app.route('/prever/usuario/<int:user_id>', methods=['GET'])
+def prever_usuario(user_id):
+    try:
+        periodos = request.args.get('periodos', default=30, type=int)
+        categoria = request.args.get('categoria')
+        previsao = previsao_segmentada.prever_usuario(user_id, periodos, categoria)
+        if previsao is None:
+            return jsonify({"error": "Sem modelos para este usuário. Execute /treinar/segmentos."}), 404
+        return jsonify(previsao)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/anomalias', methods=['POST'])
 def detectar_anomalias():
     try:
-        dados = pd.DataFrame(request.json)
-        anomalias = ml_service.detectar_anomalias(dados)
-        return jsonify({"anomalias": anomalias.tolist()})
+        registros = request.json
+        anomalias, _ = ml_service.detectar_anomalias(
+            [r['valor'] for r in registros],
+            [r.get('data_lancamento') or r.get('data') for r in registros],
+            [r.get('categoria') or 'outros' for r in registros]
+        )
+        # Mesmo contrato do IsolationForest.predict: -1 anomalia, 1 normal
+        return jsonify({"anomalias": np.where(anomalias, -1, 1).tolist()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/anomalias/lote', methods=['POST'])
+def pontuar_anomalias_lote():
+    """Pontua um lote em formato colunar: {"valores": [...], "datas": [...], "categorias": [...]}"""
+    try:
+        corpo = request.get_json()
+        valores = corpo['valores']
+        anomalias, scores = ml_service.detectar_anomalias(
+            valores,
+            corpo['datas'],
+            corpo.get('categorias') or ['outros'] * len(valores)
+        )
+        return jsonify({
+            "anomalias": anomalias.tolist(),
+            "scores": np.round(scores, 6).tolist(),
+            "total_anomalias": int(anomalias.sum()),
+            **ml_service.anomaly_detector.status()
+        })
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -151,4 +282,5 @@ def predict():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # Apenas desenvolvimento: em produção o serviço roda no gunicorn (gunicorn.conf.py)
     app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
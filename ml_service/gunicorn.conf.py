@@ -0,0 +1,22 @@
+"""Configuração do gunicorn para o ML Service"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# Prophet/sklearn são CPU-bound: um processo por núcleo, limitado por padrão
+workers = int(os.getenv("WORKERS", min(4, multiprocessing.cpu_count())))
+threads = int(os.getenv("THREADS", 2))
+worker_class = "gthread"
+
+# /treinar ajusta Prophet e IsolationForest na requisição
+timeout = int(os.getenv("TIMEOUT", 300))
+graceful_timeout = 30
+
+# Recicla workers periodicamente para devolver memória do Stan/pandas
+max_requests = int(os.getenv("MAX_REQUESTS", 1000))
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
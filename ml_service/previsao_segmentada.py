@@ -0,0 +1,319 @@
+"""
+Previsões por usuário e categoria
+
+Um job ajusta, em paralelo num pool de processos, um Prophet pequeno por
+série diária de despesas (usuário, categoria). De cada ajuste guardamos só
+os parâmetros (tendência, changepoints, coeficientes de Fourier, escalas) em
+um JSON por usuário; as consultas reconstroem a previsão com NumPy a partir
+desses parâmetros, sem Prophet nem ajuste no momento da requisição.
+
+Com vários workers gunicorn, um flock em SEGMENTOS_DIR garante um único job
+por vez e o status (em execução / última execução) vem do próprio lock e de
+um arquivo de status, então qualquer worker responde o mesmo.
+
+Uso (cron):
+    python previsao_segmentada.py
+"""
+
+import fcntl
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+MODELS_DIR = os.getenv("MODELS_DIR", "/app/models")
+SEGMENTOS_DIR = os.path.join(MODELS_DIR, "segmentos")
+LOCK_PATH = os.path.join(SEGMENTOS_DIR, ".treino.lock")
+STATUS_PATH = os.path.join(SEGMENTOS_DIR, "status.json")
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+HISTORICO_DIAS = int(os.getenv("SEGMENTOS_HISTORICO_DIAS", 730))
+MIN_DIAS_COM_GASTO = int(os.getenv("SEGMENTOS_MIN_DIAS", 10))
+
+# z da normal para o intervalo de 80% (o mesmo interval_width padrão do Prophet)
+Z_80 = 1.2816
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# Despesas diárias por usuário e categoria (tabela do backend)
+SERIES_QUERY = """
+    SELECT l.user_id,
+           COALESCE(c.nome, 'outros') AS categoria,
+           CAST(l.data_lancamento AS DATE) AS ds,
+           SUM(ABS(l.valor)) AS y
+    FROM lancamentos l
+    LEFT JOIN categorias c ON c.id = l.categoria_id
+    WHERE CAST(l.tipo AS TEXT) = 'DESPESA'
+      AND l.data_lancamento >= %(desde)s
+    GROUP BY l.user_id, COALESCE(c.nome, 'outros'), CAST(l.data_lancamento AS DATE)
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _escrita_atomica(caminho, conteudo):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        f.write(conteudo)
+    os.replace(tmp_path, caminho)
+
+
+def _dias(datas) -> np.ndarray:
+    """Dias desde 1970-01-01 (a mesma base de tempo das sazonalidades do Prophet)"""
+    return (np.asarray(datas, dtype='datetime64[D]') - EPOCH).astype(float)
+
+
+# ----------------------------------------------------------------------
+# Ajuste (processos filhos)
+# ----------------------------------------------------------------------
+
+def ajustar_segmento(tarefa):
+    """Ajusta um Prophet para uma série e devolve seus parâmetros compactos"""
+    user_id, categoria, ds, y = tarefa
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    from prophet import Prophet
+
+    # Série contínua: dias sem lançamento são gasto zero
+    dias = pd.date_range(ds.min(), ds.max(), freq='D')
+    serie = pd.Series(y, index=pd.DatetimeIndex(ds)).reindex(dias, fill_value=0.0)
+    df = pd.DataFrame({'ds': serie.index, 'y': serie.to_numpy()})
+
+    try:
+        modelo = Prophet(
+            yearly_seasonality=len(df) >= 365,
+            weekly_seasonality=True,
+            daily_seasonality=False
+        )
+        modelo.fit(df)
+    except Exception as e:
+        return user_id, categoria, {"error": str(e)}
+
+    params = modelo.params
+    return user_id, categoria, {
+        "start": float(_dias([modelo.start])[0]),
+        "t_scale": modelo.t_scale.total_seconds() / 86400.0,
+        "y_scale": float(modelo.y_scale),
+        "k": float(params['k'][0][0]),
+        "m": float(params['m'][0][0]),
+        "sigma_obs": float(params['sigma_obs'][0][0]),
+        "changepoints_t": np.round(modelo.changepoints_t, 6).tolist(),
+        "delta": np.round(params['delta'][0], 8).tolist(),
+        "beta": np.round(params['beta'][0], 8).tolist(),
+        "seasonalities": [
+            [nome, s['period'], s['fourier_order']]
+            for nome, s in modelo.seasonalities.items()
+        ],
+        "ultimo_dia": str(dias[-1].date()),
+        "dias": len(df),
+    }
+
+
+# ----------------------------------------------------------------------
+# Previsão a partir dos parâmetros
+# ----------------------------------------------------------------------
+
+def prever_parametros(params, datas) -> pd.DataFrame:
+    """Reconstrói yhat do Prophet (modo aditivo, tendência linear) para as datas"""
+    dias = _dias(datas)
+    t = (dias - params["start"]) / params["t_scale"]
+
+    # Tendência linear por partes: cada changepoint já passado soma seu delta
+    changepoints_t = np.asarray(params["changepoints_t"])
+    delta = np.asarray(params["delta"])
+    ativo = t[:, None] >= changepoints_t[None, :]
+    k = params["k"] + ativo @ delta
+    m = params["m"] + ativo @ (-changepoints_t * delta)
+    tendencia = k * t + m
+
+    # Séries de Fourier na mesma ordem do Prophet: sin(1), cos(1), sin(2), ...
+    colunas = []
+    for _, periodo, ordem in params["seasonalities"]:
+        for i in range(1, ordem + 1):
+            angulo = 2.0 * np.pi * i * dias / periodo
+            colunas.extend([np.sin(angulo), np.cos(angulo)])
+    sazonal = np.column_stack(colunas) @ np.asarray(params["beta"]) if colunas else 0.0
+
+    yhat = params["y_scale"] * (tendencia + sazonal)
+    # Intervalo só com o ruído observado (sem a incerteza de tendência amostrada)
+    margem = Z_80 * params["sigma_obs"] * params["y_scale"]
+    return pd.DataFrame({
+        'ds': pd.DatetimeIndex(datas),
+        'yhat': yhat,
+        'yhat_lower': yhat - margem,
+        'yhat_upper': yhat + margem,
+    })
+
+
+class PrevisaoSegmentada:
+    """Job de ajuste em lote + consultas por usuário a partir do store de parâmetros"""
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._cache = {}  # user_id -> (mtime, parâmetros)
+        os.makedirs(SEGMENTOS_DIR, exist_ok=True)
+
+    def _caminho(self, user_id):
+        return os.path.join(SEGMENTOS_DIR, f"user_{user_id}.json")
+
+    # ------------------------------------------------------------------
+    # Lock e status compartilhados entre workers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _adquirir_lock():
+        """Arquivo de lock com flock exclusivo, ou None se outro job estiver rodando"""
+        lock = open(LOCK_PATH, "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    @staticmethod
+    def _liberar_lock(lock):
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+    def status(self):
+        """Job em execução (em qualquer worker) e resultado da última execução"""
+        lock = self._adquirir_lock()
+        if lock is not None:
+            self._liberar_lock(lock)
+        ultimo = None
+        if os.path.exists(STATUS_PATH):
+            with open(STATUS_PATH) as f:
+                ultimo = json.load(f)
+        return {"running": lock is None, "last_run": ultimo}
+
+    def _carregar_series(self):
+        desde = date.today() - timedelta(days=HISTORICO_DIAS)
+        dados = pd.read_sql(SERIES_QUERY, self.engine, params={"desde": desde}, parse_dates=['ds'])
+        tarefas = []
+        for (user_id, categoria), grupo in dados.groupby(['user_id', 'categoria'], sort=False):
+            if len(grupo) < MIN_DIAS_COM_GASTO:
+                continue
+            tarefas.append((int(user_id), categoria, grupo['ds'].to_numpy(), grupo['y'].to_numpy(dtype=float)))
+        return tarefas
+
+    def treinar(self, lock=None):
+        """Ajusta todas as séries (usuário, categoria) no pool e grava um JSON por usuário
+
+        Usuários cujas séries não se qualificam mais (ou cujo ajuste falhou)
+        têm o arquivo removido, para não servir parâmetros de versões antigas.
+        """
+        inicio = time.perf_counter()
+        lock = lock or self._adquirir_lock()
+        if lock is None:
+            raise RuntimeError("Job de previsões segmentadas já em execução")
+        try:
+            tarefas = self._carregar_series()
+            por_usuario, erros = {}, 0
+            # spawn: o job roda dentro de um worker gunicorn com threads
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=FANOUT_WORKERS, mp_context=contexto) as pool:
+                for user_id, categoria, params in pool.map(ajustar_segmento, tarefas, chunksize=8):
+                    if "error" in params:
+                        erros += 1
+                        continue
+                    por_usuario.setdefault(user_id, {})[categoria] = params
+
+            versao = datetime.now().isoformat()
+            for user_id, categorias in por_usuario.items():
+                _escrita_atomica(self._caminho(user_id), json.dumps({"version": versao, "categorias": categorias}))
+
+            atuais = {self._caminho(user_id) for user_id in por_usuario}
+            removidos = 0
+            for caminho in glob.glob(os.path.join(SEGMENTOS_DIR, "user_*.json")):
+                if caminho not in atuais:
+                    os.remove(caminho)
+                    removidos += 1
+
+            resultado = {
+                "series": len(tarefas),
+                "usuarios": len(por_usuario),
+                "removidos": removidos,
+                "erros": erros,
+                "segundos": round(time.perf_counter() - inicio, 2),
+            }
+            _escrita_atomica(STATUS_PATH, json.dumps({"finished_at": versao, **resultado}))
+            return resultado
+        finally:
+            self._liberar_lock(lock)
+
+    def treinar_em_segundo_plano(self) -> bool:
+        """Dispara o job numa thread; False se já houver um em execução em qualquer worker"""
+        # O lock é tomado aqui, antes da thread: duas requisições não passam juntas
+        lock = self._adquirir_lock()
+        if lock is None:
+            return False
+        threading.Thread(target=self._treinar_logando, args=(lock,), daemon=True).start()
+        return True
+
+    def _treinar_logando(self, lock):
+        try:
+            logger.info(f"Previsões segmentadas: {self.treinar(lock)}")
+        except Exception as e:
+            logger.error(f"Erro no job de previsões segmentadas: {e}")
+
+    def _parametros(self, user_id):
+        caminho = self._caminho(user_id)
+        try:
+            mtime = os.path.getmtime(caminho)
+            entrada = self._cache.get(user_id)
+            if entrada is None or entrada[0] != mtime:
+                with open(caminho) as f:
+                    entrada = (mtime, json.load(f))
+                self._cache[user_id] = entrada
+        except FileNotFoundError:
+            # Nunca treinado, ou removido pelo último job
+            self._cache.pop(user_id, None)
+            return None
+        return entrada[1]
+
+    def prever_usuario(self, user_id, periodos=30, categoria=None):
+        """Previsão diária dos próximos `periodos` dias por categoria, sem ajustar modelos"""
+        if periodos <= 0:
+            raise ValueError("periodos deve ser maior que zero")
+        dados = self._parametros(user_id)
+        if dados is None:
+            return None
+
+        categorias = dados["categorias"]
+        if categoria is not None:
+            categorias = {categoria: categorias[categoria]} if categoria in categorias else {}
+
+        datas = pd.date_range(date.today() + timedelta(days=1), periods=periodos, freq='D')
+        previsoes = {}
+        total = np.zeros(periodos)
+        for nome, params in categorias.items():
+            forecast = prever_parametros(params, datas)
+            # Gasto não é negativo
+            forecast[['yhat', 'yhat_lower', 'yhat_upper']] = forecast[['yhat', 'yhat_lower', 'yhat_upper']].clip(lower=0)
+            total += forecast['yhat'].to_numpy()
+            previsoes[nome] = forecast.assign(ds=forecast['ds'].dt.strftime('%Y-%m-%d')).to_dict(orient='records')
+
+        return {
+            "user_id": user_id,
+            "version": dados["version"],
+            "periodos": periodos,
+            "total_previsto": round(float(total.sum()), 2),
+            "categorias": previsoes,
+        }
+
+
+if __name__ == '__main__':
+    from sqlalchemy import create_engine
+
+    logging.basicConfig(level=logging.INFO)
+    engine = create_engine(os.getenv("DATABASE_URL", "postgresql://biuai:biuai123@db:5432/biuai"))
+    print(PrevisaoSegmentada(engine).treinar())
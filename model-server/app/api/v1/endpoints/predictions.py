@@ -1,12 +1,13 @@
+import json
 from typing import Any
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 import pandas as pd
 
-from app.schemas.prediction import PredictionInput, PredictionOutput
-from app.services.prediction import PredictionService
+from app.schemas.prediction import BatchPredictionInput, PredictionInput, PredictionOutput
+from app.services.prediction import prediction_service
 
 router = APIRouter()
-prediction_service = PredictionService()
 
 @router.post("/", response_model=PredictionOutput)
 async def predict(
@@ -21,7 +22,29 @@ async def predict(
         user_id=input_data.user_id,
         start_date=input_data.start_date,
         end_date=input_data.end_date,
-        categories=input_data.categories
+        categories=input_data.categories,
+        explain=input_data.explain
     )
     
-    return predictions 
\ No newline at end of file
+    return predictions
+
+
+@router.post("/batch")
+def predict_batch(
+    *,
+    input_data: BatchPredictionInput
+) -> Any:
+    """
+    Predict many (user, date range, categories) requests in one call.
+
+    Results are streamed as NDJSON, one line per request in input order.
+    """
+    if prediction_service.store.current() is None:
+        raise HTTPException(status_code=503, detail="No model loaded. Please train a model first.")
+
+    # Sync generator: Starlette iterates it in the threadpool, off the event loop
+    lines = (
+        json.dumps(result) + "\n"
+        for result in prediction_service.predict_batch(input_data.requests)
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
@@ -1,12 +1,14 @@
+import asyncio
+import time
 from typing import Any
 from fastapi import APIRouter, HTTPException
 import pandas as pd
 
 from app.schemas.prediction import TrainingInput, TrainingOutput
-from app.services.prediction import PredictionService
+from app.services.prediction import prediction_service
+from app.services.training_data import load_training_data
 
 router = APIRouter()
-prediction_service = PredictionService()
 
 @router.post("/", response_model=TrainingOutput)
 async def train_model(
@@ -15,10 +17,21 @@ async def train_model(
 ) -> Any:
     """
     Train a new model using historical data.
+
+    The data comes either inline (``data``) or from a server-side ``source``:
+    a Parquet file or the lançamentos table read with a streamed cursor.
     """
     try:
-        # Convert input data to DataFrame
-        df = pd.DataFrame(input_data.data)
+        load_start = time.perf_counter()
+        if input_data.source is not None:
+            try:
+                df = await asyncio.to_thread(load_training_data, input_data.source)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            # Convert input data to DataFrame
+            df = pd.DataFrame(input_data.data)
+        load_time = time.perf_counter() - load_start
         
         # Validate required columns
         required_columns = ['data', 'valor', 'categoria', 'tipo']
@@ -32,10 +45,13 @@ async def train_model(
         # Train model
         training_result = await prediction_service.train_model(
             df=df,
-            model_params=input_data.model_params
+            model_params=input_data.model_params,
+            timings={'load': load_time}
         )
         
         return training_result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -8,6 +8,23 @@ class Settings(BaseSettings):
     
     # Model paths
     MODEL_PATH: str = "/app/models"
+    # Seconds between manifest checks for models trained by another worker
+    MODEL_RELOAD_INTERVAL: int = 10
+
+    # Training rows sampled to precompute the global SHAP importance
+    SHAP_SAMPLE_SIZE: int = 1000
+
+    # Batch predictions: max requests per call and requests scored per model call
+    BATCH_MAX_REQUESTS: int = 10000
+    BATCH_CHUNK_SIZE: int = 500
+
+    # Training: server-side sources and XGBoost settings
+    TRAINING_DATA_DIR: str = "/app/data"
+    TRAINING_DATABASE_URL: str = ""
+    TRAINING_CHUNK_SIZE: int = 50000
+    TRAINING_N_JOBS: int = -1
+    TRAINING_MAX_ESTIMATORS: int = 1000
+    TRAINING_EARLY_STOPPING_ROUNDS: int = 20
     
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
@@ -1,12 +1,16 @@
 from datetime import date
-from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+
+from app.core.config import settings
 
 class PredictionInput(BaseModel):
     user_id: int
     start_date: date
     end_date: date
     categories: List[str] = None
+    # Per-request SHAP values; otherwise the importance precomputed at training is returned
+    explain: bool = False
 
 class PredictionOutput(BaseModel):
     predictions: Dict[str, float]
@@ -14,12 +18,36 @@ class PredictionOutput(BaseModel):
     feature_importance: Dict[str, float]
     model_version: str
 
+class BatchPredictionInput(BaseModel):
+    requests: List[PredictionInput] = Field(..., min_length=1, max_length=settings.BATCH_MAX_REQUESTS)
+
+class TrainingSource(BaseModel):
+    # "parquet": file relative to TRAINING_DATA_DIR; "sql": lançamentos streamed from the database
+    type: Literal['parquet', 'sql']
+    path: Optional[str] = None
+    since: Optional[date] = None
+
+    @model_validator(mode='after')
+    def check_path(self):
+        if self.type == 'parquet' and not self.path:
+            raise ValueError("path is required for parquet sources")
+        return self
+
 class TrainingInput(BaseModel):
-    data: List[Dict[str, Any]]
+    data: Optional[List[Dict[str, Any]]] = None
+    source: Optional[TrainingSource] = None
     model_params: Dict[str, Any] = None
 
+    @model_validator(mode='after')
+    def check_data_or_source(self):
+        if (self.data is None) == (self.source is None):
+            raise ValueError("Provide either data or source")
+        return self
+
 class TrainingOutput(BaseModel):
     model_version: str
     metrics: Dict[str, float]
     training_time: float
-    feature_importance: Dict[str, float] 
\ No newline at end of file
+    feature_importance: Dict[str, float]
+    # Seconds spent in each phase (load, preprocess, fit, evaluate, importance, publish)
+    timings: Dict[str, float] = {} 
\ No newline at end of file
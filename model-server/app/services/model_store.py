@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import joblib
+
+from app.core.config import settings
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ModelStore:
+    """Process-wide holder of the current model, indexed by a manifest.
+
+    Every trained model is written as a new versioned artifact and the
+    manifest's ``current`` entry is switched atomically (temp file +
+    os.replace). Readers take a single reference to the loaded snapshot, so
+    swapping models never exposes a half-updated state. A background task
+    watches the manifest, letting every uvicorn worker pick up models
+    trained by another worker.
+    """
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._manifest_mtime: float = 0.0
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.model_path, MANIFEST_NAME)
+
+    def read_manifest(self) -> Dict[str, Any]:
+        """Read the version index, building it from legacy artifacts if missing."""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+
+        # Artifacts saved before the manifest existed: newest by mtime, not by name
+        legacy = [f for f in os.listdir(self.model_path) if f.endswith('.joblib')] if os.path.isdir(self.model_path) else []
+        legacy.sort(key=lambda f: os.path.getmtime(os.path.join(self.model_path, f)))
+        return {
+            "current": legacy[-1] if legacy else None,
+            "versions": {f: {} for f in legacy}
+        }
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.model_path, prefix=".manifest-", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(tmp_path, self.manifest_path)
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        """Snapshot of the loaded model: {'version', 'model', 'label_encoders', 'feature_names', ...}."""
+        return self._snapshot
+
+    def load_current(self) -> bool:
+        """Load the version marked as current. Returns True if a new version was swapped in."""
+        manifest = self.read_manifest()
+        version = manifest.get("current")
+        if not version:
+            return False
+        if self._snapshot is not None and self._snapshot["version"] == version:
+            return False
+
+        # Uncompressed artifacts: numpy buffers are memory mapped and their
+        # pages shared between the uvicorn workers instead of copied per process
+        model_data = joblib.load(os.path.join(self.model_path, version), mmap_mode='r')
+        self._snapshot = {**model_data, "version": version}
+        if os.path.exists(self.manifest_path):
+            self._manifest_mtime = os.path.getmtime(self.manifest_path)
+        return True
+
+    def publish(self, model_data: Dict[str, Any], metrics: Optional[Dict[str, Any]] = None) -> str:
+        """Persist a new version, promote it in the manifest and swap it in memory."""
+        os.makedirs(self.model_path, exist_ok=True)
+        version = f"model_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.joblib"
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.model_path, prefix=".artifact-", suffix=".tmp")
+        os.close(fd)
+        joblib.dump(model_data, tmp_path, compress=0)
+        os.replace(tmp_path, os.path.join(self.model_path, version))
+
+        manifest = self.read_manifest()
+        manifest["versions"][version] = {
+            "created_at": datetime.now().isoformat(),
+            "metrics": metrics or {}
+        }
+        manifest["current"] = version
+        self._write_manifest(manifest)
+
+        self._snapshot = {**model_data, "version": version}
+        self._manifest_mtime = os.path.getmtime(self.manifest_path)
+        return version
+
+    async def refresh(self) -> bool:
+        """Reload if the manifest changed on disk (e.g. a model trained by another worker)."""
+        if not os.path.exists(self.manifest_path):
+            return False
+        if os.path.getmtime(self.manifest_path) <= self._manifest_mtime:
+            return False
+        return await asyncio.to_thread(self.load_current)
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(settings.MODEL_RELOAD_INTERVAL)
+            try:
+                if await self.refresh():
+                    print(f"Model reloaded: {self._snapshot['version']}")
+            except Exception as e:
+                print(f"Error reloading model: {e}")
+
+    def start_watcher(self) -> None:
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop_watcher(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+
+model_store = ModelStore(settings.MODEL_PATH)
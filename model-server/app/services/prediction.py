@@ -1,51 +1,137 @@
+import asyncio
+import threading
+import time
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import joblib
-import os
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Sequence, Tuple
 import xgboost as xgb
 import lightgbm as lgb
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-import shap
 
 from app.core.config import settings
 
+from app.services.model_store import model_store
+
 class PredictionService:
     def __init__(self):
-        self.model_path = settings.MODEL_PATH
-        self.model = None
-        self.label_encoders = {}
-        self.feature_names = None
-        self.load_model()
-
-    def load_model(self) -> None:
-        """Load the latest model and encoders from disk."""
+        self.store = model_store
+        # SHAP explainers keyed by model version (only the served version is kept)
+        self._explainers: Dict[str, object] = {}
+        self._explainer_lock = threading.Lock()
+        # Label encoder lookup indexes keyed by model version
+        self._encoder_lookups: Dict[str, Dict[str, pd.Index]] = {}
+
+    def load_model(self) -> bool:
+        """Load the model marked as current in the manifest."""
         try:
-            model_files = [f for f in os.listdir(self.model_path) if f.endswith('.joblib')]
-            if not model_files:
-                return
-            
-            latest_model = sorted(model_files)[-1]
-            model_data = joblib.load(os.path.join(self.model_path, latest_model))
-            
-            self.model = model_data['model']
-            self.label_encoders = model_data.get('label_encoders', {})
-            self.feature_names = model_data.get('feature_names', None)
+            return self.store.load_current()
         except Exception as e:
             print(f"Error loading model: {e}")
+            return False
+
+    @staticmethod
+    def _build_explainer(model):
+        import shap
+
+        return shap.TreeExplainer(model)
+
+    @staticmethod
+    def _mean_abs_shap(explainer, feature_names: List[str], X: pd.DataFrame) -> Dict[str, float]:
+        shap_values = explainer.shap_values(X)
+        return {name: float(value) for name, value in zip(feature_names, np.abs(shap_values).mean(0))}
+
+    def get_explainer(self, snapshot: Dict):
+        """Return the TreeExplainer of a model version, building it once."""
+        version = snapshot['version']
+        with self._explainer_lock:
+            explainer = self._explainers.get(version)
+            if explainer is None:
+                explainer = self._build_explainer(snapshot['model'])
+                self._explainers = {version: explainer}
+            return explainer
+
+    def explain(self, snapshot: Dict, X: pd.DataFrame) -> Dict[str, float]:
+        """Per-request SHAP importance for the given rows (CPU bound, run off the event loop)."""
+        return self._mean_abs_shap(self.get_explainer(snapshot), snapshot['feature_names'], X)
+
+    def _training_importance(self, model, feature_names: List[str], X: pd.DataFrame):
+        """Explainer plus mean |SHAP| over a sample of the training data."""
+        if len(X) > settings.SHAP_SAMPLE_SIZE:
+            X = X.sample(settings.SHAP_SAMPLE_SIZE, random_state=42)
+        explainer = self._build_explainer(model)
+        return explainer, self._mean_abs_shap(explainer, feature_names, X)
+
+    @staticmethod
+    def global_importance(snapshot: Dict) -> Dict[str, float]:
+        """Importance precomputed at training (gain importance for older artifacts)."""
+        if snapshot.get('global_importance'):
+            return snapshot['global_importance']
+        return {
+            name: float(value)
+            for name, value in zip(snapshot['feature_names'], snapshot['model'].feature_importances_)
+        }
 
-    def save_model(self, model_data: Dict) -> str:
-        """Save model and related data to disk."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"model_{timestamp}.joblib"
-        filepath = os.path.join(self.model_path, filename)
+    def get_encoder_lookups(self, snapshot: Dict) -> Dict[str, pd.Index]:
+        """Label encoder classes as hashed indexes, built once per model version."""
+        version = snapshot['version']
+        lookups = self._encoder_lookups.get(version)
+        if lookups is None:
+            lookups = {
+                col: pd.Index(encoder.classes_)
+                for col, encoder in snapshot['label_encoders'].items()
+            }
+            self._encoder_lookups = {version: lookups}
+        return lookups
+
+    @staticmethod
+    def encode(lookup: pd.Index, col: str, values) -> np.ndarray:
+        """Vectorized LabelEncoder.transform using the precomputed lookup."""
+        codes = lookup.get_indexer(values)
+        if (codes < 0).any():
+            unknown = sorted(set(np.asarray(values)[codes < 0]))
+            raise ValueError(f"Unknown values for '{col}': {unknown}")
+        return codes
+
+    def build_scenario_frame(
+        self,
+        snapshot: Dict,
+        start_date: datetime,
+        end_date: datetime,
+        categories: List[str],
+        tipo: str = 'despesa'
+    ) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        """Feature matrix for every (date, category) pair of the scenario.
+
+        The grid is a cross join built with ``pd.MultiIndex.from_product``;
+        date features and encoded categories are computed once per distinct
+        value and broadcast through the index codes. Returns the feature
+        frame, the category code of each row and the category names.
+        """
+        lookups = self.get_encoder_lookups(snapshot)
+        dates = pd.date_range(start=start_date, end=end_date, freq='D')
+        category_names = pd.Index(categories).unique()
+        grid = pd.MultiIndex.from_product([dates, category_names], names=['data', 'categoria'])
+        date_codes, category_codes = grid.codes
         
-        joblib.dump(model_data, filepath)
-        return filename
+        columns = {
+            'month': dates.month.to_numpy()[date_codes],
+            'day_of_week': dates.dayofweek.to_numpy()[date_codes],
+            'day_of_month': dates.day.to_numpy()[date_codes],
+            'categoria': self.encode(lookups['categoria'], 'categoria', category_names)[category_codes],
+            'tipo': np.full(len(grid), self.encode(lookups['tipo'], 'tipo', [tipo])[0]),
+        }
+        X = pd.DataFrame({name: columns[name] for name in snapshot['feature_names']})
+        return X, np.asarray(category_codes), category_names.to_numpy()
 
-    def preprocess_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, LabelEncoder]]:
+    def preprocess_data(
+        self,
+        df: pd.DataFrame,
+        label_encoders: Dict[str, LabelEncoder],
+        fit: bool = False
+    ) -> pd.DataFrame:
         """Preprocess the input data for training or prediction."""
         # Create temporal features
         df['month'] = df['data'].dt.month
@@ -55,24 +141,46 @@ class PredictionService:
         # Encode categorical variables
         categorical_columns = ['categoria', 'tipo']
         for col in categorical_columns:
-            if col not in self.label_encoders:
-                self.label_encoders[col] = LabelEncoder()
-                df[col] = self.label_encoders[col].fit_transform(df[col])
+            if fit:
+                label_encoders[col] = LabelEncoder()
+                df[col] = label_encoders[col].fit_transform(df[col])
             else:
-                df[col] = self.label_encoders[col].transform(df[col])
+                df[col] = label_encoders[col].transform(df[col])
         
         return df
 
+    @staticmethod
+    def _fit_model(X_train, y_train, X_test, y_test, model_params: Dict):
+        """Fit XGBoost with early stopping on the held-out split."""
+        model = xgb.XGBRegressor(**model_params)
+        model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+        return model
+
     async def train_model(
         self,
         df: pd.DataFrame,
-        model_params: Dict = None
+        model_params: Dict = None,
+        timings: Dict[str, float] = None
     ) -> Dict:
-        """Train a new model on the provided data."""
-        start_time = datetime.now()
+        """Train a new model on the provided data.
+
+        Uses the histogram tree method on all configured threads and stops
+        adding trees once the held-out split stops improving. ``timings``
+        collects the seconds spent in each phase (callers may pre-fill
+        phases that happen before, e.g. ``load``).
+        """
+        timings = dict(timings or {})
+        start = time.perf_counter()
+        
+        def mark(phase: str) -> None:
+            nonlocal start
+            now = time.perf_counter()
+            timings[phase] = round(now - start, 4)
+            start = now
         
-        # Preprocess data
-        df = self.preprocess_data(df)
+        # Preprocess data (fresh encoders: the served model keeps its own)
+        label_encoders = {}
+        df = self.preprocess_data(df, label_encoders, fit=True)
         
         # Prepare features and target
         features = ['month', 'day_of_week', 'day_of_month', 'categoria', 'tipo']
@@ -81,49 +189,61 @@ class PredictionService:
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        mark('preprocess')
         
         # Train model
-        if model_params is None:
-            model_params = {
-                'objective': 'reg:squarederror',
-                'max_depth': 6,
-                'learning_rate': 0.1,
-                'n_estimators': 100
-            }
+        params = {
+            'objective': 'reg:squarederror',
+            'max_depth': 6,
+            'learning_rate': 0.1,
+            'n_estimators': settings.TRAINING_MAX_ESTIMATORS,
+            'tree_method': 'hist',
+            'n_jobs': settings.TRAINING_N_JOBS,
+            'early_stopping_rounds': settings.TRAINING_EARLY_STOPPING_ROUNDS
+        }
+        params.update(model_params or {})
         
-        model = xgb.XGBRegressor(**model_params)
-        model.fit(X_train, y_train)
+        model = await asyncio.to_thread(self._fit_model, X_train, y_train, X_test, y_test, params)
+        mark('fit')
         
         # Calculate metrics
         train_score = model.score(X_train, y_train)
         test_score = model.score(X_test, y_test)
+        metrics = {
+            'train_score': train_score,
+            'test_score': test_score,
+            'n_samples': float(len(df))
+        }
+        if getattr(model, 'best_iteration', None) is not None:
+            metrics['best_iteration'] = float(model.best_iteration)
+        mark('evaluate')
         
-        # Calculate feature importance
-        feature_importance = dict(zip(features, model.feature_importances_))
-        
-        # Save model
         model_data = {
             'model': model,
-            'label_encoders': self.label_encoders,
+            'label_encoders': label_encoders,
             'feature_names': features,
             'training_date': datetime.now().isoformat()
         }
-        model_version = self.save_model(model_data)
         
-        # Update current model
-        self.model = model
-        self.feature_names = features
+        # Global feature importance is computed once here, not on every prediction
+        explainer, feature_importance = await asyncio.to_thread(
+            self._training_importance, model, features, X_train
+        )
+        model_data['global_importance'] = feature_importance
+        mark('importance')
         
-        training_time = (datetime.now() - start_time).total_seconds()
+        # Publish the new version and swap it in for every request from now on
+        model_version = self.store.publish(model_data, metrics=metrics)
+        with self._explainer_lock:
+            self._explainers = {model_version: explainer}
+        mark('publish')
         
         return {
             'model_version': model_version,
-            'metrics': {
-                'train_score': train_score,
-                'test_score': test_score
-            },
-            'training_time': training_time,
-            'feature_importance': feature_importance
+            'metrics': metrics,
+            'training_time': round(sum(timings.values()), 4),
+            'feature_importance': feature_importance,
+            'timings': timings
         }
 
     async def predict(
@@ -131,63 +251,109 @@ class PredictionService:
         user_id: int,
         start_date: datetime,
         end_date: datetime,
-        categories: List[str] = None
+        categories: List[str] = None,
+        explain: bool = False
     ) -> Dict:
-        """Make predictions using the trained model."""
-        if self.model is None:
+        """Make predictions using the trained model.
+
+        Feature importance is the global one precomputed at training time;
+        per-request SHAP values are only computed when ``explain`` is set.
+        """
+        # One snapshot per request: a concurrent swap never mixes model and encoders
+        snapshot = self.store.current()
+        if snapshot is None:
             raise ValueError("No model loaded. Please train a model first.")
+        model = snapshot['model']
         
-        # Generate sample data for prediction
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        sample_data = []
-        
-        for date in dates:
-            if categories:
-                for cat in categories:
-                    sample_data.append({
-                        'data': date,
-                        'categoria': cat,
-                        'tipo': 'despesa',  # Default type
-                        'valor': 0  # Will be predicted
-                    })
-            else:
-                sample_data.append({
-                    'data': date,
-                    'categoria': 'outros',  # Default category
-                    'tipo': 'despesa',  # Default type
-                    'valor': 0  # Will be predicted
-                })
-        
-        df = pd.DataFrame(sample_data)
-        
-        # Preprocess data
-        df = self.preprocess_data(df)
+        X, category_codes, category_names = self.build_scenario_frame(
+            snapshot, start_date, end_date, categories or ['outros']
+        )
         
         # Make predictions
-        predictions = self.model.predict(df[self.feature_names])
+        predictions = model.predict(X)
         
         # Calculate confidence scores (using prediction std as proxy)
-        if hasattr(self.model, 'predict_proba'):
-            confidence = self.model.predict_proba(df[self.feature_names])
+        if hasattr(model, 'predict_proba'):
+            confidence = model.predict_proba(X).max(axis=1)
         else:
             confidence = np.ones_like(predictions)  # Default confidence of 1
         
-        # Calculate feature importance using SHAP
-        explainer = shap.TreeExplainer(self.model)
-        shap_values = explainer.shap_values(df[self.feature_names])
-        feature_importance = dict(zip(self.feature_names, np.abs(shap_values).mean(0)))
+        if explain:
+            feature_importance = await asyncio.to_thread(self.explain, snapshot, X)
+        else:
+            feature_importance = self.global_importance(snapshot)
         
-        # Group predictions by category
-        results = {}
-        confidence_by_category = {}
-        for cat in df['categoria'].unique():
-            mask = df['categoria'] == cat
-            results[cat] = float(predictions[mask].mean())  # Convert to float for JSON serialization
-            confidence_by_category[cat] = float(confidence[mask].mean())  # Convert to float for JSON serialization
+        # Group predictions by category in a single pass
+        grouped = pd.DataFrame(
+            {'prediction': predictions, 'confidence': confidence}
+        ).groupby(category_codes).mean()
+        names = category_names[grouped.index.to_numpy()]
         
         return {
-            'predictions': results,
-            'confidence': confidence_by_category,
+            'predictions': dict(zip(names, grouped['prediction'].astype(float))),
+            'confidence': dict(zip(names, grouped['confidence'].astype(float))),
             'feature_importance': feature_importance,
-            'model_version': os.path.basename(self.model_path)
-        } 
\ No newline at end of file
+            'model_version': snapshot['version']
+        } 
+
+    def predict_batch(self, requests: Sequence) -> Iterator[Dict]:
+        """Predict many (user, date range, categories) requests, yielding one result per request.
+
+        Requests are evaluated in chunks of ``BATCH_CHUNK_SIZE``: the scenario
+        grids of a chunk are concatenated, scored with a single model call and
+        aggregated with one groupby over (request, category). Results are
+        yielded as soon as their chunk is done, so callers can stream them.
+        A request with unknown labels yields an ``error`` entry instead of
+        failing the whole batch.
+        """
+        snapshot = self.store.current()
+        if snapshot is None:
+            raise ValueError("No model loaded. Please train a model first.")
+        model = snapshot['model']
+        version = snapshot['version']
+        chunk_size = settings.BATCH_CHUNK_SIZE
+
+        for chunk_start in range(0, len(requests), chunk_size):
+            chunk = requests[chunk_start:chunk_start + chunk_size]
+            frames, request_codes, category_codes, names = [], [], [], {}
+            errors = {}
+
+            for offset, request in enumerate(chunk):
+                try:
+                    X, codes, category_names = self.build_scenario_frame(
+                        snapshot, request.start_date, request.end_date, request.categories or ['outros']
+                    )
+                except ValueError as e:
+                    errors[offset] = str(e)
+                    continue
+                frames.append(X)
+                request_codes.append(np.full(len(X), offset))
+                category_codes.append(codes)
+                names[offset] = category_names
+
+            grouped = None
+            if frames:
+                X = pd.concat(frames, ignore_index=True)
+                predictions = model.predict(X)
+                if hasattr(model, 'predict_proba'):
+                    confidence = model.predict_proba(X).max(axis=1)
+                else:
+                    confidence = np.ones_like(predictions)
+                grouped = pd.DataFrame(
+                    {'prediction': predictions, 'confidence': confidence}
+                ).groupby([np.concatenate(request_codes), np.concatenate(category_codes)]).mean()
+
+            for offset, request in enumerate(chunk):
+                result = {'index': chunk_start + offset, 'user_id': request.user_id, 'model_version': version}
+                if offset in errors:
+                    result['error'] = errors[offset]
+                else:
+                    per_category = grouped.loc[offset]
+                    category_names = names[offset][per_category.index.to_numpy()]
+                    result['predictions'] = dict(zip(category_names, per_category['prediction'].astype(float)))
+                    result['confidence'] = dict(zip(category_names, per_category['confidence'].astype(float)))
+                yield result
+
+
+# Single process-wide instance shared by the prediction and training endpoints
+prediction_service = PredictionService()
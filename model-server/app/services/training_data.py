@@ -0,0 +1,87 @@
+import os
+from datetime import date
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+
+TRAINING_COLUMNS = ['data', 'valor', 'categoria', 'tipo']
+
+# Server-side query used by the "sql" source: one row per lançamento
+TRAINING_QUERY = """
+    SELECT l.data_lancamento AS data,
+           l.valor AS valor,
+           COALESCE(c.nome, 'outros') AS categoria,
+           LOWER(CAST(l.tipo AS TEXT)) AS tipo
+    FROM lancamentos l
+    LEFT JOIN categorias c ON c.id = l.categoria_id
+    WHERE l.data_lancamento >= :since
+"""
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast a chunk: categorical labels and float32 amounts."""
+    return df.assign(
+        data=pd.to_datetime(df['data']),
+        valor=pd.to_numeric(df['valor'], downcast='float'),
+        categoria=df['categoria'].astype('category'),
+        tipo=df['tipo'].astype('category'),
+    )
+
+
+def _concat_chunks(chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+    frames = [_compact(chunk) for chunk in chunks]
+    if not frames:
+        return pd.DataFrame(columns=TRAINING_COLUMNS)
+    # Chunks with different label sets concat as object: re-encode once at the end
+    df = pd.concat(frames, ignore_index=True)
+    for col in ('categoria', 'tipo'):
+        df[col] = df[col].astype('category')
+    return df
+
+
+def load_parquet(path: str) -> pd.DataFrame:
+    """Read the training columns of a Parquet file under TRAINING_DATA_DIR."""
+    root = os.path.realpath(settings.TRAINING_DATA_DIR)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root:
+        raise ValueError(f"Parquet path must be inside {settings.TRAINING_DATA_DIR}")
+    if not os.path.exists(full_path):
+        raise ValueError(f"Parquet file not found: {path}")
+
+    import pyarrow.parquet as pq
+
+    # Row group by row group: only one decoded batch is held besides the result
+    parquet_file = pq.ParquetFile(full_path)
+    return _concat_chunks(
+        batch.to_pandas()
+        for batch in parquet_file.iter_batches(batch_size=settings.TRAINING_CHUNK_SIZE, columns=TRAINING_COLUMNS)
+    )
+
+
+def load_sql(since: Optional[date] = None) -> pd.DataFrame:
+    """Stream the lançamentos from TRAINING_DATABASE_URL with a server-side cursor."""
+    if not settings.TRAINING_DATABASE_URL:
+        raise ValueError("TRAINING_DATABASE_URL is not configured")
+
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(settings.TRAINING_DATABASE_URL)
+    try:
+        with engine.connect().execution_options(stream_results=True) as conn:
+            return _concat_chunks(pd.read_sql(
+                text(TRAINING_QUERY),
+                conn,
+                params={'since': since or date(1970, 1, 1)},
+                chunksize=settings.TRAINING_CHUNK_SIZE,
+            ))
+    finally:
+        engine.dispose()
+
+
+def load_training_data(source) -> pd.DataFrame:
+    """Load a TrainingSource (blocking: run it off the event loop)."""
+    if source.type == 'parquet':
+        return load_parquet(source.path)
+    return load_sql(source.since)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput das previsões do model-server (usuários/segundo)
+
+Compara a previsão usuário a usuário (PredictionService.predict, o que o job
+noturno faz hoje com uma chamada HTTP por usuário) com o caminho em lote
+(PredictionService.predict_batch, usado por POST /predictions/batch). Roda
+em processo, sem servidor: um modelo é treinado com dados sintéticos em um
+diretório temporário.
+
+Uso:
+    python scripts/benchmark_batch_predictions.py [--users 2000] [--days 30] [--categories 5]
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+MODEL_SERVER_DIR = os.path.join(os.path.dirname(__file__), '..', 'model-server')
+sys.path.append(MODEL_SERVER_DIR)
+
+# O model store lê MODEL_PATH na importação
+os.environ.setdefault("MODEL_PATH", tempfile.mkdtemp(prefix="biuai-models-"))
+
+import numpy as np
+import pandas as pd
+
+from app.services.prediction import prediction_service
+
+CATEGORIAS = ["alimentacao", "transporte", "moradia", "saude", "lazer", "educacao", "outros"]
+
+
+def dados_sinteticos(linhas: int = 5000) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    datas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, linhas), unit="D")
+    return pd.DataFrame({
+        "data": datas,
+        "categoria": rng.choice(CATEGORIAS, linhas),
+        "tipo": rng.choice(["despesa", "receita"], linhas, p=[0.8, 0.2]),
+        "valor": rng.gamma(2.0, 150.0, linhas).round(2),
+    })
+
+
+def gerar_requisicoes(usuarios: int, dias: int, categorias: int):
+    inicio = date.today()
+    return [
+        SimpleNamespace(
+            user_id=user_id,
+            start_date=inicio,
+            end_date=inicio + timedelta(days=dias - 1),
+            categories=[CATEGORIAS[(user_id + i) % len(CATEGORIAS)] for i in range(categorias)],
+        )
+        for user_id in range(1, usuarios + 1)
+    ]
+
+
+async def por_usuario(requisicoes):
+    for req in requisicoes:
+        await prediction_service.predict(req.user_id, req.start_date, req.end_date, req.categories)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--categories", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(prediction_service.train_model(dados_sinteticos()))
+    requisicoes = gerar_requisicoes(args.users, args.days, args.categories)
+    linhas = args.users * args.days * args.categories
+
+    inicio = time.perf_counter()
+    asyncio.run(por_usuario(requisicoes))
+    antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultados = list(prediction_service.predict_batch(requisicoes))
+    lote = time.perf_counter() - inicio
+
+    erros = sum(1 for r in resultados if "error" in r)
+    print(f"📊 {args.users} usuários x {args.days} dias x {args.categories} categorias ({linhas} linhas)")
+    print(f"   por usuário: {antigo:8.2f} s | {args.users / antigo:10.1f} usuários/s")
+    print(f"   em lote:     {lote:8.2f} s | {args.users / lote:10.1f} usuários/s")
+    print(f"⚡ Speedup: {antigo / lote:.1f}x" + (f" | ⚠️ {erros} requisições com erro" if erros else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Orçamento de cold start do backend (import de app.main)
+
+Mede, em um interpretador novo, o tempo de `import app.main` com
+`python -X importtime` e verifica que bibliotecas pesadas de ML (pandas,
+sklearn, scipy, nltk...) não são carregadas no startup: elas devem ser
+importadas apenas no primeiro uso das rotas de ML/importação.
+
+Sai com código 1 se o orçamento for estourado ou se algum módulo proibido
+for importado, para poder rodar no CI.
+
+Uso:
+    python scripts/benchmark_cold_start.py [--budget-ms 1500] [--repeat 3] [--top 15]
+"""
+
+import sys
+import os
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+# Módulos que não podem ser carregados por `import app.main`
+FORBIDDEN_MODULES = ("pandas", "sklearn", "scipy", "nltk", "xgboost", "lightgbm", "statsmodels", "prophet")
+
+DEFAULT_BUDGET_MS = float(os.environ.get("COLD_START_BUDGET_MS", 1500))
+
+
+def medir_import():
+    """Importa app.main em um processo novo; retorna (tempos por módulo, módulos carregados)"""
+    codigo = (
+        "import sys, json, app.main; "
+        "print(json.dumps(sorted({m.split('.')[0] for m in sys.modules})))"
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if resultado.returncode != 0:
+        sys.stderr.write(resultado.stderr[-4000:])
+        raise SystemExit("❌ import app.main falhou")
+
+    # Linhas: "import time: self [us] | cumulative | imported package"
+    tempos = {}
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        self_us, cumulativo_us, modulo = linha[len("import time:"):].split("|")
+        tempos[modulo.strip()] = (int(self_us), int(cumulativo_us))
+
+    carregados = set(json.loads(resultado.stdout.strip().splitlines()[-1]))
+    return tempos, carregados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    execucoes = [medir_import() for _ in range(args.repeat)]
+    totais_ms = [tempos["app.main"][1] / 1000 for tempos, _ in execucoes]
+    mediana_ms = statistics.median(totais_ms)
+    tempos, carregados = execucoes[-1]
+
+    print(f"📊 import app.main ({args.repeat} execuções): mediana {mediana_ms:.0f} ms | orçamento {args.budget_ms:.0f} ms")
+    print(f"\n🐢 {args.top} imports mais lentos (cumulativo, última execução):")
+    top_level = {m: t for m, t in tempos.items() if "." not in m}
+    for modulo, (_, cumulativo) in sorted(top_level.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"   {cumulativo / 1000:8.1f} ms  {modulo}")
+
+    proibidos = sorted(carregados.intersection(FORBIDDEN_MODULES))
+    falhou = False
+    if proibidos:
+        print(f"\n❌ Módulos pesados carregados no startup: {', '.join(proibidos)}")
+        falhou = True
+    if mediana_ms > args.budget_ms:
+        print(f"\n❌ Cold start acima do orçamento: {mediana_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        falhou = True
+
+    if falhou:
+        sys.exit(1)
+    print("\n✅ Cold start dentro do orçamento")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark da serialização de uma página de 1000 lançamentos
+
+Compara o caminho antigo de list_lancamentos (objetos ORM ->
+LancamentoResponse.from_orm -> jsonable_encoder -> json) com o caminho
+rápido (tuplas de colunas -> dict -> orjson). Não precisa de banco:
+as linhas são geradas em memória.
+
+Uso:
+    python scripts/benchmark_serialization.py [--rows 1000] [--repeat 50]
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+
+# Adicionar o diretório backend ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.financeiro import Lancamento, TipoLancamento
+from app.schemas.lancamento import LancamentoResponse
+from app.utils.serialization import dumps
+
+
+def gerar_linhas(quantidade: int):
+    """Gera as mesmas linhas como objetos ORM e como dicts de colunas"""
+    agora = datetime.now(timezone.utc)
+    orm_rows, column_rows = [], []
+
+    for i in range(quantidade):
+        valores = {
+            "id": i + 1,
+            "descricao": f"PIX ENVIADO - FORNECEDOR {i % 37}",
+            "valor": round(10 + (i * 7.31) % 2500, 2),
+            "tipo": TipoLancamento.DESPESA if i % 3 else TipoLancamento.RECEITA,
+            "data_lancamento": agora - timedelta(days=i % 365),
+            "categoria_id": i % 12,
+            "user_id": 1,
+            "created_at": agora,
+            "updated_at": agora,
+        }
+        orm_rows.append(Lancamento(**valores))
+        column_rows.append(dict(valores))
+
+    return orm_rows, column_rows
+
+
+def caminho_antigo(orm_rows) -> bytes:
+    response_data = [LancamentoResponse.from_orm(l) for l in orm_rows]
+    return json.dumps(jsonable_encoder(response_data)).encode()
+
+
+def caminho_rapido(column_rows) -> bytes:
+    return dumps([dict(row) for row in column_rows])
+
+
+def medir(func, arg, repeat: int):
+    func(arg)  # aquecimento
+    tempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func(arg)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), max(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    orm_rows, column_rows = gerar_linhas(args.rows)
+
+    antigo_med, antigo_max = medir(caminho_antigo, orm_rows, args.repeat)
+    rapido_med, rapido_max = medir(caminho_rapido, column_rows, args.repeat)
+
+    print(f"📊 Página de {args.rows} lançamentos ({args.repeat} execuções)")
+    print(f"   from_orm + jsonable_encoder + json: mediana {antigo_med:8.2f} ms | máx {antigo_max:8.2f} ms")
+    print(f"   colunas + dict + orjson:            mediana {rapido_med:8.2f} ms | máx {rapido_max:8.2f} ms")
+    print(f"⚡ Speedup: {antigo_med / rapido_med:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pré-processamento de descrições sobre os dados SIOG
+
+Compara o preprocess_text antigo (NLTK word_tokenize + PorterStemmer por
+linha) com o normalizador memoizado (regex pré-compilados + LRU +
+normalize_series), com cache frio e quente. A comparação com o caminho
+antigo só roda se o nltk estiver instalado (não é mais dependência do backend).
+
+Uso:
+    python scripts/benchmark_text_normalizer.py [--repeat 5] [--xlsx caminho]
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Adicionar o diretório backend ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import pandas as pd
+
+from app.utils.text_normalizer import normalize_description, normalize_series, cache_info
+
+DEFAULT_XLSX = os.path.join(
+    os.path.dirname(__file__), '..', 'backend', 'data', 'data-set-financeiro-siog.xlsx'
+)
+
+
+def carregar_descricoes(caminho: str) -> pd.Series:
+    """Descrições como chegam ao ML: complemento e cliente/fornecedor"""
+    df = pd.read_excel(caminho, usecols=['complemento', 'cliente_fornecedor'])
+    return pd.concat([df['complemento'], df['cliente_fornecedor']], ignore_index=True).dropna().astype(str)
+
+
+def criar_preprocess_antigo():
+    """Reproduz o MLFinancialAnalyzer.preprocess_text baseado em NLTK (None sem nltk)"""
+    try:
+        import nltk
+    except ImportError:
+        return None
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    from nltk.stem import PorterStemmer
+
+    nltk.download('punkt', quiet=True)
+    nltk.download('stopwords', quiet=True)
+    stemmer = PorterStemmer()
+    palavras = set(stopwords.words('portuguese') + stopwords.words('english'))
+
+    def preprocess_text(text: str) -> str:
+        if not text:
+            return ""
+        tokens = word_tokenize(text.lower())
+        return " ".join(
+            stemmer.stem(token)
+            for token in tokens
+            if token.isalpha() and token not in palavras
+        )
+
+    return preprocess_text
+
+
+def medir(func, repeat: int):
+    tempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), max(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--xlsx", default=DEFAULT_XLSX)
+    args = parser.parse_args()
+
+    descricoes = carregar_descricoes(args.xlsx)
+    preprocess_antigo = criar_preprocess_antigo()
+
+    def frio():
+        normalize_description.cache_clear()
+        normalize_series(descricoes)
+
+    frio_med, frio_max = medir(frio, args.repeat)
+    quente_med, quente_max = medir(lambda: normalize_series(descricoes), args.repeat)
+
+    print(f"📊 {len(descricoes)} descrições SIOG ({descricoes.nunique()} distintas, {args.repeat} execuções)")
+    if preprocess_antigo is not None:
+        antigo_med, antigo_max = medir(lambda: descricoes.apply(preprocess_antigo), args.repeat)
+        print(f"   NLTK por linha:          mediana {antigo_med:8.2f} ms | máx {antigo_max:8.2f} ms")
+    print(f"   normalizador (frio):     mediana {frio_med:8.2f} ms | máx {frio_max:8.2f} ms")
+    print(f"   normalizador (quente):   mediana {quente_med:8.2f} ms | máx {quente_max:8.2f} ms")
+    if preprocess_antigo is not None:
+        print(f"⚡ Speedup: {antigo_med / frio_med:.1f}x (frio) | {antigo_med / quente_med:.1f}x (quente)")
+    else:
+        print("ℹ️  nltk não instalado: comparação com o caminho antigo ignorada (pip install nltk)")
+    print(f"🧠 Memo: {cache_info()}")
+
+
+if __name__ == "__main__":
+    main()